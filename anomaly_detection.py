@@ -1,30 +1,147 @@
 
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from datetime import datetime, timedelta
+from sklearn.neighbors import KDTree
+import io
 import math
 
+from spatial_index import ZoneIndex
+
 # ------------------ Anomaly Detection Model ------------------
+METERS_PER_DEGREE = 111320.0
+
 class AnomalyDetector:
-    def __init__(self, contamination=0.1):
-        self.model = IsolationForest(contamination=contamination, random_state=42)
-        self.scaler = StandardScaler()
+    """
+    Path-deviation detector built on a corridor around the planned route.
+
+    A location is an anomaly when it is more than buffer_m metres from every
+    segment of the planned polyline. Segments are cut into pieces of at most
+    cell_m and bucketed into a grid of cell_m cells (CSR arrays: sorted cell
+    keys, offsets, segment ids), so a lookup only measures the few segments
+    near the point and the index grows with the route's length. Routes
+    needing more than max_segments pieces are refused with ValueError.
+    """
+
+    def __init__(self, buffer_m=100.0, cell_m=250.0, max_segments=200000):
+        self.buffer_m = buffer_m
+        self.cell_m = max(cell_m, buffer_m)
+        self.max_segments = max_segments
         self.is_trained = False
+        self.points = None
 
     def train(self, data):
         """
-        Train the Isolation Forest model.
-        :param data: A list of (latitude, longitude) tuples.
+        Build the corridor from the planned route.
+        :param data: A list of (latitude, longitude) tuples, in route order.
         """
-        if len(data) < 2:
+        points = np.asarray(data, dtype=np.float64).reshape(-1, 2)
+        if len(points) < 2:
             self.is_trained = False
             return
 
-        scaled_data = self.scaler.fit_transform(data)
-        self.model.fit(scaled_data)
+        # Equirectangular projection around the route is accurate to well
+        # under a metre over the few tens of km a planned route spans.
+        self.points = points.astype(np.float32)
+        self._origin = points.mean(axis=0)
+        self._lng_scale = METERS_PER_DEGREE * math.cos(math.radians(self._origin[0]))
+        xy = self._project(points)
+        # Long legs are split into pieces no longer than a cell, so each piece
+        # touches at most 4 x 4 cells and the index grows with route length
+        # rather than with the area of each leg's bounding box.
+        legs = xy[1:] - xy[:-1]
+        pieces = np.maximum(np.ceil(np.hypot(legs[:, 0], legs[:, 1]) / self.cell_m), 1).astype(np.int64)
+        if pieces.sum() > self.max_segments:
+            self.is_trained = False
+            raise ValueError(f"route too long: {pieces.sum()} corridor segments, limit {self.max_segments}")
+        leg = np.repeat(np.arange(len(legs)), pieces)
+        step = np.arange(len(leg)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        start = xy[:-1][leg] + legs[leg] * (step / pieces[leg])[:, None]
+        end = xy[:-1][leg] + legs[leg] * ((step + 1) / pieces[leg])[:, None]
+
+        # One row per segment (start x, start y, dx, dy, squared length), so a
+        # set of candidate segments is gathered with a single fancy index.
+        dx, dy = end[:, 0] - start[:, 0], end[:, 1] - start[:, 1]
+        self._segments = np.column_stack([start[:, 0], start[:, 1], dx, dy, dx ** 2 + dy ** 2])
+        self._ax, self._ay, self._dx, self._dy, self._len2 = self._segments.T
+
+        # Register each segment in every cell its buffered bounding box touches.
+        lo_x = np.floor((np.minimum(start[:, 0], end[:, 0]) - self.buffer_m) / self.cell_m).astype(np.int64)
+        hi_x = np.floor((np.maximum(start[:, 0], end[:, 0]) + self.buffer_m) / self.cell_m).astype(np.int64)
+        lo_y = np.floor((np.minimum(start[:, 1], end[:, 1]) - self.buffer_m) / self.cell_m).astype(np.int64)
+        hi_y = np.floor((np.maximum(start[:, 1], end[:, 1]) + self.buffer_m) / self.cell_m).astype(np.int64)
+        rows = hi_y - lo_y + 1
+        cells = (hi_x - lo_x + 1) * rows
+        seg = np.repeat(np.arange(len(cells)), cells)
+        nth = np.arange(len(seg)) - np.repeat(np.cumsum(cells) - cells, cells)
+        keys = self._cell_key(lo_x[seg] + nth // rows[seg], lo_y[seg] + nth % rows[seg])
+        order = np.argsort(keys, kind='stable')
+        self._cell_keys, self._cell_start = np.unique(keys[order], return_index=True)
+        self._cell_end = np.append(self._cell_start[1:], len(keys))
+        self._cell_segments = seg.astype(np.int32)[order]
+        self._cell_lookup = None
         self.is_trained = True
 
+    @staticmethod
+    def _cell_key(cx, cy):
+        return (cx << 32) + (cy & 0xffffffff)
+
+    def _project(self, locations):
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([(locations[:, 1] - self._origin[1]) * self._lng_scale,
+                                (locations[:, 0] - self._origin[0]) * METERS_PER_DEGREE])
+
+    def distances(self, locations):
+        """
+        Distance in metres from each location to the nearest route segment,
+        or inf when no segment lies within the corridor's grid cells.
+        """
+        xy = self._project(locations)
+        cx = np.floor(xy[:, 0] / self.cell_m).astype(np.int64)
+        cy = np.floor(xy[:, 1] / self.cell_m).astype(np.int64)
+        keys = (cx << 32) + (cy & 0xffffffff)
+        slot = np.minimum(np.searchsorted(self._cell_keys, keys), len(self._cell_keys) - 1)
+        found = self._cell_keys[slot] == keys
+        counts = np.where(found, self._cell_end[slot] - self._cell_start[slot], 0)
+
+        result = np.full(len(xy), np.inf)
+        if counts.sum() == 0:
+            return result
+        point_idx = np.repeat(np.arange(len(xy)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        seg = self._cell_segments[np.repeat(self._cell_start[slot], counts) + offsets]
+
+        px, py = xy[point_idx, 0] - self._ax[seg], xy[point_idx, 1] - self._ay[seg]
+        t = np.clip((px * self._dx[seg] + py * self._dy[seg]) / np.maximum(self._len2[seg], 1e-12), 0.0, 1.0)
+        dist = np.hypot(px - t * self._dx[seg], py - t * self._dy[seg])
+        starts = np.flatnonzero(np.r_[True, np.diff(point_idx) != 0])
+        result[point_idx[starts]] = np.minimum.reduceat(dist, starts)
+        return result
+
+    def candidate_segments(self, location):
+        """
+        Projects one location and returns (x, y, segment ids) for the segments
+        sharing its grid cell, or None when the location is off the grid.
+        """
+        if self._cell_lookup is None:
+            self._cell_lookup = dict(zip(self._cell_keys.tolist(),
+                                         zip(self._cell_start.tolist(), self._cell_end.tolist())))
+        x = (location[1] - self._origin[1]) * self._lng_scale
+        y = (location[0] - self._origin[0]) * METERS_PER_DEGREE
+        cell = self._cell_lookup.get(self._cell_key(math.floor(x / self.cell_m), math.floor(y / self.cell_m)))
+        if cell is None:
+            return None
+        return x, y, self._cell_segments[cell[0]:cell[1]]
+
+    def distance(self, location):
+        """Single-location version of distances(), avoiding the batch set-up cost."""
+        candidates = self.candidate_segments(location)
+        if candidates is None:
+            return math.inf
+        x, y, seg = candidates
+        px, py = x - self._ax[seg], y - self._ay[seg]
+        dx, dy = self._dx[seg], self._dy[seg]
+        t = np.clip((px * dx + py * dy) / np.maximum(self._len2[seg], 1e-12), 0.0, 1.0)
+        return float(np.hypot(px - t * dx, py - t * dy).min())
+
     def predict(self, location):
         """
         Predict if a location is an anomaly.
@@ -35,27 +152,85 @@ class AnomalyDetector:
             return False
 
         try:
-            scaled_location = self.scaler.transform([location])
-            prediction = self.model.predict(scaled_location)
-            return prediction[0] == -1
+            return self.distance(location) > self.buffer_m
         except Exception as e:
             print(f"Error during anomaly prediction: {e}")
             return False
 
-# ------------------ Anomaly Detection Logic ------------------
+    def predict_many(self, locations):
+        """
+        Predict anomalies for many locations in one call.
+        :param locations: A sequence of (latitude, longitude) tuples.
+        :return: A boolean NumPy array, True where the location is an anomaly.
+        """
+        if not self.is_trained or len(locations) == 0:
+            return np.zeros(len(locations), dtype=bool)
+
+        try:
+            return self.distances(locations) > self.buffer_m
+        except Exception as e:
+            print(f"Error during anomaly prediction: {e}")
+            return np.zeros(len(locations), dtype=bool)
+
+    def to_bytes(self):
+        """Serializes the trained corridor compactly: the route as float32 plus its settings."""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, points=self.points, settings=np.array([self.buffer_m, self.cell_m]))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuilds a detector from to_bytes() output; the index is recomputed from the route."""
+        with np.load(io.BytesIO(data)) as arrays:
+            buffer_m, cell_m = arrays["settings"].tolist()
+            detector = cls(buffer_m=buffer_m, cell_m=cell_m)
+            detector.train(arrays["points"])
+        return detector
 
-def check_inactivity(last_timestamp, inactive_threshold_minutes=5):
+    def memory_bytes(self):
+        """Approximate memory held by the trained corridor."""
+        if not self.is_trained:
+            return 0
+        arrays = (self.points, self._segments, self._cell_keys, self._cell_start, self._cell_end, self._cell_segments)
+        return sum(a.nbytes for a in arrays)
+
+def batch_path_distances(detectors, locations):
     """
-    Check if a tourist has been inactive for a long time.
+    Distance in metres from each location to the route of its own detector,
+    for many tourists at once. Candidate segments are gathered per location
+    and then measured in a single vectorized pass, so the NumPy work does not
+    grow with the number of detectors. Missing or untrained detectors and
+    locations off their corridor grid give inf.
+    :param detectors: One AnomalyDetector (or None) per location.
+    :param locations: (latitude, longitude) pairs.
     """
-    if not last_timestamp:
-        return False, None
-    
-    now = datetime.now(last_timestamp.tzinfo)
-    inactive_threshold = timedelta(minutes=inactive_threshold_minutes)
-    
-    time_diff = now - last_timestamp
-    return time_diff > inactive_threshold, time_diff
+    result = np.full(len(locations), np.inf)
+    owners, xs, ys, counts, segments = [], [], [], [], []
+    for i, (detector, location) in enumerate(zip(detectors, locations)):
+        if detector is None or not detector.is_trained:
+            continue
+        candidates = detector.candidate_segments(location)
+        if candidates is None:
+            continue
+        x, y, seg = candidates
+        owners.append(i)
+        xs.append(x)
+        ys.append(y)
+        counts.append(len(seg))
+        segments.append(detector._segments[seg])
+    if not owners:
+        return result
+
+    counts = np.asarray(counts)
+    ax, ay, dx, dy, len2 = np.concatenate(segments).T
+    px = np.repeat(xs, counts) - ax
+    py = np.repeat(ys, counts) - ay
+    t = np.clip((px * dx + py * dy) / np.maximum(len2, 1e-12), 0.0, 1.0)
+    dist = np.hypot(px - t * dx, py - t * dy)
+    result[owners] = np.minimum.reduceat(dist, np.cumsum(counts) - counts)
+    return result
+
+# ------------------ Anomaly Detection Logic ------------------
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -70,29 +245,211 @@ def haversine(lat1, lon1, lat2, lon2):
     r = 6371 # Radius of earth in kilometers.
     return c * r
 
-def check_danger_zone_entry(location, danger_zones):
+def candidate_zones(location, danger_zones, search_km=0.0):
     """
-    Check if a tourist has entered a danger zone.
+    Narrow down the zones worth checking for a location.
+    danger_zones may be a plain list of zones or a ZoneIndex.
     """
-    for zone in danger_zones:
+    if isinstance(danger_zones, ZoneIndex):
+        return danger_zones.candidates(location[0], location[1], search_km)
+    return danger_zones
+
+EARTH_RADIUS_KM = 6371
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine distance in km. Arguments are broadcastable arrays
+    in decimal degrees.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _unit_vectors(lats, lngs):
+    """Maps lat/lng in degrees to points on the unit sphere."""
+    lat, lng = np.radians(lats), np.radians(lngs)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+def _km_to_chord(km):
+    """Straight-line distance through the unit sphere for a great-circle distance."""
+    return 2 * np.sin(np.clip(np.asarray(km) / EARTH_RADIUS_KM, 0.0, np.pi) / 2)
+
+def zone_arrays(zones):
+    """
+    Converts a list of zone dicts into (lats, lngs, radii_m) NumPy arrays
+    for use with batch_check_danger_zones.
+    """
+    zones = list(zones)
+    lats = np.fromiter((float(z['lat']) for z in zones), dtype=np.float64, count=len(zones))
+    lngs = np.fromiter((float(z['lng']) for z in zones), dtype=np.float64, count=len(zones))
+    radii = np.fromiter((float(z.get('radius') or 0) for z in zones), dtype=np.float64, count=len(zones))
+    return lats, lngs, radii
+
+def zone_tree(zone_lats, zone_lngs):
+    """
+    KD-tree over zone centres for batch_check_danger_zones, or None when
+    there are no zones; callers that check the same zones repeatedly should
+    build it once and pass it in.
+    """
+    if len(zone_lats) == 0:
+        return None
+    return KDTree(_unit_vectors(np.asarray(zone_lats, dtype=np.float64).ravel(),
+                                np.asarray(zone_lngs, dtype=np.float64).ravel()))
+
+def batch_check_danger_zones(tourist_lats, tourist_lngs, zone_lats, zone_lngs, zone_radii_m,
+                             approaching_distance_km=1.0, tree=None):
+    """
+    Score many tourists against many zones in one vectorized pass. tree is
+    an optional zone_tree() over the same zones, to skip building one.
+
+    :return: A dict of per-tourist arrays:
+        'inside'       - True if the tourist is inside at least one zone.
+        'approaching'  - True if the tourist is in the approaching buffer of at least one zone.
+        'nearest_km'   - Distance to the nearest zone boundary (negative when inside).
+        'nearest_zone' - Index of that zone, or -1 when there are no zones.
+        'hits'         - Every (tourist, zone) pair that is inside or approaching, as
+                         arrays 'tourist', 'zone', 'distance_km' (to the zone centre)
+                         and 'inside', ordered by tourist and then distance.
+    """
+    t_lat = np.asarray(tourist_lats, dtype=np.float64).ravel()
+    t_lng = np.asarray(tourist_lngs, dtype=np.float64).ravel()
+    z_lat = np.asarray(zone_lats, dtype=np.float64).ravel()
+    z_lng = np.asarray(zone_lngs, dtype=np.float64).ravel()
+    z_rad = np.asarray(zone_radii_m, dtype=np.float64).ravel() / 1000
+
+    n = len(t_lat)
+    result = {
+        'inside': np.zeros(n, dtype=bool),
+        'approaching': np.zeros(n, dtype=bool),
+        'nearest_km': np.full(n, np.inf),
+        'nearest_zone': np.full(n, -1, dtype=np.int64),
+        'hits': {
+            'tourist': np.zeros(0, dtype=np.int64),
+            'zone': np.zeros(0, dtype=np.int64),
+            'distance_km': np.zeros(0),
+            'inside': np.zeros(0, dtype=bool),
+        },
+    }
+    if n == 0 or len(z_lat) == 0:
+        return result
+
+    # Only zone centres within reach can matter, so let a KD-tree over unit
+    # vectors prune the pairs: first an upper bound on each tourist's nearest
+    # boundary distance, then every zone centre that could beat that bound or
+    # trigger an alert. Chord distance is monotonic in great-circle distance.
+    if tree is None:
+        tree = zone_tree(z_lat, z_lng)
+    points = _unit_vectors(t_lat, t_lng)
+    _, nearest_idx = tree.query(points, k=1)
+    nearest_idx = nearest_idx[:, 0]
+    upper_bound = haversine_np(t_lat, t_lng, z_lat[nearest_idx], z_lng[nearest_idx]) - z_rad[nearest_idx]
+    max_radius = z_rad.max()
+    search_km = np.maximum(upper_bound + max_radius, max_radius + approaching_distance_km)
+    # Pad the radius slightly so float rounding never drops a boundary case.
+    neighbours = tree.query_radius(points, r=_km_to_chord(search_km) * (1 + 1e-9) + 1e-12)
+
+    counts = np.fromiter((len(idx) for idx in neighbours), dtype=np.int64, count=n)
+    tourist_idx = np.repeat(np.arange(n), counts)
+    zone_idx = np.concatenate(neighbours).astype(np.int64)
+
+    distance = haversine_np(t_lat[tourist_idx], t_lng[tourist_idx], z_lat[zone_idx], z_lng[zone_idx])
+    boundary = distance - z_rad[zone_idx]
+    inside = boundary <= 0
+    approaching = ~inside & (boundary <= approaching_distance_km)
+
+    result['inside'] = np.bincount(tourist_idx, weights=inside, minlength=n) > 0
+    result['approaching'] = np.bincount(tourist_idx, weights=approaching, minlength=n) > 0
+
+    # Per-tourist minimum: sort pairs by (tourist, boundary) and take the first of each group.
+    order = np.lexsort((boundary, tourist_idx))
+    first = order[np.r_[0, np.flatnonzero(np.diff(tourist_idx[order])) + 1]]
+    result['nearest_km'][tourist_idx[first]] = boundary[first]
+    result['nearest_zone'][tourist_idx[first]] = zone_idx[first]
+
+    hit = inside | approaching
+    order = np.lexsort((distance[hit], tourist_idx[hit]))
+    result['hits'] = {
+        'tourist': tourist_idx[hit][order],
+        'zone': zone_idx[hit][order],
+        'distance_km': distance[hit][order],
+        'inside': inside[hit][order],
+    }
+    return result
+
+def classify_location(location, danger_zones, approaching_distance_km=1.0):
+    """
+    Compute the distance to every candidate zone once and sort the hits.
+    :return: (inside, approaching) lists of {"zone", "distance_km"} dicts,
+             each ordered from the nearest zone centre outwards.
+    """
+    inside, approaching = [], []
+    for zone in candidate_zones(location, danger_zones, approaching_distance_km):
         distance_km = haversine(location[0], location[1], zone['lat'], zone['lng'])
         radius_km = zone['radius'] / 1000
         if distance_km <= radius_km:
-            return True, zone
+            inside.append({"zone": zone, "distance_km": distance_km})
+        elif distance_km <= radius_km + approaching_distance_km:
+            approaching.append({"zone": zone, "distance_km": distance_km})
+    inside.sort(key=lambda hit: hit["distance_km"])
+    approaching.sort(key=lambda hit: hit["distance_km"])
+    return inside, approaching
+
+def check_danger_zone_entry(location, danger_zones):
+    """
+    Check if a tourist has entered a danger zone.
+    """
+    inside, _ = classify_location(location, danger_zones, approaching_distance_km=0.0)
+    if inside:
+        return True, inside[0]["zone"]
     return False, None
 
 def check_approaching_danger_zone(location, danger_zones, approaching_distance_km=1.0):
     """
     Check if a tourist is approaching a danger zone (within 1km but not inside).
     """
-    for zone in danger_zones:
-        distance_km = haversine(location[0], location[1], zone['lat'], zone['lng'])
-        radius_km = zone['radius'] / 1000
-        # Is the user in the 'approaching' buffer?
-        is_approaching = distance_km <= radius_km + approaching_distance_km
-        # Is the user already inside the zone?
-        is_inside = distance_km <= radius_km
-        
-        if is_approaching and not is_inside:
-            return True, zone
+    _, approaching = classify_location(location, danger_zones, approaching_distance_km)
+    if approaching:
+        return True, approaching[0]["zone"]
     return False, None
+
+def time_to_boundary(location, velocity, zone):
+    """
+    Seconds until a tourist moving in a straight line at velocity (east,
+    north in m/s) crosses into a circular zone: 0 if already inside, None if
+    the track never reaches it. Uses a local flat projection around the tourist.
+    """
+    x = (zone['lng'] - location[1]) * METERS_PER_DEGREE * math.cos(math.radians(location[0]))
+    y = (zone['lat'] - location[0]) * METERS_PER_DEGREE
+    radius = zone['radius']
+    gap2 = x * x + y * y - radius * radius
+    if gap2 <= 0:
+        return 0.0
+    vx, vy = velocity
+    speed2 = vx * vx + vy * vy
+    closing = vx * x + vy * y
+    if speed2 == 0 or closing <= 0:
+        return None
+    disc = closing * closing - speed2 * gap2
+    if disc < 0:
+        return None
+    return (closing - math.sqrt(disc)) / speed2
+
+def predict_zone_entries(location, velocity, danger_zones, horizon_seconds=300, max_search_km=50.0):
+    """
+    Zones the tourist will enter within horizon_seconds if they keep their
+    current velocity. Only zones the track can reach in that time are looked
+    at (through the spatial index when danger_zones is a ZoneIndex).
+    :return: {"zone", "distance_km", "eta_seconds"} dicts, soonest first;
+             zones the tourist is already inside are left out.
+    """
+    speed = math.hypot(velocity[0], velocity[1])
+    search_km = min(speed * horizon_seconds / 1000, max_search_km)
+    entries = []
+    for zone in candidate_zones(location, danger_zones, search_km):
+        eta = time_to_boundary(location, velocity, zone)
+        if eta is not None and 0 < eta <= horizon_seconds:
+            distance_km = haversine(location[0], location[1], zone['lat'], zone['lng'])
+            entries.append({"zone": zone, "distance_km": distance_km, "eta_seconds": eta})
+    entries.sort(key=lambda entry: entry["eta_seconds"])
+    return entries
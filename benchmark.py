@@ -0,0 +1,226 @@
+"""
+Micro-benchmarks for the geofencing hot paths.
+
+Usage:
+    python benchmark.py zone_index
+    python benchmark.py batch_geofence
+    python benchmark.py corridor
+    python benchmark.py deviation_sweep
+    python benchmark.py disaster_stats
+    python benchmark.py disaster_clustering
+    python benchmark.py disaster_append
+    python benchmark.py risk_raster
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+import anomaly_detection
+from disaster_prediction import DisasterPredictionModel
+from risk_raster import RiskRaster
+from spatial_index import ZoneIndex
+
+# Rough bounding box of India, used to scatter synthetic zones and fixes.
+INDIA_BBOX = (6.5, 68.0, 35.5, 97.5)  # south, west, north, east
+
+def random_zones(count, seed=42, min_radius=200, max_radius=5000):
+    rng = random.Random(seed)
+    south, west, north, east = INDIA_BBOX
+    return [{
+        "id": f"zone_{i}",
+        "lat": rng.uniform(south, north),
+        "lng": rng.uniform(west, east),
+        "radius": rng.uniform(min_radius, max_radius),
+        "description": f"Synthetic zone {i}",
+        "type": "manual",
+    } for i in range(count)]
+
+def random_fixes(count, seed=7):
+    rng = random.Random(seed)
+    south, west, north, east = INDIA_BBOX
+    return [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(count)]
+
+def _time_per_fix(zones, fixes):
+    start = time.perf_counter()
+    for location in fixes:
+        anomaly_detection.check_approaching_danger_zone(location, zones)
+        anomaly_detection.check_danger_zone_entry(location, zones)
+    return (time.perf_counter() - start) / len(fixes) * 1e6
+
+def bench_zone_index(sizes=(100, 1000, 10000, 100000), fixes=500):
+    """Per-fix geofence latency for a linear scan versus the grid index."""
+    points = random_fixes(fixes)
+    print(f"{'zones':>8} {'build ms':>10} {'index us/fix':>14} {'linear us/fix':>14}")
+    for size in sizes:
+        zones = random_zones(size)
+        start = time.perf_counter()
+        index = ZoneIndex()
+        index.rebuild(zones)
+        build_ms = (time.perf_counter() - start) * 1000
+        indexed = _time_per_fix(index, points)
+        # The linear scan gets slow quickly; sample fewer fixes for big sets.
+        linear = _time_per_fix(zones, points[:max(10, fixes * 1000 // size)])
+        print(f"{size:>8} {build_ms:>10.1f} {indexed:>14.1f} {linear:>14.1f}")
+
+def bench_batch_geofence(tourists=50000, zones=10000):
+    """Scores every tourist against every zone with the vectorized batch API."""
+    fixes = np.array(random_fixes(tourists))
+    zone_lats, zone_lngs, zone_radii = anomaly_detection.zone_arrays(random_zones(zones))
+    start = time.perf_counter()
+    result = anomaly_detection.batch_check_danger_zones(fixes[:, 0], fixes[:, 1], zone_lats, zone_lngs, zone_radii)
+    elapsed = time.perf_counter() - start
+    print(f"{tourists} tourists x {zones} zones: {elapsed * 1000:.0f} ms "
+          f"({result['inside'].sum()} inside, {result['approaching'].sum()} approaching)")
+
+def bench_corridor(route_points=5000, fixes=5000):
+    """Trains a path-deviation corridor on a long route and times lookups."""
+    t = np.linspace(0, 1, route_points)
+    route = np.column_stack([12.5 + 0.5 * t + 0.02 * np.sin(t * 40), 77.5 + 0.3 * t])
+    detector = anomaly_detection.AnomalyDetector()
+    start = time.perf_counter()
+    detector.train(route)
+    train_ms = (time.perf_counter() - start) * 1000
+    points = route + np.random.default_rng(0).normal(0, 0.001, route.shape)
+
+    start = time.perf_counter()
+    for location in points[:1000]:
+        detector.predict(location)
+    single_us = (time.perf_counter() - start) / 1000 * 1e6
+    start = time.perf_counter()
+    detector.predict_many(points[:fixes])
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(f"{route_points}-point route: train {train_ms:.1f} ms, {detector.memory_bytes() / 1024:.0f} KiB, "
+          f"predict {single_us:.1f} us/fix, predict_many {batch_ms:.1f} ms for {fixes} fixes")
+
+def bench_deviation_sweep(tourists=20000, route_points=500):
+    """Scores one fix per tourist against their own route, batched versus one call each."""
+    rng = np.random.default_rng(1)
+    t = np.linspace(0, 1, route_points)
+    detectors, points = [], []
+    for lat, lng in random_fixes(tourists):
+        detector = anomaly_detection.AnomalyDetector()
+        detector.train(np.column_stack([lat + 0.05 * t, lng + 0.01 * np.sin(t * 20)]))
+        detectors.append(detector)
+        points.append((lat + 0.05 * rng.random() + rng.normal(0, 0.001), lng + rng.normal(0, 0.001)))
+    anomaly_detection.batch_path_distances(detectors, points)  # builds each corridor's cell lookup
+
+    start = time.perf_counter()
+    for detector, point in zip(detectors, points):
+        detector.predict(point)
+    single_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    distances = anomaly_detection.batch_path_distances(detectors, points)
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(f"{tourists} tourists: per-user {single_ms:.0f} ms, batched {batch_ms:.0f} ms "
+          f"({(distances > 100).sum()} off route)")
+
+def bench_disaster_stats(events=2000000, clusters=5000):
+    """Loads synthetic events as columns and computes per-cluster statistics."""
+    rng = np.random.default_rng(2)
+    south, west, north, east = INDIA_BBOX
+    model = DisasterPredictionModel()
+    start = time.perf_counter()
+    model.set_events(rng.uniform(south, north, events), rng.uniform(west, east, events),
+                     rng.integers(1.0e9, 1.7e9, events), rng.integers(0, 5, events), ["a", "b", "c", "d", "e"],
+                     rng.integers(0, 100, events), [f"event {i}" for i in range(100)])
+    load_ms = (time.perf_counter() - start) * 1000
+    model.model.labels_ = rng.integers(-1, clusters, events)
+    model.is_trained = True
+    start = time.perf_counter()
+    zones = model.get_disaster_zones(now=0)
+    stats_ms = (time.perf_counter() - start) * 1000
+    print(f"{events} events: columns {load_ms:.0f} ms, {model.memory_bytes() / 2 ** 20:.0f} MiB; "
+          f"{len(zones)} cluster predictions in {stats_ms:.0f} ms")
+
+def bench_disaster_clustering(events=200000, hotspots=3000, eps_km=10.0):
+    """Clusters a synthetic national archive: repeat incidents around a few thousand hotspots."""
+    rng = np.random.default_rng(3)
+    south, west, north, east = INDIA_BBOX
+    centres = np.column_stack([rng.uniform(south, north, hotspots), rng.uniform(west, east, hotspots)])
+    picks = rng.integers(0, hotspots, events)
+    spread = rng.normal(0, 0.02, (events, 2))
+    model = DisasterPredictionModel(eps_km=eps_km)
+    model.set_events(centres[picks, 0] + spread[:, 0], centres[picks, 1] + spread[:, 1],
+                     rng.integers(1.0e9, 1.7e9, events), rng.integers(0, 4, events), ["a", "b", "c", "d"])
+    for by_type in (False, True):
+        model.by_type = by_type
+        model.train()
+        stats = model.fit_stats
+        # Memory tracing slows the fit down, so peak memory comes from a second, traced run.
+        model.profile_memory = True
+        model.train()
+        model.profile_memory = False
+        print(f"by_type={by_type}: {stats['events']} events -> {stats['points']} points, "
+              f"{stats['clusters']} clusters, {stats['noise']} noise in {stats['fit_seconds']:.1f} s, "
+              f"peak {model.fit_stats['peak_bytes'] / 2 ** 20:.0f} MiB")
+
+def bench_disaster_append(events=200000, hotspots=3000, eps_km=10.0, batch=5, batches=20):
+    """Feeds small batches of live events into a trained model, versus retraining from scratch."""
+    rng = np.random.default_rng(3)
+    south, west, north, east = INDIA_BBOX
+    centres = np.column_stack([rng.uniform(south, north, hotspots), rng.uniform(west, east, hotspots)])
+    picks = rng.integers(0, hotspots, events)
+    spread = rng.normal(0, 0.02, (events, 2))
+    model = DisasterPredictionModel(eps_km=eps_km)
+    model.set_events(centres[picks, 0] + spread[:, 0], centres[picks, 1] + spread[:, 1],
+                     rng.integers(1.0e9, 1.7e9, events))
+    model.train()
+    retrain_s = model.fit_stats["fit_seconds"]
+    start = time.perf_counter()
+    reclustered = 0
+    for _ in range(batches):
+        lat, lng = centres[rng.integers(0, hotspots, batch)].T + rng.normal(0, 0.05, (2, batch))
+        model.add_records([{"place": {"lat": a, "lng": b}, "date": "2024-01-01", "time": "12:00:00"}
+                           for a, b in zip(lat.tolist(), lng.tolist())])
+        reclustered += model.fit_stats["last_update"]["reclustered"]
+    append_ms = (time.perf_counter() - start) / batches * 1000
+    print(f"{events} events: full retrain {retrain_s:.1f} s; {batch}-event append {append_ms:.0f} ms "
+          f"(~{reclustered // batches} events re-clustered each)")
+
+def bench_risk_raster(events=2000000, lookups=100000, tiles=50):
+    """Builds the risk raster from a large archive, then times point lookups and tile renders."""
+    import tempfile
+    rng = np.random.default_rng(4)
+    south, west, north, east = INDIA_BBOX
+    with tempfile.TemporaryDirectory() as directory:
+        raster = RiskRaster(f"{directory}/risk.npy")
+        start = time.perf_counter()
+        raster.build(rng.uniform(south, north, events), rng.uniform(west, east, events),
+                     rng.integers(1.0e9, 1.7e9, events))
+        build_ms = (time.perf_counter() - start) * 1000
+        points = np.array(random_fixes(lookups))
+        start = time.perf_counter()
+        raster.risk_many(points[:, 0], points[:, 1])
+        batch_ns = (time.perf_counter() - start) / lookups * 1e9
+        start = time.perf_counter()
+        for lat, lng in points[:1000].tolist():
+            raster.risk_at(lat, lng)
+        single_us = (time.perf_counter() - start) / 1000 * 1e6
+        start = time.perf_counter()
+        for i in range(tiles):
+            raster.tile_png(8, 176 + i % 8, 110 + i // 8)
+        tile_ms = (time.perf_counter() - start) / tiles * 1000
+        print(f"{events} events: build {build_ms:.0f} ms, {raster.metrics()['grid_bytes'] / 1024:.0f} KiB grid; "
+              f"lookup {single_us:.1f} us ({batch_ns:.0f} ns/point batched); tile {tile_ms:.1f} ms")
+
+BENCHMARKS = {
+    "zone_index": bench_zone_index,
+    "batch_geofence": bench_batch_geofence,
+    "corridor": bench_corridor,
+    "deviation_sweep": bench_deviation_sweep,
+    "disaster_stats": bench_disaster_stats,
+    "disaster_clustering": bench_disaster_clustering,
+    "disaster_append": bench_disaster_append,
+    "risk_raster": bench_risk_raster,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -2,10 +2,15 @@
 import firebase_admin
 from firebase_admin import credentials, db, firestore
 import os
+import random
+import threading
 import time
 from dotenv import load_dotenv
 from flask_bcrypt import Bcrypt
 
+from location_batch import epoch_seconds
+from zone_cache import ZoneSnapshot, zones_from_node
+
 # Load environment variables from .env file at the very beginning
 load_dotenv()
 
@@ -40,10 +45,14 @@ def initialize_database():
     """
     Checks for the existence of root nodes in the Realtime Database and creates them if they don't exist.
     """
-    root_nodes = ["zones", "tourist_locations", "admins", "tourist_paths", "anomaly_alerts"]
-    for node in root_nodes:
-        if db.reference(node).get() is None:
-            db.reference(node).set('')
+    root_nodes = ["zones", "tourist_locations", "tourist_latest", "admins", "tourist_paths", "anomaly_alerts"]
+    missing = [node for node in root_nodes if db.reference(node).get(shallow=True) is None]
+    for node in missing:
+        db.reference(node).set('')
+    # Older databases only have the raw history; build the latest-location projection once.
+    if "tourist_latest" in missing and "tourist_locations" not in missing:
+        count = rebuild_latest_locations()
+        print(f"Backfilled tourist_latest for {count} tourists.")
     print("Firebase Realtime Database checked/initialized.")
 
 def create_admin(username, password):
@@ -72,14 +81,28 @@ def get_admin(username):
 def get_all_zones():
     """Fetches all danger zones from the database."""
     zones_ref = db.reference("zones")
-    zones_data = zones_ref.get()
-    zones = []
-    if zones_data and isinstance(zones_data, dict):
-        for zone_id, zone in zones_data.items():
-            if isinstance(zone, dict):
-                zone["id"] = zone_id
-                zones.append(zone)
-    return zones
+    return zones_from_node(zones_ref.get())
+
+# In-process copy of the zones node. Hot paths read from here instead of
+# downloading the whole node; start_zone_listener() keeps it current.
+zone_snapshot = ZoneSnapshot(loader=get_all_zones)
+_zone_listener = None
+
+def start_zone_listener():
+    """
+    Subscribes the zone snapshot to changes on the 'zones' node. The first
+    event delivers the full node, later ones only what changed.
+    """
+    global _zone_listener
+    if _zone_listener is not None:
+        return _zone_listener
+    try:
+        _zone_listener = db.reference("zones").listen(
+            lambda event: zone_snapshot.apply_event(event.event_type, event.path, event.data))
+        print("Listening for zone changes in the Realtime Database.")
+    except Exception as e:
+        print(f"Could not start zone listener, falling back to polling: {e}")
+    return _zone_listener
 
 def add_zone(lat, lng, radius, description, zone_type='manual', source='manual'):
     """Adds a new danger zone to the database with a description, type, and source."""
@@ -93,12 +116,14 @@ def add_zone(lat, lng, radius, description, zone_type='manual', source='manual')
         "source": source
     }
     new_zone_ref = zones_ref.push(new_zone)
+    zone_snapshot.upsert(dict(new_zone, id=new_zone_ref.key))
     return new_zone_ref.key
 
 def delete_zone_by_id(zone_id):
     """Deletes a danger zone from the database by its ID."""
     try:
         db.reference(f"zones/{zone_id}").delete()
+        zone_snapshot.remove(zone_id)
         return True
     except Exception:
         return False
@@ -118,36 +143,180 @@ def clear_zones_by_source(source_tag):
     
     for key in keys_to_delete:
         zones_ref.child(key).delete()
+        zone_snapshot.remove(key)
         delete_count += 1
         
     return delete_count
 
-def add_tourist_location(user_id, lat, lng, timestamp):
-    """Adds a tourist's location to the database."""
-    tourist_locations_ref = db.reference("tourist_locations")
-    new_location = {
-        "user_id": user_id,
-        "lat": lat,
-        "lng": lng,
-        "timestamp": timestamp,
-    }
-    tourist_locations_ref.push(new_location)
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+_push_lock = threading.Lock()
+_last_push_time = 0
+_last_rand_chars = [0] * 12
+
+def generate_push_id():
+    """
+    Generates a chronologically ordered key in the same format as push(),
+    so several children can be written in a single multi-path update().
+    """
+    global _last_push_time
+    with _push_lock:
+        now = int(time.time() * 1000)
+        if now == _last_push_time:
+            # Same millisecond: increment the random part to keep keys ordered.
+            for i in range(11, -1, -1):
+                if _last_rand_chars[i] != 63:
+                    _last_rand_chars[i] += 1
+                    break
+                _last_rand_chars[i] = 0
+        else:
+            _last_rand_chars[:] = [random.randrange(64) for _ in range(12)]
+        _last_push_time = now
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return "".join(reversed(time_chars)) + "".join(PUSH_CHARS[c] for c in _last_rand_chars)
+
+# --- Latest tourist locations ---
+# 'tourist_latest/{user_id}' holds each tourist's most recent fix, written in
+# the same update as the history point, so reading everyone's position costs
+# O(active tourists). The dict below mirrors it in-process. A background job
+# calls sync_latest_locations() every LATEST_SYNC_SECONDS to pick up other
+# workers' writes and to drop tourists not seen for LATEST_RETENTION_SECONDS,
+# from the mirror and from the node, so both stay bounded by recent activity.
+LATEST_SYNC_SECONDS = 30
+LATEST_RETENTION_SECONDS = 24 * 3600
+_latest_locations = {}
+_latest_lock = threading.Lock()
+_latest_synced_at = 0.0
+
+def _is_fresh(location, cutoff):
+    seen = epoch_seconds(location.get("timestamp")) if isinstance(location, dict) else None
+    return seen is not None and seen >= cutoff
+
+def _is_newer(location, current):
+    if current is None:
+        return True
+    new_ts, old_ts = location.get("timestamp"), current.get("timestamp")
+    if type(new_ts) is not type(old_ts):
+        return True
+    return new_ts >= old_ts
+
+def _remember_latest(user_id, location):
+    """Updates the in-process mirror. Returns True if the location is the newest one seen."""
+    with _latest_lock:
+        if _is_newer(location, _latest_locations.get(user_id)):
+            _latest_locations[user_id] = location
+            return True
+        return False
+
+def add_tourist_locations(points):
+    """
+    Adds many (user_id, lat, lng, timestamp) fixes in a single multi-path
+    update, together with each tourist's newest position in tourist_latest.
+    The in-process mirror only takes the positions once the update succeeds.
+    """
+    updates = {}
+    newest = {}
+    for user_id, lat, lng, timestamp in points:
+        new_location = {
+            "user_id": user_id,
+            "lat": lat,
+            "lng": lng,
+            "timestamp": timestamp,
+        }
+        updates[f"tourist_locations/{generate_push_id()}"] = new_location
+        if _is_newer(new_location, newest.get(user_id)):
+            newest[user_id] = new_location
+    with _latest_lock:
+        for user_id, location in newest.items():
+            if _is_newer(location, _latest_locations.get(user_id)):
+                updates[f"tourist_latest/{user_id}"] = location
+    if updates:
+        db.reference().update(updates)
+    for user_id, location in newest.items():
+        _remember_latest(user_id, location)
+
+def sync_latest_locations(now=None):
+    """
+    Merges tourist_latest into the in-process mirror and prunes tourists
+    last seen more than LATEST_RETENTION_SECONDS ago (or with unreadable
+    times) from both. Returns the number of entries removed from the node.
+    """
+    global _latest_synced_at
+    now = time.time() if now is None else now
+    cutoff = now - LATEST_RETENTION_SECONDS
+    latest = db.reference("tourist_latest").get()
+    latest = latest if isinstance(latest, dict) else {}
+    removed = 0
+    for user_id in [uid for uid, location in latest.items() if not _is_fresh(location, cutoff)]:
+        # A fix may have arrived since the node was read. Deletes cannot be made conditional
+        # (transactions cannot write None), so re-read the entry right before deleting it.
+        ref = db.reference(f"tourist_latest/{user_id}")
+        current = ref.get()
+        if _is_fresh(current, cutoff):
+            latest[user_id] = current
+        else:
+            ref.delete()
+            latest.pop(user_id)
+            removed += 1
+    for user_id, location in latest.items():
+        if isinstance(location, dict):
+            _remember_latest(user_id, location)
+    with _latest_lock:
+        for user_id in [uid for uid, location in _latest_locations.items() if not _is_fresh(location, cutoff)]:
+            del _latest_locations[user_id]
+    _latest_synced_at = now
+    return removed
 
 def get_latest_tourist_locations():
     """
-    Fetches the most recent location for each unique tourist.
+    Returns the most recent location of each recently seen tourist from the
+    in-process mirror. Only the first call, before any sync, reads the database.
+    """
+    if not _latest_synced_at:
+        sync_latest_locations()
+    with _latest_lock:
+        return list(_latest_locations.values())
+
+def get_latest_tourist_location(user_id):
+    """Returns one tourist's most recent known location from the in-process mirror, or None."""
+    with _latest_lock:
+        return _latest_locations.get(user_id)
+
+def fetch_latest_tourist_locations(user_ids):
+    """
+    Re-reads tourist_latest for a few tourists, picking up fixes that other
+    worker processes stored. Returns {user_id: location}.
+    """
+    latest = {}
+    for user_id in user_ids:
+        location = db.reference(f"tourist_latest/{user_id}").get()
+        if isinstance(location, dict):
+            _remember_latest(user_id, location)
+            latest[user_id] = location
+    return latest
+
+def rebuild_latest_locations():
+    """
+    Rebuilds 'tourist_latest' from the full location history. Only needed
+    once for databases written before the projection existed.
     """
     tourist_locations_ref = db.reference("tourist_locations")
     all_locations = tourist_locations_ref.order_by_child("timestamp").get()
-    
+
     latest_locations = {}
-    if all_locations:
+    if all_locations and isinstance(all_locations, dict):
         for _, location in all_locations.items():
-            user_id = location.get("user_id")
+            user_id = location.get("user_id") if isinstance(location, dict) else None
             if user_id:
                 latest_locations[user_id] = location # Overwrites older entries, keeping the last one.
-            
-    return list(latest_locations.values())
+
+    if latest_locations:
+        db.reference("tourist_latest").set(latest_locations)
+        for user_id, location in latest_locations.items():
+            _remember_latest(user_id, location)
+    return len(latest_locations)
 
 def add_planned_tourist_path(user_id, path_data):
     """Adds a planned tourist path to the database."""
@@ -159,16 +328,28 @@ def get_planned_tourist_path(user_id):
     path_ref = db.reference(f"tourist_paths/{user_id}")
     return path_ref.get()
 
-def log_anomaly(user_id, anomaly_type, details):
-    """Logs a detected anomaly to the database."""
-    alerts_ref = db.reference("anomaly_alerts")
-    new_alert = {
-        "user_id": user_id,
-        "type": anomaly_type,
-        "details": details,
-        "timestamp": time.time()
+def log_anomalies(anomalies):
+    """Logs many (user_id, anomaly_type, details) records in a single update."""
+    now = time.time()
+    updates = {
+        f"anomaly_alerts/{generate_push_id()}": {
+            "user_id": user_id,
+            "type": anomaly_type,
+            "details": details,
+            "timestamp": now
+        }
+        for user_id, anomaly_type, details in anomalies
     }
-    alerts_ref.push(new_alert)
+    if updates:
+        db.reference().update(updates)
+
+def get_recent_anomalies(hours=12):
+    """Fetches the anomaly alerts logged within the last few hours."""
+    alerts_ref = db.reference("anomaly_alerts")
+    alerts = alerts_ref.order_by_child("timestamp").start_at(time.time() - hours * 3600).get()
+    if not alerts or not isinstance(alerts, dict):
+        return []
+    return [alert for alert in alerts.values() if isinstance(alert, dict)]
 
 def get_tourist_by_aadhaar(aadhaar):
     """Fetches a tourist from the database by Aadhaar number."""
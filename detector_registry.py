@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from anomaly_detection import AnomalyDetector
+
+class DetectorRegistry:
+    """
+    Bounded store of trained path-deviation detectors, one per tourist.
+
+    Models are kept in LRU order and evicted when there are more than
+    max_models, when they use more than max_bytes in total, or when they have
+    not been used for ttl_seconds. Every trained model is also written to
+    cache_dir, so other worker processes and restarts can load it instead of
+    retraining; prune() removes files nobody has rewritten for ttl_seconds. On a full miss the planned path is fetched through loader and
+    a fresh model is trained.
+    """
+
+    def __init__(self, loader=None, cache_dir=None, max_models=10000, max_bytes=256 * 1024 * 1024,
+                 ttl_seconds=6 * 3600, negative_ttl_seconds=60):
+        self.loader = loader
+        self.cache_dir = cache_dir
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._models = OrderedDict()  # user_id -> (detector, bytes, last_used, file_mtime)
+        self._missing = {}            # user_id -> time until which a miss is remembered
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_loads": 0, "rebuilds": 0, "misses": 0, "evictions": 0,
+                       "files_pruned": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, user_id):
+        return user_id in self._models
+
+    def _path(self, user_id):
+        name = hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.npz")
+
+    def _file_mtime(self, user_id):
+        if not self.cache_dir:
+            return None
+        try:
+            return os.stat(self._path(user_id)).st_mtime
+        except OSError:
+            return None
+
+    # --- Lookup ---
+    def get(self, user_id, rebuild=True):
+        """
+        Returns the user's detector, loading or rebuilding it if needed, or None.
+        With rebuild=False a missing model is not trained here (e.g. while a
+        newer one is already being trained elsewhere).
+        """
+        now = time.time()
+        mtime = self._file_mtime(user_id)
+        with self._lock:
+            entry = self._models.get(user_id)
+            # A newer file means another worker retrained this user's model.
+            if entry and now - entry[2] <= self.ttl_seconds and (mtime is None or mtime <= entry[3]):
+                self._models[user_id] = entry[:2] + (now, entry[3])
+                self._models.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry[0]
+            if self._missing.get(user_id, 0) > now:
+                self._stats["misses"] += 1
+                return None
+
+        detector = self._load_from_disk(user_id, mtime)
+        if detector is not None:
+            self._store(user_id, detector, mtime, "disk_loads")
+            return detector
+
+        if not rebuild:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        path = self.loader(user_id) if self.loader else None
+        if path:
+            detector = AnomalyDetector()
+            try:
+                detector.train(path)
+            except ValueError as e:
+                print(f"Could not train detector for {user_id}: {e}")
+            if detector.is_trained:
+                self.put(user_id, detector, "rebuilds")
+                return detector
+
+        with self._lock:
+            self._stats["misses"] += 1
+            self._missing[user_id] = now + self.negative_ttl_seconds
+            if len(self._missing) > self.max_models:
+                self._missing = {uid: until for uid, until in self._missing.items() if until > now}
+        return None
+
+    def _load_from_disk(self, user_id, mtime):
+        if mtime is None:
+            return None
+        try:
+            with open(self._path(user_id), "rb") as f:
+                return AnomalyDetector.from_bytes(f.read())
+        except Exception as e:
+            print(f"Could not load cached detector for {user_id}: {e}")
+            return None
+
+    # --- Updates ---
+    def put(self, user_id, detector, _stat=None):
+        """
+        Stores a freshly trained detector in memory and on disk. An untrained
+        one (e.g. a plan too short to train on) replaces the user's cached
+        file too, so the old route is not reloaded from disk.
+        """
+        mtime = None
+        if self.cache_dir and detector.is_trained:
+            path = self._path(user_id)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(detector.to_bytes())
+            os.replace(tmp_path, path)
+            mtime = os.stat(path).st_mtime
+        else:
+            self._remove_file(user_id)
+        self._store(user_id, detector, mtime, _stat)
+
+    def _store(self, user_id, detector, mtime, stat=None):
+        size = detector.memory_bytes()
+        with self._lock:
+            if stat:
+                self._stats[stat] += 1
+            self._missing.pop(user_id, None)
+            old = self._models.pop(user_id, None)
+            if old:
+                self._bytes -= old[1]
+            self._models[user_id] = (detector, size, time.time(), mtime or 0)
+            self._bytes += size
+            self._evict()
+
+    def discard(self, user_id):
+        """Forgets a user's detector, in memory and on disk."""
+        with self._lock:
+            old = self._models.pop(user_id, None)
+            if old:
+                self._bytes -= old[1]
+        self._remove_file(user_id)
+
+    def _remove_file(self, user_id):
+        if self.cache_dir:
+            try:
+                os.remove(self._path(user_id))
+            except OSError:
+                pass
+
+    def _evict(self):
+        now = time.time()
+        while self._models:
+            user_id, (_, size, last_used, _) = next(iter(self._models.items()))
+            expired = now - last_used > self.ttl_seconds
+            if not expired and len(self._models) <= self.max_models and self._bytes <= self.max_bytes:
+                break
+            self._models.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    def prune(self, now=None):
+        """
+        Drops expired models, and cached files not written for ttl_seconds
+        unless their model is still in memory here; meant to be called
+        periodically. Returns the number of files removed.
+        """
+        with self._lock:
+            self._evict()
+            held = list(self._models)
+        if not self.cache_dir:
+            return 0
+        in_use = {self._path(user_id) for user_id in held}
+        cutoff = (time.time() if now is None else now) - self.ttl_seconds
+        removed = 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if entry.name.endswith(".npz") and entry.path not in in_use and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # written or removed by another worker meanwhile
+        with self._lock:
+            self._stats["files_pruned"] += removed
+        return removed
+
+    # --- Metrics ---
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, models=len(self._models), bytes=self._bytes, max_bytes=self.max_bytes)
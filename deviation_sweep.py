@@ -0,0 +1,119 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import anomaly_detection
+
+class DeviationSweep:
+    """
+    Server-side path-deviation check over every active tourist's latest fix.
+
+    Each run takes a snapshot of latest locations, skips tourists whose fix
+    has not changed since it was last scored or who have not been seen for
+    active_seconds, and scores the rest against their own planned routes
+    with anomaly_detection.batch_path_distances, chunk by chunk. Work stops
+    once budget_seconds are used up, checked before every detector lookup;
+    tourists left over go first next time. get_detector should not block on
+    remote reads or training.
+    An alert is raised only when a tourist leaves their corridor, not on
+    every fix they spend outside it. Endpoints that score a fix themselves
+    report it through record(), so they share that state with the sweep.
+    """
+
+    def __init__(self, get_detector, budget_seconds=10.0, chunk_size=2000, active_seconds=1800, max_users=100000):
+        self.get_detector = get_detector
+        self.budget_seconds = budget_seconds
+        self.chunk_size = chunk_size
+        self.active_seconds = active_seconds
+        self.max_users = max_users
+        self._scored = OrderedDict()  # user_id -> [timestamp scored, deviated], least recently scored first
+        self._lock = threading.Lock()      # guards _scored and _stats, never held across lookups
+        self._run_lock = threading.Lock()  # one run at a time
+        self._stats = {"runs": 0, "scored": 0, "alerts": 0, "deferred": 0, "last_run_ms": 0.0, "max_run_ms": 0.0}
+
+    def _due(self, locations, parse_time, now):
+        """Fixes that still need scoring, never-scored tourists first, then least recently scored."""
+        fresh, stale = [], []
+        for location in locations:
+            user_id = location.get("user_id") if isinstance(location, dict) else None
+            if not user_id or "lat" not in location or "lng" not in location:
+                continue
+            state = self._scored.get(user_id)
+            if state is not None and state[0] == location.get("timestamp"):
+                continue
+            seen_at = parse_time(location.get("timestamp"))
+            if seen_at is None or now - seen_at > self.active_seconds:
+                continue
+            (stale if state is not None else fresh).append(location)
+        order = {user_id: rank for rank, user_id in enumerate(self._scored)}
+        stale.sort(key=lambda location: order[location["user_id"]])
+        return fresh + stale
+
+    def run(self, locations, parse_time, now=None):
+        """
+        Scores the due fixes in locations (dicts with user_id, lat, lng and
+        timestamp). Returns {"user_id", "location", "distance_m", "timestamp"}
+        for every tourist who has just left their planned corridor; distance_m
+        is None when the fix is far from every part of the route.
+        """
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        alerts = []
+        with self._run_lock:
+            with self._lock:
+                due = self._due(locations, parse_time, now)
+                before = {location["user_id"]: self._scored.get(location["user_id"]) for location in due}
+            done = 0
+            while done < len(due) and time.perf_counter() - start < self.budget_seconds:
+                # Lookups may have to load a model, so the budget is checked before each one.
+                chunk, detectors = [], []
+                for location in due[done:done + self.chunk_size]:
+                    if chunk and time.perf_counter() - start >= self.budget_seconds:
+                        break
+                    chunk.append(location)
+                    detectors.append(self.get_detector(location["user_id"]))
+                done += len(chunk)
+                points = [(location["lat"], location["lng"]) for location in chunk]
+                distances = anomaly_detection.batch_path_distances(detectors, points)
+                with self._lock:
+                    for location, point, detector, distance_m in zip(chunk, points, detectors, distances.tolist()):
+                        if self._scored.get(location["user_id"]) is not before[location["user_id"]]:
+                            continue  # a newer fix was recorded while this one was being scored
+                        deviated = detector is not None and detector.is_trained and distance_m > detector.buffer_m
+                        if self._update(location["user_id"], location.get("timestamp"), deviated):
+                            # Off the corridor grid the distance is only known to be large.
+                            alerts.append({"user_id": location["user_id"], "location": point,
+                                           "distance_m": distance_m if math.isfinite(distance_m) else None,
+                                           "timestamp": location.get("timestamp")})
+
+        with self._lock:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._stats["runs"] += 1
+            self._stats["scored"] += done
+            self._stats["alerts"] += len(alerts)
+            self._stats["deferred"] = len(due) - done
+            self._stats["last_run_ms"] = elapsed_ms
+            self._stats["max_run_ms"] = max(self._stats["max_run_ms"], elapsed_ms)
+        return alerts
+
+    def record(self, user_id, timestamp, deviated):
+        """
+        Takes a fix scored elsewhere, e.g. by the upload endpoints, so the
+        sweep does not score it again. Returns True if the tourist has just
+        left their corridor, i.e. when an alert should be logged.
+        """
+        with self._lock:
+            return self._update(user_id, timestamp, deviated)
+
+    def _update(self, user_id, timestamp, deviated):
+        state = self._scored.pop(user_id, None)
+        self._scored[user_id] = [timestamp, deviated]
+        if len(self._scored) > self.max_users:
+            self._scored.popitem(last=False)
+        return deviated and not (state and state[1])
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, tracked=len(self._scored),
+                        deviated=sum(1 for state in self._scored.values() if state[1]))
@@ -1,102 +1,512 @@
 
 import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
 from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
+from sklearn.neighbors import BallTree
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from anomaly_detection import EARTH_RADIUS_KM, METERS_PER_DEGREE
+
+SECONDS_PER_DAY = 86400
+
+def _parse_records(records):
+    """Event dicts -> (lat, lng, epoch, type codes, types, description codes, descriptions)."""
+    lat = np.fromiter((r['place']['lat'] for r in records), np.float64, len(records))
+    lng = np.fromiter((r['place']['lng'] for r in records), np.float64, len(records))
+    days = np.array([r['date'] for r in records], dtype='datetime64[D]').astype(np.int64)
+    # Hours are not always zero-padded ("2:10:30"), so times are split rather than parsed as ISO.
+    hms = np.array([r['time'].split(':') for r in records], dtype=np.int64).reshape(-1, 3)
+    epoch = days * SECONDS_PER_DAY + hms @ np.array([3600, 60, 1])
+    types, type_codes = np.unique(np.array([r.get('type') or '' for r in records], dtype=str),
+                                  return_inverse=True)
+    descriptions, description_codes = np.unique(
+        np.array([r.get('description') or '' for r in records], dtype=str), return_inverse=True)
+    return lat, lng, epoch, type_codes, types.tolist(), description_codes, descriptions.tolist()
+
+def _intern(table, values):
+    """Codes for values in table, appending the ones it does not have yet."""
+    index = {value: code for code, value in enumerate(table)}
+    for value in values:
+        if value not in index:
+            index[value] = len(table)
+            table.append(value)
+    return np.array([index[value] for value in values], dtype=np.int64)
 
 class DisasterPredictionModel:
-    def __init__(self, eps=0.3, min_samples=2): # Changed min_samples to 2
-        self.model = DBSCAN(eps=eps, min_samples=min_samples)
-        self.scaler = StandardScaler()
+    """
+    Clusters historical disaster locations and projects when each cluster
+    is likely to see its next event.
+
+    Events are held as columns rather than a list of dicts: lat, lng, epoch
+    seconds, seconds of the day, and small integer codes into the types and
+    descriptions lists. Per-cluster statistics are then computed with
+    vectorized group-bys. Times are naive local times, as in the source data.
+
+    Clustering is DBSCAN on the sphere: eps_km is a great-circle radius, so
+    its meaning does not shift with the data, and neighbours come from a
+    haversine BallTree. Events are first collapsed onto a grid of
+    dedupe_deg degrees (about 100 m by default) and clustered as weighted
+    points, which keeps archives with many repeat locations from blowing up
+    the neighbourhood lists. With by_type, each disaster type is clustered
+    on its own.
+    """
+
+    def __init__(self, eps_km=100.0, min_samples=2, by_type=False, dedupe_deg=0.001, profile_memory=False):
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.by_type = by_type
+        self.dedupe_deg = dedupe_deg
+        self.profile_memory = profile_memory
+        self.model = DBSCAN(eps=eps_km / EARTH_RADIUS_KM, min_samples=min_samples,
+                            metric='haversine', algorithm='ball_tree')
         self.is_trained = False
-        self.historical_data = []
+        self.fit_stats = {}
+        self.set_events([], [], [])
+
+    def __len__(self):
+        return len(self.lat)
+
+    def set_events(self, lat, lng, epoch, type_codes=None, types=(), description_codes=None, descriptions=()):
+        """Replaces the events with ready-made columns."""
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.epoch = np.asarray(epoch, dtype=np.int64)
+        self.time_of_day = (self.epoch % SECONDS_PER_DAY).astype(np.int32)
+        count = len(self.lat)
+        self.type_codes = np.zeros(count, np.int16) if type_codes is None else np.asarray(type_codes, np.int16)
+        self.types = list(types)
+        self.description_codes = (np.zeros(count, np.int32) if description_codes is None
+                                  else np.asarray(description_codes, np.int32))
+        self.descriptions = list(descriptions)
+        self.is_trained = False
+
+    def load_records(self, records):
+        """Loads events given as dicts with place, date, time, description and type."""
+        self.set_events(*_parse_records(records))
+
+    def add_records(self, records):
+        """
+        Appends events (dicts as for load_records). On a trained model only
+        the clusters within reach of the new events are recomputed; see
+        _update_clusters. Returns the number of events appended.
+        """
+        if not records:
+            return 0
+        lat, lng, epoch, type_codes, types, description_codes, descriptions = _parse_records(records)
+        type_codes = _intern(self.types, types)[type_codes]
+        description_codes = _intern(self.descriptions, descriptions)[description_codes]
+        added = np.arange(len(self), len(self) + len(records))
+        trained = self.is_trained
+        self.lat = np.concatenate([self.lat, lat])
+        self.lng = np.concatenate([self.lng, lng])
+        self.epoch = np.concatenate([self.epoch, epoch.astype(np.int64)])
+        self.time_of_day = np.concatenate([self.time_of_day, (epoch % SECONDS_PER_DAY).astype(np.int32)])
+        self.type_codes = np.concatenate([self.type_codes, type_codes.astype(np.int16)])
+        self.description_codes = np.concatenate([self.description_codes, description_codes.astype(np.int32)])
+        if trained:
+            self.model.labels_ = np.r_[self.model.labels_, np.full(len(added), -1, dtype=np.int64)]
+            self._update_clusters(added)
+        return len(added)
 
     def load_historical_data(self, file_path='historical_disasters.json'):
         """Loads historical disaster data from a JSON file.""" 
         with open(file_path, 'r') as f:
-            self.historical_data = json.load(f)
+            self.load_records(json.load(f))
 
-    def train(self):
-        """Trains the DBSCAN model on historical disaster locations."""
-        if not self.historical_data:
-            self.is_trained = False
-            return
+    def memory_bytes(self):
+        """Memory held by the event columns."""
+        return sum(a.nbytes for a in (self.lat, self.lng, self.epoch, self.time_of_day,
+                                      self.type_codes, self.description_codes))
 
-        locations = [d['place'] for d in self.historical_data]
-        if len(locations) < self.model.min_samples:
+    def train(self):
+        """
+        Clusters the events and records fit_stats: events, distinct points,
+        clusters, noise, fit_seconds and, with profile_memory, peak_bytes
+        allocated during the fit.
+        """
+        if len(self) < self.min_samples:
             self.is_trained = False
             return
 
-        locations_array = np.array([[loc['lat'], loc['lng']] for loc in locations])
+        tracing = self.profile_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        labels = np.full(len(self), -1, dtype=np.int64)
+        points = 0
+        groups = [np.flatnonzero(self.type_codes == code) for code in np.unique(self.type_codes)] \
+            if self.by_type else [np.arange(len(self))]
+        for members in groups:
+            group_labels, group_points = self._cluster(members)
+            points += group_points
+            found = group_labels >= 0
+            group_labels[found] += labels.max() + 1
+            labels[members] = group_labels
+        fit_seconds = time.perf_counter() - start
+        peak_bytes = None
+        if tracing:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
 
-        scaled_locations = self.scaler.fit_transform(locations_array)
-        self.model.fit(scaled_locations)
+        self.model.labels_ = labels
         self.is_trained = True
+        self.fit_stats = {
+            "events": len(self),
+            "points": points,
+            "clusters": int(labels.max() + 1),
+            "noise": int((labels < 0).sum()),
+            "fit_seconds": fit_seconds,
+            "peak_bytes": peak_bytes,
+            "event_bytes": self.memory_bytes(),
+        }
+
+    def _cluster(self, members):
+        """Runs DBSCAN on a subset of events. Returns (labels, distinct points clustered)."""
+        coords = np.column_stack([self.lat[members], self.lng[members]])
+        if self.dedupe_deg:
+            coords = np.round(coords / self.dedupe_deg) * self.dedupe_deg
+        points, inverse, weights = np.unique(coords, axis=0, return_inverse=True, return_counts=True)
+        if weights.sum() < self.min_samples:
+            return np.full(len(members), -1, dtype=np.int64), len(points)
+        self.model.fit(np.radians(points), sample_weight=weights)
+        return self.model.labels_[inverse.ravel()].astype(np.int64), len(points)
+
+    def _update_clusters(self, added):
+        """
+        Re-clusters only what the events at indices added can have changed.
+
+        A new event can only turn events within eps of it into core points,
+        and those can only pull in events within eps of themselves, so
+        nothing beyond 2 * eps of the new events changes state - except that
+        clusters reaching into that ring may merge. The region redone is
+        therefore the ring plus every cluster that has a member in it. DBSCAN
+        runs on the region and its eps margin, so edge events see their full
+        neighbourhoods, and only the region's labels are kept. Its clusters
+        reuse the labels they replace before taking new ones.
+        """
+        start = time.perf_counter()
+        labels = np.array(self.model.labels_, dtype=np.int64)
+        # Snapping to the dedupe grid moves each event slightly; widen the reach to cover it.
+        slack_km = 2 * self.dedupe_deg * METERS_PER_DEGREE / 1000
+        pools = {code: np.flatnonzero(self.type_codes == code) for code in np.unique(self.type_codes[added])} \
+            if self.by_type else {0: None}
+        # New events far apart are handled one area at a time, so scattered arrivals do not
+        # turn into one bounding box across the country.
+        cell_deg = 4 * (self.eps_km + slack_km) * 1000 / METERS_PER_DEGREE
+        keys = np.column_stack([self.type_codes[added] if self.by_type else np.zeros(len(added), np.int16),
+                                np.floor(self.lat[added] / cell_deg), np.floor(self.lng[added] / cell_deg)])
+        _, area = np.unique(keys, axis=0, return_inverse=True)
+        area = area.ravel()
+        reclustered, clusters = 0, self.fit_stats.get("clusters", 0)
+        for group in range(area.max() + 1):
+            new = added[area == group]
+            pool = pools[self.type_codes[new[0]] if self.by_type else 0]
+            near = self._within(new, 2 * self.eps_km + slack_km, pool)
+            touched = np.unique(labels[near])
+            touched = touched[touched >= 0]
+            region = np.union1d(near, np.flatnonzero(np.isin(labels, touched)))
+            context = self._in_box(region, self.eps_km + slack_km, pool)
+            context_labels, _ = self._cluster(context)
+            region_labels = context_labels[np.searchsorted(context, region)]
+            found = region_labels >= 0
+            ids = np.unique(region_labels[found])
+            fresh = np.arange(labels.max() + 1, labels.max() + 1 + len(ids))
+            reuse = np.r_[touched, fresh][:len(ids)]
+            relabelled = np.full(len(region), -1, dtype=np.int64)
+            relabelled[found] = reuse[np.searchsorted(ids, region_labels[found])]
+            labels[region] = relabelled
+            reclustered += len(context)
+            clusters += len(ids) - len(touched)
 
-    def _predict_next_occurrence(self, cluster_indices):
-        """Predicts the next occurrence based on historical frequency."""
-        cluster_events = [self.historical_data[i] for i in cluster_indices]
-        
-        for event in cluster_events:
-            event['datetime'] = datetime.strptime(f"{event['date']} {event['time']}", '%Y-%m-%d %H:%M:%S')
-        cluster_events.sort(key=lambda x: x['datetime'])
+        self.model.labels_ = labels
+        self.fit_stats.update({
+            "events": len(self),
+            "clusters": clusters,
+            "noise": int((labels < 0).sum()),
+            "event_bytes": self.memory_bytes(),
+            "last_update": {"events": len(added), "reclustered": reclustered,
+                            "seconds": time.perf_counter() - start},
+        })
 
-        if len(cluster_events) > 1:
-            time_deltas = [(cluster_events[i+1]['datetime'] - cluster_events[i]['datetime']).total_seconds() for i in range(len(cluster_events) - 1)]
-            avg_delta_seconds = np.mean(time_deltas)
-            avg_delta = timedelta(seconds=avg_delta_seconds)
-        else:
-            avg_delta = timedelta(days=365)
+    def _in_box(self, indices, margin_km, pool=None):
+        """Sorted indices of events (from pool, or all) in the bounding box of indices grown by margin_km."""
+        margin = margin_km * 1000 / METERS_PER_DEGREE
+        south, north = self.lat[indices].min() - margin, self.lat[indices].max() + margin
+        lng_margin = margin / np.cos(np.radians(min(89.0, max(abs(south), abs(north)))))
+        west, east = self.lng[indices].min() - lng_margin, self.lng[indices].max() + lng_margin
+        candidates = np.arange(len(self)) if pool is None else pool
+        lat, lng = self.lat[candidates], self.lng[candidates]
+        return candidates[(lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)]
 
-        last_event_time = cluster_events[-1]['datetime']
-        predicted_datetime = last_event_time + avg_delta
+    def _within(self, indices, radius_km, pool=None):
+        """Sorted indices of events (from pool, or all) within radius_km of any event in indices."""
+        candidates = self._in_box(indices, radius_km, pool)
+        tree = BallTree(np.radians(np.column_stack([self.lat[indices], self.lng[indices]])), metric='haversine')
+        coords = np.radians(np.column_stack([self.lat[candidates], self.lng[candidates]]))
+        return candidates[tree.query_radius(coords, r=radius_km / EARTH_RADIUS_KM, count_only=True) > 0]
 
-        seconds_from_midnight = [e['datetime'].time().hour * 3600 + e['datetime'].time().minute * 60 + e['datetime'].time().second for e in cluster_events]
-        avg_seconds = int(np.mean(seconds_from_midnight))
-        avg_time = (datetime.min + timedelta(seconds=avg_seconds)).time()
+    def cluster_statistics(self):
+        """
+        Per-cluster aggregates, one array entry per cluster (noise excluded):
+        label, count, centroid lat/lng, first event index, last event time,
+        mean inter-arrival seconds (one year for single events) and mean
+        seconds of the day.
+        """
+        labels = np.asarray(self.model.labels_)
+        members = np.flatnonzero(labels >= 0)
+        # One stable sort groups the events by cluster, keeping each group in event order.
+        # Up to 65536 clusters the labels fit in uint16, which NumPy radix-sorts in linear time.
+        keys = labels[members]
+        if len(keys) and keys.max() < 2 ** 16:
+            keys = keys.astype(np.uint16)
+        order = members[np.argsort(keys, kind='stable')]
+        sorted_labels = labels[order]
+        starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]) if len(order) else order
+        counts = np.diff(np.r_[starts, len(order)])
 
-        predicted_datetime = predicted_datetime.replace(hour=avg_time.hour, minute=avg_time.minute, second=avg_time.second)
+        def reduce(ufunc, values):
+            return ufunc.reduceat(values[order], starts) if len(order) else values[:0]
 
-        return predicted_datetime
+        first_epoch = reduce(np.minimum, self.epoch)
+        last_epoch = reduce(np.maximum, self.epoch)
+        # The mean gap between consecutive events is the overall span over (count - 1).
+        mean_interval = np.where(counts > 1, (last_epoch - first_epoch) / np.maximum(counts - 1, 1),
+                                 365 * SECONDS_PER_DAY)
+        return {
+            "label": sorted_labels[starts],
+            "count": counts,
+            "lat": reduce(np.add, self.lat) / counts,
+            "lng": reduce(np.add, self.lng) / counts,
+            "first_index": order[starts],
+            "last_epoch": last_epoch,
+            "mean_interval": mean_interval,
+            "mean_time_of_day": reduce(np.add, self.time_of_day.astype(np.int64)) // counts,
+        }
 
-    def get_disaster_zones(self, probability_threshold=0.2):
+    def get_disaster_zones(self, probability_threshold=0.2, now=None):
         """
         Identifies and predicts future disaster-prone zones with realistic timing.
         """
-        if not self.is_trained or not self.historical_data:
+        if not self.is_trained or not len(self):
             return []
 
+        stats = self.cluster_statistics()
+        probability = np.minimum(1.0, stats["count"] / 10.0)
+
+        # Next occurrence: last event plus the mean gap, on the day it lands, at the mean time of day.
+        predicted = stats["last_epoch"] + stats["mean_interval"].astype(np.int64)
+        predicted = predicted - predicted % SECONDS_PER_DAY + stats["mean_time_of_day"]
+        now = np.datetime64(datetime.now() if now is None else now, 's').astype(np.int64)
+
+        keep = np.flatnonzero((probability >= probability_threshold) & (predicted > now))
+        stamps = np.datetime_as_string(predicted[keep].astype('datetime64[s]'))
         zones = []
-        labels = self.model.labels_
-        unique_labels = set(labels)
-
-        locations = np.array([[d['place']['lat'], d['place']['lng']] for d in self.historical_data])
-
-        for label in unique_labels:
-            if label == -1:
-                continue
-
-            cluster_indices = np.where(labels == label)[0]
-            if len(cluster_indices) > 0:
-                cluster_points = locations[cluster_indices]
-                centroid = np.mean(cluster_points, axis=0)
-
-                sample_event = self.historical_data[cluster_indices[0]]
-
-                # New probability calculation
-                probability = min(1.0, len(cluster_points) / 10.0)
-
-                if probability >= probability_threshold:
-                    predicted_datetime = self._predict_next_occurrence(cluster_indices)
-                    
-                    if predicted_datetime > datetime.now():
-                        zones.append({
-                            'lat': centroid[0],
-                            'lng': centroid[1],
-                            'description': f"Predicted high risk of '{sample_event['description']}'. Chance of occurence: {probability:.0%}",
-                            'prob': probability,
-                            'date': predicted_datetime.strftime('%Y-%m-%d'),
-                            'time': predicted_datetime.strftime('%H:%M:%S')
-                        })
+        for i, stamp in zip(keep.tolist(), stamps.tolist()):
+            first = stats["first_index"][i]
+            code = self.description_codes[first]
+            description = self.descriptions[code] if code < len(self.descriptions) else ''
+            type_code = self.type_codes[first]
+            zones.append({
+                'lat': float(stats["lat"][i]),
+                'lng': float(stats["lng"][i]),
+                'description': f"Predicted high risk of '{description}'. Chance of occurence: {probability[i]:.0%}",
+                'prob': float(probability[i]),
+                'type': self.types[type_code] if type_code < len(self.types) else None,
+                'date': stamp[:10],
+                'time': stamp[11:19]
+            })
         return zones
+
+class DisasterEventStore:
+    """
+    Append-only JSON-lines file of disaster events that arrived after the
+    historical archive, in the same record format. Records carrying an 'id'
+    are stored once, so a feed can be replayed safely.
+    """
+
+    def __init__(self, path=os.path.join('instance', 'live_disasters.jsonl')):
+        self.path = path
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Returns every stored record."""
+        with self._lock:
+            return self._read()
+
+    def _read(self):
+        records = []
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # a line cut short by a crash
+        self._ids = {r['id'] for r in records if r.get('id') is not None}
+        return records
+
+    def unseen(self, records):
+        """The records that append() would store, without storing them."""
+        with self._lock:
+            return self._unseen(records)
+
+    def _unseen(self, records):
+        if self._ids is None:
+            self._read()
+        added, ids = [], set()
+        for record in records:
+            record_id = record.get('id')
+            if record_id is not None:
+                if record_id in self._ids or record_id in ids:
+                    continue
+                ids.add(record_id)
+            added.append(record)
+        return added
+
+    def append(self, records):
+        """Stores the records not seen before and returns them."""
+        with self._lock:
+            added = self._unseen(records)
+            self._ids.update(record['id'] for record in added if record.get('id') is not None)
+            if added:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a') as f:
+                    f.writelines(json.dumps(record) + '\n' for record in added)
+            return added
+
+class DisasterZoneCache:
+    """
+    Serves predicted disaster zones from memory.
+
+    refresh() trains a fresh model off to the side and swaps in its zones
+    (and their JSON) together with a new version number, so readers only
+    ever see a complete result and get() is constant time. Only one refresh
+    runs at a time; a second caller returns straight away. The model is only
+    retrained when the historical data file has changed; otherwise the
+    existing clusters are re-projected against the current date. Version
+    tokens carry a per-process epoch, like the zone snapshot's.
+
+    New events go through add_events(): they are kept in the event store
+    (and included whenever the model is retrained) and folded into the
+    current model incrementally, followed by a new version of the zones.
+    """
+
+    def __init__(self, file_path='historical_disasters.json', model_factory=DisasterPredictionModel,
+                 event_store=None):
+        self.file_path = file_path
+        self.model_factory = model_factory
+        self.event_store = event_store
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.updated_at = None
+        self.last_error = None
+        self._model = None
+        self._model_mtime = None
+        self._zones = []
+        self._json = "[]"
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.version > 0
+
+    def get(self):
+        """Returns (version token, zones, zones_json) for the latest completed refresh."""
+        with self._lock:
+            return f"{self.epoch}-{self.version}", self._zones, self._json
+
+    def refresh(self):
+        """Recomputes the predicted zones. Returns False if another refresh is already running."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            mtime = os.path.getmtime(self.file_path)
+            model = self._model
+            if model is None or mtime != self._model_mtime:
+                model = self.model_factory()
+                model.load_historical_data(self.file_path)
+                if self.event_store is not None:
+                    model.add_records(self.event_store.load())
+                model.train()
+                print(f"Disaster model trained: {model.fit_stats}")
+            self._publish(model, mtime)
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Could not refresh disaster zone predictions: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def add_events(self, records):
+        """
+        Stores new events and updates the predictions without a full
+        retrain. Returns how many of the records were new. Waits for a
+        running refresh, which may already have read them from the store.
+        Malformed records are rejected before anything is stored; if the
+        update itself fails, a full refresh is started so the stored events
+        are not left out of the predictions.
+        """
+        with self._refresh_lock:
+            try:
+                added = self.event_store.unseen(records) if self.event_store is not None else list(records)
+                if not added:
+                    return 0
+                _parse_records(added)
+                if self.event_store is not None:
+                    self.event_store.append(added)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Could not add disaster events: {e}")
+                return 0
+            model = self._model
+            if model is None or self._model_mtime is None:
+                return len(added)  # the first (or pending) refresh reads them from the store
+            try:
+                model.add_records(added)
+                if not model.is_trained:
+                    model.train()  # too few events before
+                self._publish(model, self._model_mtime)
+                return len(added)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Could not add disaster events, retraining: {e}")
+                self._model_mtime = None  # the model may be half-updated; only a retrain replaces it
+        self.start()
+        return len(added)
+
+    def events(self):
+        """(lat, lng, epoch) columns of the current model's events, or None before the first refresh."""
+        with self._refresh_lock:
+            model = self._model
+            return None if model is None else (model.lat, model.lng, model.epoch)
+
+    def _publish(self, model, mtime):
+        zones = model.get_disaster_zones()
+        body = json.dumps(zones)
+        with self._lock:
+            self._model, self._model_mtime = model, mtime
+            self._zones, self._json = zones, body
+            self.version += 1
+            self.updated_at = time.time()
+            self.last_error = None
+
+    def metrics(self):
+        """Version, last refresh time and the current model's fit statistics."""
+        with self._lock:
+            model = self._model
+            return {"version": self.version, "updated_at": self.updated_at, "zones": len(self._zones),
+                    "last_error": self.last_error, "fit": dict(model.fit_stats) if model else None}
+
+    def start(self):
+        """Runs the first refresh on a background thread."""
+        thread = threading.Thread(target=self.refresh, name="disaster-zones", daemon=True)
+        thread.start()
+        return thread
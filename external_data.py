@@ -3,83 +3,172 @@
 import requests
 import xml.etree.ElementTree as ET
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 
-def fetch_live_incident_data():
+from spatial_index import tile_bounds, tile_of
+
+# GDACS RSS feed for active disasters
+GDACS_RSS_URL = "https://www.gdacs.org/xml/rss.xml"
+
+# Namespaces used by the GDACS items
+GEORSS_NS = '{http://www.georss.org/georss}'
+GDACS_NS = '{http://www.gdacs.org}'
+
+def parse_gdacs_item(item, country='India'):
     """
-    Fetches live disaster alerts for India from the Global Disaster Alert and Coordination System (GDACS).
-    
-    URL: https://www.gdacs.org/
-    
-    Returns:
-        list: A list of danger zone dictionaries, or an empty list if fetching fails.
+    Turns one RSS <item> element into a danger zone dictionary, or None when
+    it is not about the given country or has no coordinates. The country is
+    checked first so other items cost almost nothing.
     """
-    # GDACS RSS feed for active disasters
-    base_url = "https://www.gdacs.org/xml/rss.xml"
-    
-    live_zones = []
-    
-    # Define namespaces to parse the XML correctly
-    namespaces = {
-        'georss': 'http://www.georss.org/georss',
-        'gdacs': 'http://www.gdacs.org'
-    }
-    
+    country_text = item.findtext(GDACS_NS + 'country')
+    if not country_text or country not in country_text:
+        return None
+
+    # Extract coordinates from the georss:point tag
+    point = item.findtext(GEORSS_NS + 'point')
+    if not point:
+        return None
+    lat_str, lng_str = point.split()
+
+    # Use a unique identifier from the link
+    link = item.findtext('link') or ''
     try:
-        response = requests.get(base_url, timeout=15)
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-        
-        root = ET.fromstring(response.content)
-        
-        print("Successfully fetched GDACS RSS feed.")
-
-        for item in root.findall('.//item'):
-            # Check if the incident is in India
-            country_element = item.find('gdacs:country', namespaces)
-            if country_element is not None and country_element.text is not None and 'India' in country_element.text:
-                
-                title = item.find('title').text
-                link = item.find('link').text
-                
-                # Extract coordinates from the georss:point tag
-                point = item.find('georss:point', namespaces)
-                if point is not None and point.text:
-                    lat_str, lng_str = point.text.split()
-                    lat, lng = float(lat_str), float(lng_str)
-                    
-                    # Use a unique identifier from the link
-                    try:
-                        guid = link.split('eventid=')[1].split('&')[0]
-                    except IndexError:
-                        guid = "unknown"
-
-                    live_zones.append({
-                        "id": f"ext_gdacs_{guid}",
-                        "lat": lat,
-                        "lng": lng,
-                        "radius": 50000,  # 50km radius for a disaster alert
-                        "type": "external",
-                        "description": title
-                    })
+        guid = link.split('eventid=')[1].split('&')[0]
+    except IndexError:
+        guid = "unknown"
 
-    except requests.exceptions.RequestException as e:
-        print(f"Could not fetch live incident data: {e}")
-        return [] # Return empty list on failure
-    except ET.ParseError as e:
-        print(f"Could not parse GDACS RSS feed: {e}")
-        return []
-        
-    #print(f"Found {(live_zones)} relevant alerts for India.")
-    return live_zones
+    try:
+        published = parsedate_to_datetime(item.findtext('pubDate')).isoformat()
+    except (TypeError, ValueError):
+        published = None
 
-def fetch_police_locations_from_api(bbox):
-    """Fetches police station locations from the Geoapify Places API."""
+    return {
+        "id": f"ext_gdacs_{guid}",
+        "lat": float(lat_str),
+        "lng": float(lng_str),
+        "radius": 50000,  # 50km radius for a disaster alert
+        "type": "external",
+        "description": item.findtext('title'),
+        "published": published
+    }
+
+class GdacsFeed:
+    """
+    Polls the GDACS RSS feed and keeps the current set of alert zones for a country.
+
+    Requests are conditional (If-None-Match / If-Modified-Since), so an
+    unchanged feed costs a 304 and no parsing. A changed feed is parsed as
+    it streams in with iterparse, dropping each item once it has been
+    looked at. poll() reports only the zones added, changed or removed
+    since the previous poll; a failed poll keeps the previous zones.
+    """
+
+    def __init__(self, url=GDACS_RSS_URL, country='India', timeout=15):
+        self.url = url
+        self.country = country
+        self.timeout = timeout
+        self.zones = {}  # zone id -> zone
+        self._etag = None
+        self._last_modified = None
+        self._session = requests.Session()
+        self._stats = {"fetches": 0, "not_modified": 0, "unchanged": 0, "changed": 0, "errors": 0,
+                       "items_seen": 0, "last_status": None, "last_fetch_ms": 0.0, "max_fetch_ms": 0.0,
+                       "total_fetch_ms": 0.0, "last_error": None}
+
+    def poll(self):
+        """
+        Fetches the feed if it has changed. Returns {"added", "changed",
+        "removed"} (zones, zones, zone ids), or None when nothing changed or
+        the fetch failed.
+        """
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        start = time.perf_counter()
+        self._stats["fetches"] += 1
+        try:
+            with self._session.get(self.url, headers=headers, timeout=self.timeout, stream=True) as response:
+                self._stats["last_status"] = response.status_code
+                if response.status_code == 304:
+                    self._stats["not_modified"] += 1
+                    return None
+                response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+                response.raw.decode_content = True
+                zones = self._parse(response.raw)
+                self._etag = response.headers.get('ETag')
+                self._last_modified = response.headers.get('Last-Modified')
+        except requests.exceptions.RequestException as e:
+            return self._failed(f"Could not fetch live incident data: {e}")
+        except ET.ParseError as e:
+            return self._failed(f"Could not parse GDACS RSS feed: {e}")
+        finally:
+            self._timed(start)
+
+        diff = {
+            "added": [zone for zone_id, zone in zones.items() if zone_id not in self.zones],
+            "changed": [zone for zone_id, zone in zones.items()
+                        if zone_id in self.zones and self.zones[zone_id] != zone],
+            "removed": [zone_id for zone_id in self.zones if zone_id not in zones],
+        }
+        self.zones = zones
+        if not any(diff.values()):
+            self._stats["unchanged"] += 1
+            return None
+        self._stats["changed"] += 1
+        return diff
+
+    def _parse(self, stream):
+        zones = {}
+        for _, element in ET.iterparse(stream, events=('end',)):
+            if element.tag != 'item':
+                continue
+            self._stats["items_seen"] += 1
+            zone = parse_gdacs_item(element, self.country)
+            if zone is not None:
+                zones[zone["id"]] = zone
+            element.clear()
+        return zones
+
+    def _failed(self, message):
+        print(message)
+        self._stats["errors"] += 1
+        self._stats["last_error"] = message
+        return None
+
+    def _timed(self, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["last_fetch_ms"] = elapsed_ms
+        self._stats["max_fetch_ms"] = max(self._stats["max_fetch_ms"], elapsed_ms)
+        self._stats["total_fetch_ms"] += elapsed_ms
+
+    def metrics(self):
+        """Fetch counts by outcome, fetch latency and the number of zones held."""
+        stats = dict(self._stats)
+        total_ms = stats.pop("total_fetch_ms")
+        stats.update({"zones": len(self.zones), "avg_fetch_ms": total_ms / stats["fetches"] if stats["fetches"] else 0.0,
+                      "etag": self._etag, "last_modified": self._last_modified})
+        return stats
+
+def fetch_police_tile(south, west, north, east):
+    """
+    Fetches police station locations in one box from the Geoapify Places API.
+    Returns None when the request fails, so the caller can tell that apart from no stations.
+    """
     api_key = os.environ.get("GEOAPIFY_API_KEY")
     if not api_key:
         print("Geoapify API key not found in environment variables.")
-        return []
+        return None
 
-    # bbox format: west,south,east,north
-    url = f"https://api.geoapify.com/v2/places?categories=service.police&filter=rect:{bbox}&limit=500&apiKey={api_key}"
+    # rect format: west,south,east,north
+    url = (f"https://api.geoapify.com/v2/places?categories=service.police"
+           f"&filter=rect:{west:.6f},{south:.6f},{east:.6f},{north:.6f}&limit=500&apiKey={api_key}")
 
     try:
         response = requests.get(url, timeout=20)
@@ -99,12 +188,141 @@ def fetch_police_locations_from_api(bbox):
                     "notes": properties.get("address_line2", "No additional details")
                 })
         
-        print(f"Fetched {len(police_locations)} police locations from Geoapify.")
         return police_locations
         
     except requests.exceptions.RequestException as e:
         print(f"Could not fetch police locations from Geoapify: {e}")
-        return []
+        return None
     except Exception as e:
         print(f"An error occurred while processing Geoapify data: {e}")
-        return []
+        return None
+
+class PoliceLocationCache:
+    """
+    Police station lookups by viewport, served from cached map tiles.
+
+    A viewport is snapped to the Web Mercator tiles covering it at
+    tile_zoom, or at the deepest coarser zoom that needs no more than
+    max_tiles_per_request tiles, so small pans map onto the same tiles.
+    Each tile is fetched once and kept for ttl_seconds, least recently used
+    tiles going first beyond max_entries. Callers missing the same tile at
+    the same time share one fetch, and a caller missing several fetches
+    them in parallel. The answer is the union of the tiles' stations,
+    trimmed to the viewport. If a refetch fails, the expired tile is served.
+    """
+
+    def __init__(self, fetch=fetch_police_tile, tile_zoom=12, max_tiles_per_request=16, ttl_seconds=3600,
+                 max_entries=4096, max_workers=4, wait_seconds=30):
+        self.fetch = fetch
+        self.tile_zoom = tile_zoom
+        self.max_tiles_per_request = max_tiles_per_request
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self.wait_seconds = wait_seconds
+        self._entries = OrderedDict()  # (z, x, y) -> (fetched_at, locations), least recently used first
+        self._inflight = {}            # (z, x, y) -> Event set when its fetch finishes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "fetch_errors": 0,
+                       "stale_served": 0, "last_fetch_ms": 0.0, "max_fetch_ms": 0.0, "total_fetch_ms": 0.0}
+
+    def tiles_for(self, south, west, north, east):
+        """Tiles (z, x, y) covering a box, at the deepest zoom up to tile_zoom within the tile budget."""
+        for z in range(self.tile_zoom, -1, -1):
+            x0, y0 = tile_of(north, west, z)
+            x1, y1 = tile_of(south, east, z)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= self.max_tiles_per_request or z == 0:
+                return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def get(self, south, west, north, east):
+        """Police stations inside the box, as fetch_police_tile returns them."""
+        keys = self.tiles_for(south, west, north, east)
+        now = time.monotonic()
+        found, owned, waiting = {}, [], []
+        with self._lock:
+            self._stats["requests"] += 1
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                    self._stats["hits"] += 1
+                elif key in self._inflight:
+                    waiting.append((key, self._inflight[key]))
+                    self._stats["coalesced"] += 1
+                else:
+                    self._inflight[key] = threading.Event()
+                    owned.append(key)
+                    self._stats["misses"] += 1
+
+        if len(owned) > 1:
+            found.update(zip(owned, self._get_executor().map(self._load, owned)))
+        elif owned:
+            found[owned[0]] = self._load(owned[0])
+        for key, event in waiting:
+            event.wait(self.wait_seconds)
+            with self._lock:
+                entry = self._entries.get(key)
+            found[key] = entry[1] if entry else []
+
+        merged = {}
+        for key in keys:
+            for location in found.get(key) or []:
+                if south <= location["latitude"] <= north and west <= location["longitude"] <= east:
+                    merged[location["id"]] = location
+        return list(merged.values())
+
+    def _load(self, key):
+        """Fetches one tile, stores it and wakes anyone waiting for it."""
+        start = time.perf_counter()
+        locations = None
+        try:
+            locations = self.fetch(*tile_bounds(*key))
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats["fetches"] += 1
+                self._stats["last_fetch_ms"] = elapsed_ms
+                self._stats["max_fetch_ms"] = max(self._stats["max_fetch_ms"], elapsed_ms)
+                self._stats["total_fetch_ms"] += elapsed_ms
+                if locations is not None:
+                    self._entries[key] = (time.monotonic(), locations)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                else:
+                    self._stats["fetch_errors"] += 1
+                    stale = self._entries.get(key)
+                    if stale is not None:
+                        self._stats["stale_served"] += 1
+                        locations = stale[1]
+                self._inflight.pop(key).set()
+        return locations or []
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="police-tiles")
+            return self._executor
+
+    def metrics(self):
+        """Hit, miss and coalescing counts, Geoapify fetch latency and cached tiles."""
+        with self._lock:
+            stats = dict(self._stats, tiles=len(self._entries), inflight=len(self._inflight))
+        total_ms = stats.pop("total_fetch_ms")
+        stats["avg_fetch_ms"] = total_ms / stats["fetches"] if stats["fetches"] else 0.0
+        stats["hit_rate"] = stats["hits"] / max(1, stats["hits"] + stats["misses"] + stats["coalesced"])
+        return stats
+
+police_cache = PoliceLocationCache()
+
+def fetch_police_locations_from_api(bbox):
+    """
+    Police station locations in a 'west,south,east,north' bounding box, served
+    through the tile cache. Raises ValueError for a malformed bbox.
+    """
+    west, south, east, north = (float(part) for part in bbox.split(","))
+    if south > north or west > east:
+        raise ValueError("bbox must be west,south,east,north")
+    return police_cache.get(south, west, north, east)
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+
+OUTSIDE = "outside"
+APPROACHING = "approaching"
+INSIDE = "inside"
+EXITED = "exited"
+
+# Alert types written on transitions, and the state each one implies.
+ALERT_STATES = {
+    "approaching_danger_zone": APPROACHING,
+    "danger_zone_entry": INSIDE,
+    "danger_zone_exit": EXITED,
+}
+
+class GeofenceStateTracker:
+    """
+    Remembers, per tourist and zone, whether they are outside, approaching,
+    inside or have just exited, so alerts are only written on transitions.
+
+    - Hysteresis: a tourist inside a zone only exits once they are more than
+      hysteresis_km beyond its boundary, and an approaching/exited state is
+      only cleared beyond the approaching buffer plus hysteresis_km, so GPS
+      jitter along a boundary does not produce alert storms.
+    - Dwell: entry is confirmed after min_inside_fixes consecutive fixes
+      inside and at least dwell_seconds since the first of them.
+    - Prediction: when the caller passes projected entry times (etas), a
+      tourist is approaching only if they will enter within
+      entry_horizon_seconds, and stays so while the projection is within
+      1.5x the horizon, instead of whenever they are near a zone.
+    - Memory is bounded to max_users tourists, least recently seen dropped first.
+    """
+
+    def __init__(self, approaching_distance_km=1.0, hysteresis_km=0.05, min_inside_fixes=1,
+                 dwell_seconds=0, entry_horizon_seconds=300, max_users=100000):
+        self.approaching_distance_km = approaching_distance_km
+        self.entry_horizon_seconds = entry_horizon_seconds
+        self.hysteresis_km = hysteresis_km
+        self.min_inside_fixes = min_inside_fixes
+        self.dwell_seconds = dwell_seconds
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> {zone_id: state dict}
+        self._lock = threading.Lock()
+
+    @property
+    def search_distance_km(self):
+        """How far beyond zone boundaries callers must look when building hits."""
+        return self.approaching_distance_km + self.hysteresis_km
+
+    def __len__(self):
+        return len(self._users)
+
+    def _states_for(self, user_id):
+        states = self._users.get(user_id)
+        if states is None:
+            states = self._users[user_id] = {}
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return states
+
+    @property
+    def keep_horizon_seconds(self):
+        """How far ahead callers must project entries so approaching states are kept."""
+        return self.entry_horizon_seconds * 1.5
+
+    def update(self, user_id, hits, now=None, etas=None):
+        """
+        Feeds one fix for a tourist.
+        :param hits: (zone, distance_km) pairs for every zone within
+                     search_distance_km of its boundary, plus every zone in etas;
+                     distance is to the centre.
+        :param etas: Optional {zone_id: seconds to entry} for the zones the
+                     tourist is projected to enter within keep_horizon_seconds.
+                     None falls back to the distance rule (e.g. no velocity yet).
+        :return: A list of {"type", "zone", "distance_km"} transitions to alert on.
+        """
+        now = time.time() if now is None else now
+        transitions = []
+        with self._lock:
+            states = self._states_for(user_id)
+            seen = set()
+            for zone, distance_km in hits:
+                zone_id = zone.get("id")
+                seen.add(zone_id)
+                boundary_km = distance_km - zone["radius"] / 1000
+                event = self._step(states, zone_id, boundary_km, now, etas)
+                if zone_id in states:
+                    states[zone_id]["zone"] = zone
+                if event:
+                    transitions.append({"type": event, "zone": zone, "distance_km": distance_km})
+
+            # Zones no longer in range: anyone still inside has clearly left.
+            for zone_id in [zid for zid in states if zid not in seen]:
+                state = states.pop(zone_id)
+                if state["state"] == INSIDE:
+                    transitions.append({"type": "danger_zone_exit", "zone": state["zone"], "distance_km": None})
+
+            if not states:
+                self._users.pop(user_id, None)
+        return transitions
+
+    def _step(self, states, zone_id, boundary_km, now, etas=None):
+        state = states.get(zone_id) or {"state": OUTSIDE, "inside_fixes": 0, "inside_since": None, "zone": {}}
+        states[zone_id] = state
+        current = state["state"]
+
+        if current == INSIDE:
+            if boundary_km <= self.hysteresis_km:
+                return None
+            state.update(state=EXITED, inside_fixes=0, inside_since=None)
+            return "danger_zone_exit"
+
+        if boundary_km <= 0:
+            state["inside_fixes"] += 1
+            if state["inside_since"] is None:
+                state["inside_since"] = now
+            if state["inside_fixes"] >= self.min_inside_fixes and now - state["inside_since"] >= self.dwell_seconds:
+                state.update(state=INSIDE)
+                return "danger_zone_entry"
+            return None
+
+        state.update(inside_fixes=0, inside_since=None)
+        if etas is None:
+            in_range = boundary_km <= self.search_distance_km
+            approaching = boundary_km <= self.approaching_distance_km
+        else:
+            eta = etas.get(zone_id)
+            in_range = eta is not None or boundary_km <= self.hysteresis_km
+            approaching = eta is not None and eta <= self.entry_horizon_seconds
+        if not in_range:
+            del states[zone_id]
+            return None
+        if current == OUTSIDE and approaching:
+            state["state"] = APPROACHING
+            return "approaching_danger_zone"
+        if current == OUTSIDE:
+            # Inside the hysteresis band only; not worth remembering yet.
+            del states[zone_id]
+        return None
+
+    def state_of(self, user_id, zone_id):
+        """Returns the tracked state of a tourist for a zone."""
+        with self._lock:
+            state = self._users.get(user_id, {}).get(zone_id)
+            return state["state"] if state else OUTSIDE
+
+    def rebuild(self, alerts):
+        """
+        Restores states from recently logged alerts (dicts with 'user_id',
+        'type', 'timestamp' and details.zone), e.g. after a restart.
+        """
+        with self._lock:
+            self._users.clear()
+            for alert in sorted(alerts, key=lambda a: a.get("timestamp") or 0):
+                new_state = ALERT_STATES.get(alert.get("type"))
+                zone = (alert.get("details") or {}).get("zone")
+                if not new_state or not isinstance(zone, dict) or not alert.get("user_id"):
+                    continue
+                states = self._states_for(alert["user_id"])
+                states[zone.get("id")] = {"state": new_state, "inside_fixes": 0, "inside_since": None, "zone": zone}
@@ -0,0 +1,121 @@
+import heapq
+import threading
+import time
+import zlib
+
+def shard_of(user_id, shard_count):
+    """Stable shard number for a user, the same in every process."""
+    return zlib.crc32(str(user_id).encode("utf-8")) % shard_count
+
+class InactivityMonitor:
+    """
+    Tracks when each tourist was last seen and reports the ones who go quiet.
+
+    Every fix pushes a deadline (last seen + threshold) onto a min-heap, so a
+    tick only pops the deadlines that have passed instead of scanning every
+    tourist. Older heap entries for a user are skipped when popped. A user is
+    reported once per inactivity episode; the next fix starts a new one.
+    Users idle for forget_seconds are dropped to keep memory bounded.
+
+    With shard_count > 1, each worker process owns the users whose
+    shard_of() equals its shard_index and ignores everyone else.
+    """
+
+    def __init__(self, threshold_seconds=300, forget_seconds=24 * 3600, shard_index=0, shard_count=1):
+        self.threshold_seconds = threshold_seconds
+        self.forget_seconds = forget_seconds
+        self.shard_index = shard_index
+        self.shard_count = max(1, shard_count)
+        self._users = {}  # user_id -> [last_seen, alerted]
+        self._heap = []   # (deadline, user_id, last_seen)
+        self._lock = threading.Lock()
+        self._stats = {"alerts": 0, "resumed": 0, "forgotten": 0}
+
+    def __len__(self):
+        return len(self._users)
+
+    def owns(self, user_id):
+        return self.shard_count == 1 or shard_of(user_id, self.shard_count) == self.shard_index
+
+    def touch(self, user_id, last_seen, now=None):
+        """
+        Records activity at last_seen (epoch seconds). Older timestamps are
+        ignored, and so is activity that was already forget_seconds old at
+        now, when given. Returns True if this ended an inactivity episode.
+        """
+        if last_seen is None or not self.owns(user_id):
+            return False
+        if now is not None and last_seen <= now - self.forget_seconds:
+            return False  # long gone: seeding it would only alert on it again
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None and last_seen <= state[0]:
+                return False
+            resumed = bool(state and state[1])
+            self._users[user_id] = [last_seen, False]
+            heapq.heappush(self._heap, (last_seen + self.threshold_seconds, user_id, last_seen))
+            if resumed:
+                self._stats["resumed"] += 1
+            self._compact()
+            return resumed
+
+    def load(self, locations, parse_time, alerts=(), now=None):
+        """
+        Seeds the monitor from latest-location records (dicts with 'user_id'
+        and 'timestamp'), e.g. at startup. Users with an 'inactivity' alert
+        logged after their last fix are not reported again, and users last
+        seen forget_seconds or more before now are left out, so a forgotten
+        user is never re-seeded by a later sync.
+        """
+        now = time.time() if now is None else now
+        for location in locations:
+            if isinstance(location, dict) and location.get("user_id"):
+                self.touch(location["user_id"], parse_time(location.get("timestamp")), now=now)
+        with self._lock:
+            for alert in alerts:
+                state = self._users.get(alert.get("user_id"))
+                if alert.get("type") == "inactivity" and state and (alert.get("timestamp") or 0) >= state[0]:
+                    state[1] = True
+
+    def expire(self, now=None):
+        """
+        Pops every deadline that has passed. Returns {"user_id", "last_seen",
+        "idle_seconds"} for users who just became inactive.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, user_id, last_seen = heapq.heappop(self._heap)
+                state = self._users.get(user_id)
+                if state is None or state[0] != last_seen:
+                    continue  # superseded by a newer fix
+                if state[1]:
+                    # Second deadline of an episode: the user has been gone long enough to forget.
+                    del self._users[user_id]
+                    self._stats["forgotten"] += 1
+                    continue
+                state[1] = True
+                self._stats["alerts"] += 1
+                expired.append({"user_id": user_id, "last_seen": last_seen, "idle_seconds": now - last_seen})
+                heapq.heappush(self._heap, (last_seen + self.forget_seconds, user_id, last_seen))
+        return expired
+
+    def _compact(self):
+        # Every fix leaves a stale entry behind; rebuild once they dominate the heap.
+        if len(self._heap) > 2 * len(self._users) + 1024:
+            self._heap = [(state[0] + (self.forget_seconds if state[1] else self.threshold_seconds), user_id, state[0])
+                          for user_id, state in self._users.items()]
+            heapq.heapify(self._heap)
+
+    def last_seen(self, user_id):
+        """Epoch seconds of the user's newest recorded activity, or None if they are not tracked here."""
+        with self._lock:
+            state = self._users.get(user_id)
+            return state[0] if state else None
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, users=len(self._users), heap=len(self._heap),
+                        inactive=sum(1 for state in self._users.values() if state[1]),
+                        shard=f"{self.shard_index}/{self.shard_count}")
@@ -0,0 +1,172 @@
+import atexit
+import queue
+import threading
+import time
+
+class LocationIngestQueue:
+    """
+    Bounded write-behind buffer for tourist GPS fixes.
+
+    Request threads only enqueue; a background thread drains the queue and
+    hands batches to the writer, either when batch_size points are waiting
+    or flush_interval seconds after the first one arrived. When the queue is
+    full, submit() returns False so the caller can push back on the client.
+
+    Failed writes are retried, except when the writer rejects the data
+    itself (ValueError or TypeError, e.g. a NaN that cannot be serialized):
+    then the batch is split in halves until the offending fixes are isolated
+    and dropped, so one bad fix cannot take other tourists' fixes with it.
+    """
+
+    def __init__(self, writer, max_size=10000, batch_size=500, flush_interval=1.0, max_retries=3):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "written": 0,
+            "dropped": 0,
+            "invalid": 0,
+            "batches": 0,
+            "failures": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # --- Producer side ---
+    def submit(self, user_id, lat, lng, timestamp):
+        """Queues one fix. Returns False if the queue is full."""
+        return self.submit_many([(user_id, lat, lng, timestamp)]) == 1
+
+    def submit_many(self, points):
+        """
+        Queues several fixes, all or nothing, so a batch is never half-stored.
+        Returns the number of fixes accepted (0 or len(points)).
+        """
+        self.start()
+        points = list(points)
+        with self._submit_lock:
+            if self.max_size - self._queue.qsize() < len(points):
+                self._count("rejected", len(points))
+                return 0
+            for point in points:
+                self._queue.put_nowait(point)
+        self._count("submitted", len(points))
+        return len(points)
+
+    # --- Consumer side ---
+    def start(self):
+        """Starts the background flusher once."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="location-ingest", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        """Stops the flusher and writes whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        """Synchronously writes everything currently queued."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._flush_lock:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            try:
+                self.writer(batch)
+            except (ValueError, TypeError) as e:
+                # Retrying the same data cannot help; write around the fixes the writer rejects.
+                self._count("failures")
+                if len(batch) == 1:
+                    print(f"Dropping unwritable location fix {batch[0]!r}: {e}")
+                    self._count("invalid")
+                    self._count("dropped")
+                    return
+                middle = len(batch) // 2
+                self._write_batch(batch[:middle])
+                self._write_batch(batch[middle:])
+                return
+            except Exception as e:
+                self._count("failures")
+                print(f"Location batch write failed (attempt {attempt + 1}): {e}")
+                time.sleep(min(2 ** attempt * 0.1, 1.0))
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_flush_ms"] = elapsed_ms
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+                self._stats["total_flush_ms"] += elapsed_ms
+            return
+        self._count("dropped", len(batch))
+
+    # --- Metrics ---
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def metrics(self):
+        """Queue depth, throughput counters and flush latency."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats.pop("batches")
+        total_ms = stats.pop("total_flush_ms")
+        stats.update({
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "batches": batches,
+            "avg_flush_ms": total_ms / batches if batches else 0.0,
+        })
+        return stats
@@ -0,0 +1,240 @@
+import math
+import threading
+from collections import OrderedDict, deque
+
+from anomaly_detection import METERS_PER_DEGREE, haversine
+
+IMPOSSIBLE_JUMP = "impossible_jump"
+SUDDEN_STOP = "sudden_stop"
+ERRATIC_SPEED = "erratic_speed"
+LOOP = "loop"
+
+class _Track:
+    """Constant-size streaming state for one tourist."""
+    __slots__ = ("fixes", "segments", "moving", "speed_sum", "speed_sq_sum", "path_m", "speed_kmh",
+                 "stopped_since", "moving_before_stop", "active", "cell")
+
+    def __init__(self, window):
+        self.fixes = deque(maxlen=window)         # (t, lat, lng)
+        self.segments = deque(maxlen=window - 1)  # (length_m, speed_kmh) between consecutive fixes
+        self.moving = 0                           # segments in the window faster than stop_kmh
+        self.speed_sum = 0.0                      # speed sums over those moving segments
+        self.speed_sq_sum = 0.0
+        self.path_m = 0.0
+        self.speed_kmh = 0.0                      # smoothed speed
+        self.stopped_since = None
+        self.moving_before_stop = False
+        self.active = set()                       # conditions currently alerted on
+        self.cell = None
+
+class KinematicsMonitor:
+    """
+    Streaming movement checks run on every stored fix, with no model fitting.
+
+    Each tourist keeps a ring buffer of their last few fixes plus running
+    sums over it, so a fix costs O(window) = O(1) work and memory per tourist
+    is constant. Flags:
+    - impossible_jump: a step implying more than max_speed_kmh over more than jump_min_m.
+    - sudden_stop: stationary for stop_seconds right after moving at moving_kmh
+      or more, somewhere with no other tracked tourist in the surrounding cells.
+    - erratic_speed: the speeds of the moving steps in the window vary by more
+      than erratic_cv times their mean (cleared below 3/4 of that).
+    - loop: the window covers at least loop_min_m of path but ends up within
+      loop_ratio of that distance from where it started.
+    Conditions other than jumps are reported once, when they start.
+    """
+
+    def __init__(self, window=8, max_speed_kmh=250.0, jump_min_m=1000.0, moving_kmh=15.0, stop_kmh=1.0,
+                 stop_seconds=180, erratic_cv=1.0, erratic_min_kmh=3.0, loop_min_m=400.0, loop_ratio=0.15,
+                 smoothing=0.3, remote_cell_deg=0.01, max_users=100000):
+        self.window = max(3, window)
+        self.max_speed_kmh = max_speed_kmh
+        self.jump_min_m = jump_min_m
+        self.moving_kmh = moving_kmh
+        self.stop_kmh = stop_kmh
+        self.stop_seconds = stop_seconds
+        self.erratic_cv = erratic_cv
+        self.erratic_min_kmh = erratic_min_kmh
+        self.loop_min_m = loop_min_m
+        self.loop_ratio = loop_ratio
+        self.smoothing = smoothing
+        self.remote_cell_deg = remote_cell_deg
+        self.max_users = max_users
+        self._tracks = OrderedDict()  # user_id -> _Track, least recently updated first
+        self._occupancy = {}          # grid cell -> tourists whose latest fix is in it
+        self._lock = threading.Lock()
+        self._stats = {"fixes": 0, "ignored": 0, IMPOSSIBLE_JUMP: 0, SUDDEN_STOP: 0, ERRATIC_SPEED: 0, LOOP: 0}
+
+    def __len__(self):
+        return len(self._tracks)
+
+    # --- Tourist density, for "remote" ---
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.remote_cell_deg), math.floor(lng / self.remote_cell_deg))
+
+    def _move(self, track, cell):
+        if track.cell == cell:
+            return
+        if track.cell is not None:
+            count = self._occupancy.get(track.cell, 0) - 1
+            if count > 0:
+                self._occupancy[track.cell] = count
+            else:
+                self._occupancy.pop(track.cell, None)
+        if cell is not None:
+            self._occupancy[cell] = self._occupancy.get(cell, 0) + 1
+        track.cell = cell
+
+    def is_remote(self, lat, lng):
+        """True when no other tracked tourist's latest fix is in the 3x3 cells around a point."""
+        row, col = self._cell(lat, lng)
+        nearby = sum(self._occupancy.get((row + dr, col + dc), 0) for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+        return nearby <= 1
+
+    # --- Updates ---
+    def update(self, user_id, lat, lng, timestamp):
+        """
+        Feeds one fix (timestamp in epoch seconds; fixes without one are ignored).
+        :return: A list of {"type", "details"} anomalies raised by this fix.
+        """
+        with self._lock:
+            if timestamp is None:
+                # Unparseable times must never reach the buffer, where they would break every comparison.
+                self._stats["ignored"] += 1
+                return []
+            track = self._tracks.get(user_id)
+            if track is None:
+                track = self._tracks[user_id] = _Track(self.window)
+                if len(self._tracks) > self.max_users:
+                    _, dropped = self._tracks.popitem(last=False)
+                    self._move(dropped, None)
+            else:
+                self._tracks.move_to_end(user_id)
+
+            if track.fixes and timestamp <= track.fixes[-1][0]:
+                self._stats["ignored"] += 1
+                return []
+            self._stats["fixes"] += 1
+            self._move(track, self._cell(lat, lng))
+            if not track.fixes:
+                track.fixes.append((timestamp, lat, lng))
+                return []
+
+            t0, lat0, lng0 = track.fixes[-1]
+            length_m = haversine(lat0, lng0, lat, lng) * 1000
+            speed_kmh = length_m / (timestamp - t0) * 3.6
+            if speed_kmh > self.max_speed_kmh and length_m > self.jump_min_m:
+                # Either the fix is wrong or the tourist was moved; start the window afresh.
+                self._reset(track)
+                track.fixes.append((timestamp, lat, lng))
+                self._stats[IMPOSSIBLE_JUMP] += 1
+                return [{"type": IMPOSSIBLE_JUMP, "details": {
+                    "from": (lat0, lng0), "to": (lat, lng), "distance_m": length_m,
+                    "seconds": timestamp - t0, "speed_kmh": speed_kmh}}]
+
+            if len(track.segments) == track.segments.maxlen:
+                old_length, old_speed = track.segments[0]
+                track.path_m -= old_length
+                if old_speed >= self.stop_kmh:
+                    track.moving -= 1
+                    track.speed_sum -= old_speed
+                    track.speed_sq_sum -= old_speed * old_speed
+            track.segments.append((length_m, speed_kmh))
+            track.fixes.append((timestamp, lat, lng))
+            track.path_m += length_m
+            if speed_kmh >= self.stop_kmh:
+                track.moving += 1
+                track.speed_sum += speed_kmh
+                track.speed_sq_sum += speed_kmh * speed_kmh
+            previous_kmh = track.speed_kmh
+            track.speed_kmh += self.smoothing * (speed_kmh - track.speed_kmh)
+
+            conditions = {
+                SUDDEN_STOP: self._stopped(track, speed_kmh, previous_kmh, timestamp, lat, lng),
+                ERRATIC_SPEED: self._erratic(track),
+                LOOP: self._looped(track),
+            }
+            anomalies = []
+            for kind, details in conditions.items():
+                if details is None:
+                    track.active.discard(kind)
+                elif kind not in track.active:
+                    track.active.add(kind)
+                    self._stats[kind] += 1
+                    anomalies.append({"type": kind, "details": details})
+            return anomalies
+
+    def _reset(self, track):
+        track.fixes.clear()
+        track.segments.clear()
+        track.moving = 0
+        track.speed_sum = track.speed_sq_sum = track.path_m = track.speed_kmh = 0.0
+        track.stopped_since = None
+        track.moving_before_stop = False
+        track.active.clear()
+
+    def _stopped(self, track, speed_kmh, previous_kmh, timestamp, lat, lng):
+        if speed_kmh >= self.stop_kmh:
+            track.stopped_since = None
+            track.moving_before_stop = False
+            return None
+        if track.stopped_since is None:
+            track.stopped_since = track.fixes[-2][0]
+            track.moving_before_stop = previous_kmh >= self.moving_kmh
+        stopped_for = timestamp - track.stopped_since
+        if track.moving_before_stop and stopped_for >= self.stop_seconds and self.is_remote(lat, lng):
+            return {"location": (lat, lng), "stopped_seconds": stopped_for}
+        return None
+
+    def _erratic(self, track):
+        count = track.moving
+        if count < track.segments.maxlen // 2 + 1:
+            return None
+        mean = track.speed_sum / count
+        if mean < self.erratic_min_kmh:
+            return None
+        std = math.sqrt(max(track.speed_sq_sum / count - mean * mean, 0.0))
+        threshold = self.erratic_cv * (0.75 if ERRATIC_SPEED in track.active else 1.0)
+        if std <= threshold * mean:
+            return None
+        return {"mean_kmh": mean, "std_kmh": std}
+
+    def _looped(self, track):
+        if track.path_m < self.loop_min_m or len(track.fixes) < 3:
+            return None
+        _, lat0, lng0 = track.fixes[0]
+        _, lat1, lng1 = track.fixes[-1]
+        displacement_m = haversine(lat0, lng0, lat1, lng1) * 1000
+        if displacement_m > self.loop_ratio * track.path_m:
+            return None
+        return {"path_m": track.path_m, "displacement_m": displacement_m}
+
+    def velocity(self, user_id, now=None, max_age_seconds=60, min_span_seconds=5, span_seconds=120):
+        """
+        Least-squares velocity (east, north in m/s) over the buffered fixes of
+        the last span_seconds, or None if the newest fix is older than
+        max_age_seconds or the fixes span less than min_span_seconds.
+        """
+        with self._lock:
+            track = self._tracks.get(user_id)
+            fixes = list(track.fixes) if track else []
+        if len(fixes) < 2:
+            return None
+        t_last, lat_last, lng_last = fixes[-1]
+        fixes = [f for f in fixes if f[0] >= t_last - span_seconds]
+        if now is not None and now - t_last > max_age_seconds:
+            return None
+        if t_last - fixes[0][0] < min_span_seconds:
+            return None
+        lng_scale = METERS_PER_DEGREE * math.cos(math.radians(lat_last))
+        t_mean = sum(f[0] for f in fixes) / len(fixes)
+        x_mean = sum((f[2] - lng_last) * lng_scale for f in fixes) / len(fixes)
+        y_mean = sum((f[1] - lat_last) * METERS_PER_DEGREE for f in fixes) / len(fixes)
+        t_var = sum((f[0] - t_mean) ** 2 for f in fixes)
+        vx = sum((f[0] - t_mean) * ((f[2] - lng_last) * lng_scale - x_mean) for f in fixes) / t_var
+        vy = sum((f[0] - t_mean) * ((f[1] - lat_last) * METERS_PER_DEGREE - y_mean) for f in fixes) / t_var
+        return vx, vy
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, users=len(self._tracks))
@@ -0,0 +1,121 @@
+import math
+from datetime import datetime, timezone
+
+MAX_BATCH_FIXES = 5000
+MAX_EPOCH_MS = 253402300799999  # 9999-12-31T23:59:59.999Z, the last instant datetime can format
+
+def decode_polyline(encoded, precision=5):
+    """Decodes a Google encoded polyline into a list of (lat, lng) tuples."""
+    coordinates = []
+    index, lat, lng = 0, 0, 0
+    factor = 10 ** precision
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift, result = 0, 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append((lat / factor, lng / factor))
+    return coordinates
+
+def epoch_ms_to_iso(ms):
+    """Formats epoch milliseconds like JavaScript's Date.toISOString()."""
+    if not 0 <= ms <= MAX_EPOCH_MS:
+        raise ValueError(f"Timestamp out of range: {ms}")
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def epoch_seconds(timestamp):
+    """
+    Epoch seconds of a fix timestamp: an ISO-8601 string (as sent by the
+    browser) or an epoch number in seconds or milliseconds. None if unreadable.
+    """
+    if isinstance(timestamp, bool):
+        return None
+    if isinstance(timestamp, (int, float)):
+        seconds = timestamp / 1000 if timestamp > 1e11 else float(timestamp)
+        return seconds if math.isfinite(seconds) else None
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+def check_coordinate(lat, lng):
+    """Returns (lat, lng) as floats; raises ValueError unless both are finite and on the map."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except TypeError:
+        raise ValueError(f"Coordinates must be numbers: {lat!r}, {lng!r}")
+    if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"Coordinate out of range: {lat}, {lng}")
+    return lat, lng
+
+def parse_fix(fix):
+    """
+    Validates one {"lat", "lng", "timestamp"} fix. Returns (lat, lng,
+    timestamp) with float coordinates; raises ValueError if it is malformed.
+    """
+    if not isinstance(fix, dict) or not all(key in fix for key in ("lat", "lng", "timestamp")):
+        raise ValueError("Expected an object with lat, lng and timestamp")
+    return check_coordinate(fix["lat"], fix["lng"]) + (_check_timestamp(fix["timestamp"]),)
+
+def _check_timestamp(timestamp):
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (str, int, float)) or \
+            (isinstance(timestamp, float) and not math.isfinite(timestamp)):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    return timestamp
+
+def parse_location_batch(data):
+    """
+    Turns a bulk upload into an ordered list of (lat, lng, timestamp) fixes.
+
+    Accepted shapes:
+        {"fixes": [{"lat", "lng", "timestamp"}, ...]}
+        {"polyline": "<encoded>", "timestamps": [...]}
+        {"origin": {"lat", "lng", "timestamp"}, "deltas": [[dlat_e5, dlng_e5, dt_ms], ...]}
+    In the delta form the origin timestamp is in epoch milliseconds and the
+    coordinate deltas are in 1e-5 degrees, matching the polyline precision.
+    Raises ValueError on malformed input.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+
+    if "fixes" in data:
+        fixes = [parse_fix(fix) for fix in data["fixes"]]
+    elif "polyline" in data:
+        points = decode_polyline(data["polyline"])
+        timestamps = data.get("timestamps") or []
+        if len(timestamps) != len(points):
+            raise ValueError("polyline and timestamps must have the same length")
+        fixes = [(lat, lng, _check_timestamp(ts)) for (lat, lng), ts in zip(points, timestamps)]
+    elif "origin" in data and "deltas" in data:
+        origin_lat, origin_lng, origin_ms = parse_fix(data["origin"])
+        lat_e5, lng_e5 = round(origin_lat * 1e5), round(origin_lng * 1e5)
+        try:
+            ms = int(origin_ms)
+            fixes = [(lat_e5 / 1e5, lng_e5 / 1e5, epoch_ms_to_iso(ms))]
+            for dlat, dlng, dt in data["deltas"]:
+                lat_e5, lng_e5, ms = lat_e5 + int(dlat), lng_e5 + int(dlng), ms + int(dt)
+                fixes.append((lat_e5 / 1e5, lng_e5 / 1e5, epoch_ms_to_iso(ms)))
+        except OverflowError:
+            # int() of an infinity, or sums too large to turn back into floats.
+            raise ValueError("Delta out of range")
+    else:
+        raise ValueError("Expected 'fixes', 'polyline' or 'origin' + 'deltas'")
+
+    if not fixes:
+        raise ValueError("Batch is empty")
+    if len(fixes) > MAX_BATCH_FIXES:
+        raise ValueError(f"Batch exceeds {MAX_BATCH_FIXES} fixes")
+    return [check_coordinate(lat, lng) + (timestamp,) for lat, lng, timestamp in fixes]
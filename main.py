@@ -3,21 +3,34 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import time
 import uuid
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session
 from flask_bcrypt import Bcrypt
 from flask_apscheduler import APScheduler
 import random
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import qrcode
 import json
 from web3 import Web3
 import binascii
+import numpy as np
+from collections import OrderedDict
 
 import database
 import external_data
 import anomaly_detection
-from disaster_prediction import DisasterPredictionModel
+from disaster_prediction import DisasterEventStore, DisasterZoneCache
+from spatial_index import tile_bounds, cluster_zones
+from ingest_queue import LocationIngestQueue
+from location_batch import check_coordinate, epoch_seconds, parse_fix, parse_location_batch
+from geofence_state import GeofenceStateTracker
+from detector_registry import DetectorRegistry
+from training_pool import DetectorTrainingPool
+from inactivity_monitor import InactivityMonitor
+from deviation_sweep import DeviationSweep
+from kinematics import KinematicsMonitor
+from risk_raster import RiskRaster, event_fingerprint
 
 # ------------------ App Setup ------------------
 app = Flask(__name__, template_folder='templates')
@@ -26,9 +39,56 @@ app.config['SCHEDULER_TIMEZONE'] = 'UTC'
 bcrypt = Bcrypt(app)
 
 # --- In-memory Stores ---
-external_danger_zones = []
-anomaly_detectors = {}
-disaster_model = DisasterPredictionModel()
+zone_snapshot = database.zone_snapshot
+# GPS fixes are buffered and written to Firebase in batches by a background thread.
+location_queue = LocationIngestQueue(database.add_tourist_locations)
+# Zone alerts are only logged when a tourist's state for a zone changes. With a
+# known velocity, "approaching" means a projected entry within the horizon.
+APPROACHING_DISTANCE_KM = 1.0
+ENTRY_HORIZON_SECONDS = int(os.environ.get("ENTRY_HORIZON_SECONDS", 300))
+geofence_states = GeofenceStateTracker(approaching_distance_km=APPROACHING_DISTANCE_KM,
+                                       entry_horizon_seconds=ENTRY_HORIZON_SECONDS)
+
+def load_planned_path(user_id):
+    """Loads a user's planned route as (lat, lng) tuples, or None."""
+    path = database.get_planned_tourist_path(user_id)
+    if not path or not isinstance(path, list):
+        return None
+    return [(p['lat'], p['lng']) for p in path if isinstance(p, dict) and 'lat' in p and 'lng' in p]
+
+# Last-seen deadlines per tourist; each worker can own a shard of the users ("index/count").
+INACTIVITY_MINUTES = 5
+_shard_index, _, _shard_count = os.environ.get("INACTIVITY_SHARD", "0/1").partition("/")
+inactivity_monitor = InactivityMonitor(threshold_seconds=INACTIVITY_MINUTES * 60,
+                                       shard_index=int(_shard_index), shard_count=int(_shard_count or 1))
+
+# Streaming speed/jump/stall/loop checks, run on every stored fix.
+kinematics_monitor = KinematicsMonitor()
+
+# Trained path-deviation detectors: bounded in memory, cached on disk, rebuilt from the DB on a miss.
+detector_registry = DetectorRegistry(
+    loader=load_planned_path,
+    cache_dir=os.environ.get("DETECTOR_CACHE_DIR", os.path.join(app.instance_path, "detectors")))
+# New planned paths are trained off the request thread; the old model stays in use until then.
+training_pool = DetectorTrainingPool(detector_registry, max_workers=int(os.environ.get("TRAINING_WORKERS", 2)))
+
+def current_detector(user_id):
+    """The user's trained detector, or None; never trains a path that is already queued for training."""
+    return detector_registry.get(user_id, rebuild=not training_pool.is_pending(user_id))
+
+# Background path-deviation check over every active tourist, bounded to a time budget per tick.
+# It only uses models already in memory or on disk; fetching and training a plan is left to the
+# tourist's own requests, so a tick never waits on Firebase.
+deviation_sweep = DeviationSweep(lambda user_id: detector_registry.get(user_id, rebuild=False), budget_seconds=20.0)
+# Disaster zone predictions are computed in the background and served from memory.
+# Live feed events are kept next to the historical archive and folded in as they arrive.
+disaster_zones = DisasterZoneCache(
+    event_store=DisasterEventStore(os.path.join(app.instance_path, "live_disasters.jsonl")))
+# Live GDACS alerts, polled with conditional requests.
+gdacs_feed = external_data.GdacsFeed()
+# Time-decayed disaster density over India, memory-mapped for point lookups and heat tiles.
+risk_raster = RiskRaster(os.path.join(app.instance_path, "risk_raster.npy"))
+RISK_RASTER_MAX_AGE_SECONDS = 24 * 3600
 
 # --- ADDED: Dummy User Data ---
 dummy_users = {
@@ -189,11 +249,98 @@ def add_zone():
         return jsonify({"status": "success", "id": new_id})
     return jsonify({"status": "error", "message": "Invalid data"}), 400
 
+# Serialized zone list for the current version, shared by every poll.
+zones_json_cache = {"version": None, "body": None}
+
+# Serialized viewport responses keyed by (zone version, tile/bbox, clustered).
+VIEWPORT_CACHE_SIZE = 2048
+CLUSTER_MAX_ZOOM = 9
+CLUSTER_MIN_ZONES = 200
+MAX_TILE_ZOOM = 22
+viewport_cache = OrderedDict()
+
+def parse_viewport(args):
+    """
+    Reads a viewport from '?tile=z/x/y' or '?bbox=west,south,east,north[&zoom=z]'.
+    Returns (cache_key, (south, west, north, east), zoom), or None when absent.
+    Raises ValueError on malformed or out-of-range input.
+    """
+    if args.get("tile"):
+        z, x, y = (int(part) for part in args["tile"].split("/"))
+        if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError("tile out of range")
+        return f"tile:{z}/{x}/{y}", tile_bounds(z, x, y), z
+    if args.get("bbox"):
+        west, south, east, north = (float(part) for part in args["bbox"].split(","))
+        # NaN fails every comparison, so it is rejected along with infinities and off-map values.
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise ValueError("bbox must be west,south,east,north in degrees")
+        zoom = args.get("zoom", type=int)
+        if zoom is not None and not 0 <= zoom <= MAX_TILE_ZOOM:
+            raise ValueError("zoom out of range")
+        # Round so tiny pans of the same view share a cache entry.
+        key = f"bbox:{west:.3f},{south:.3f},{east:.3f},{north:.3f}:{zoom}"
+        return key, (south, west, north, east), zoom
+    return None
+
+def viewport_zones_json(version, viewport, cluster):
+    """Returns the serialized zones for a viewport, computing it once per zone version."""
+    key, bounds, zoom = viewport
+    cache_key = (version, key, cluster)
+    body = viewport_cache.get(cache_key)
+    if body is not None:
+        viewport_cache.move_to_end(cache_key)
+        return body
+
+    zones = zone_snapshot.get_index().query_bbox(*bounds, exact=True)
+    if zoom is not None and (cluster == "1" or (cluster != "0" and zoom <= CLUSTER_MAX_ZOOM
+                                                and len(zones) > CLUSTER_MIN_ZONES)):
+        # A quarter of a tile per cluster cell keeps markers readable at this zoom.
+        zones = cluster_zones(zones, 360.0 / 2 ** zoom / 4)
+    body = json.dumps(zones)
+    viewport_cache[cache_key] = body
+    if len(viewport_cache) > VIEWPORT_CACHE_SIZE:
+        viewport_cache.popitem(last=False)
+    return body
+
 @app.route("/get_zones")
 def get_zones():
-    db_zones = database.get_all_zones()
-    all_zones = db_zones + external_danger_zones
-    return jsonify(all_zones)
+    """
+    Returns the zone list, tagged with the zone-set version as an ETag.
+    Clients holding the current version get 304; '?since=<version>' returns
+    only the zones added, changed or deleted after that version.
+    '?tile=z/x/y' or '?bbox=west,south,east,north' limits the list to a
+    viewport; at low zoom levels large sets are clustered ('cluster=0/1' overrides).
+    """
+    try:
+        viewport = parse_viewport(request.args)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid tile or bbox"}), 400
+
+    version = zone_snapshot.version_token()
+    cluster = request.args.get("cluster")
+    etag = version if viewport is None else f"{version}:{viewport[0]}:{cluster}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    since = request.args.get("since")
+    if viewport is not None:
+        response = app.response_class(viewport_zones_json(version, viewport, cluster), mimetype="application/json")
+    elif since is not None:
+        delta = zone_snapshot.changes_since(since)
+        if delta is None:
+            response = jsonify({"version": version, "full": True, "zones": zone_snapshot.zones()})
+        else:
+            response = jsonify(dict(delta, version=version, full=False))
+    else:
+        if zones_json_cache["version"] != version:
+            zones_json_cache["body"] = json.dumps(zone_snapshot.zones())
+            zones_json_cache["version"] = version
+        response = app.response_class(zones_json_cache["body"], mimetype="application/json")
+    response.set_etag(etag)
+    return response
 
 @app.route("/delete_zone/<string:zone_id>", methods=["DELETE"])
 def delete_zone(zone_id):
@@ -214,12 +361,109 @@ def tourist_route():
 
 @app.route("/api/tourist_location", methods=["POST"])
 def handle_tourist_location():
-    data = request.json
     user_id = session.get('_id', request.remote_addr)
-    if data and "lat" in data and "lng" in data and "timestamp" in data:
-        database.add_tourist_location(user_id, data["lat"], data["lng"], data["timestamp"])
-        return jsonify({"status": "success"})
-    return jsonify({"status": "error", "message": "Invalid location data"}), 400
+    try:
+        lat, lng, timestamp = parse_fix(request.json)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid location data"}), 400
+    if not location_queue.submit(user_id, lat, lng, timestamp):
+        response = jsonify({"status": "error", "message": "Server busy, retry shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    record_activity(user_id, timestamp)
+    movement = check_movement(user_id, [(lat, lng, timestamp)])
+    database.log_anomalies([(user_id, anomaly["type"], anomaly["details"]) for anomaly in movement])
+    return jsonify({"status": "success"})
+
+@app.route("/api/tourist_location/batch", methods=["POST"])
+def handle_tourist_location_batch():
+    """
+    Stores a buffered batch of fixes in one write and evaluates every fix
+    against the danger zones and the planned path in one vectorized pass.
+    See location_batch.parse_location_batch for the accepted formats.
+    """
+    user_id = session.get('_id', request.remote_addr)
+    try:
+        fixes = parse_location_batch(request.json)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid location batch: {e}"}), 400
+
+    if not location_queue.submit_many((user_id,) + fix for fix in fixes):
+        response = jsonify({"status": "error", "message": "Server busy, retry shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    record_activity(user_id, *(fix[2] for fix in fixes))
+
+    lats = [fix[0] for fix in fixes]
+    lngs = [fix[1] for fix in fixes]
+    zones, zone_lats, zone_lngs, zone_radii, zone_tree = zone_snapshot.zone_tree()
+    hits = anomaly_detection.batch_check_danger_zones(
+        lats, lngs, zone_lats, zone_lngs, zone_radii,
+        approaching_distance_km=geofence_states.search_distance_km, tree=zone_tree)["hits"]
+
+    # The newest fix gets the same velocity-based prediction as /api/track; earlier ones are history.
+    movement = check_movement(user_id, fixes)
+    last = len(fixes) - 1
+    entries = predict_entries(user_id, (lats[last], lngs[last]))
+    etas = None if entries is None else {entry["zone"].get("id"): entry["eta_seconds"] for entry in entries}
+
+    anomalies = []
+    records = []
+    hits_by_fix = [[] for _ in fixes]
+    for fix_idx, zone_idx, distance_km in zip(hits["tourist"], hits["zone"], hits["distance_km"]):
+        zone = zones[zone_idx]
+        hits_by_fix[fix_idx].append((zone, float(distance_km)))
+        inside = distance_km <= zone["radius"] / 1000
+        if fix_idx == last and etas is not None and not inside:
+            continue  # approaching is decided by the predicted entries below
+        if distance_km - zone["radius"] / 1000 <= APPROACHING_DISTANCE_KM:
+            anomalies.append({
+                "type": "danger_zone_entry" if inside else "approaching_danger_zone",
+                "index": int(fix_idx),
+                "timestamp": fixes[fix_idx][2],
+                "zone": zone,
+                "distance_km": float(distance_km),
+            })
+
+    if entries is not None:
+        for entry in entries:
+            if entry["distance_km"] > entry["zone"]["radius"] / 1000 + geofence_states.search_distance_km:
+                hits_by_fix[last].append((entry["zone"], entry["distance_km"]))
+            if entry["eta_seconds"] <= ENTRY_HORIZON_SECONDS:
+                anomalies.append({"type": "approaching_danger_zone", "index": last, "timestamp": fixes[last][2],
+                                  "zone": entry["zone"], "distance_km": entry["distance_km"],
+                                  "eta_seconds": entry["eta_seconds"]})
+
+    # Replay the fixes through the state tracker in order; only transitions are logged.
+    for fix_idx, fix_hits in enumerate(hits_by_fix):
+        fix_etas = etas if fix_idx == last else None
+        transitions = geofence_states.update(user_id, fix_hits, epoch_seconds(fixes[fix_idx][2]), etas=fix_etas)
+        for transition in transitions:
+            details = {"location": (lats[fix_idx], lngs[fix_idx]), "zone": transition["zone"]}
+            if fix_etas and transition["zone"].get("id") in fix_etas:
+                details["eta_seconds"] = fix_etas[transition["zone"].get("id")]
+            records.append((user_id, transition["type"], details))
+
+    # Like the zones, deviations are reported on every fix but logged only when the tourist leaves the route.
+    user_anomaly_detector = current_detector(user_id)
+    if user_anomaly_detector and user_anomaly_detector.is_trained:
+        deviations = user_anomaly_detector.predict_many(list(zip(lats, lngs)))
+        for fix_idx, deviated in enumerate(deviations.tolist()):
+            if deviated:
+                anomalies.append({"type": "path_deviation", "index": fix_idx, "timestamp": fixes[fix_idx][2]})
+            if deviation_sweep.record(user_id, fixes[fix_idx][2], deviated):
+                records.append((user_id, "path_deviation", {"location": (lats[fix_idx], lngs[fix_idx])}))
+
+    for anomaly in movement:
+        anomalies.append(anomaly)
+        records.append((user_id, anomaly["type"], anomaly["details"]))
+
+    anomalies.sort(key=lambda anomaly: anomaly["index"])
+    database.log_anomalies(records)
+
+    if anomalies:
+        return jsonify({"status": "anomaly", "stored": len(fixes), "anomalies": anomalies})
+    return jsonify({"status": "ok", "stored": len(fixes)})
 
 @app.route("/api/tourist_locations")
 def get_tourist_locations():
@@ -227,6 +471,37 @@ def get_tourist_locations():
     locations = database.get_latest_tourist_locations()
     return jsonify(locations)
 
+@app.route("/api/zone_tourists/<string:zone_id>")
+def get_zone_tourists(zone_id):
+    if "admin" not in session: return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    zone = zone_snapshot.get(zone_id)
+    if zone is None:
+        return jsonify({"status": "error", "message": "Zone ID not found"}), 404
+
+    locations = [loc for loc in database.get_latest_tourist_locations() if "lat" in loc and "lng" in loc]
+    if not locations:
+        return jsonify([])
+    result = anomaly_detection.batch_check_danger_zones(
+        [loc["lat"] for loc in locations], [loc["lng"] for loc in locations],
+        *anomaly_detection.zone_arrays([zone]))
+    return jsonify([loc for loc, inside in zip(locations, result["inside"]) if inside])
+
+@app.route("/api/metrics")
+def get_metrics():
+    if "admin" not in session: return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    return jsonify({
+        "location_ingest": location_queue.metrics(),
+        "detectors": detector_registry.metrics(),
+        "detector_training": training_pool.metrics(),
+        "inactivity": inactivity_monitor.metrics(),
+        "deviation_sweep": deviation_sweep.metrics(),
+        "kinematics": kinematics_monitor.metrics(),
+        "disaster_zones": disaster_zones.metrics(),
+        "risk_raster": risk_raster.metrics(),
+        "gdacs_feed": gdacs_feed.metrics(),
+        "police_lookups": external_data.police_cache.metrics(),
+    })
+
 @app.route("/api/police_locations")
 def get_police_locations():
     if "admin" not in session:
@@ -236,7 +511,10 @@ def get_police_locations():
     if not bbox:
         return jsonify({"status": "error", "message": "Bounding box ('bbox') is required."}), 400
 
-    locations = external_data.fetch_police_locations_from_api(bbox)
+    try:
+        locations = external_data.fetch_police_locations_from_api(bbox)
+    except ValueError:
+        return jsonify({"status": "error", "message": "bbox must be west,south,east,north"}), 400
     return jsonify(locations)
 
 # ------------------ Anomaly Detection API (UNCHANGED) ------------------
@@ -248,14 +526,24 @@ def planned_path():
         return jsonify({"status": "error", "message": "No session ID found."}), 400
 
     if data and "path" in data:
-        database.add_planned_tourist_path(user_id, data["path"])
-        user_anomaly_detector = anomaly_detection.AnomalyDetector()
         path_data = [(p['lat'], p['lng']) for p in data["path"]]
-        user_anomaly_detector.train(path_data)
-        anomaly_detectors[user_id] = user_anomaly_detector
-        return jsonify({"status": "success"})
+        job_id = training_pool.submit(user_id, path_data)
+        if job_id is None:
+            response = jsonify({"status": "error", "message": "Server busy, retry shortly"})
+            response.headers["Retry-After"] = "5"
+            return response, 503
+        database.add_planned_tourist_path(user_id, data["path"])
+        return jsonify({"status": "accepted", "job_id": job_id,
+                        "status_url": url_for("planned_path_status", job_id=job_id)}), 202
     return jsonify({"status": "error", "message": "Invalid path data"}), 400
 
+@app.route("/api/planned_path/status/<string:job_id>")
+def planned_path_status(job_id):
+    job = training_pool.job(job_id)
+    if job is None or job["user_id"] != session.get('_id'):
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"job_id": job_id, "status": job["status"], "train_ms": job["train_ms"], "error": job["error"]})
+
 @app.route("/api/check_anomaly", methods=["POST"])
 def check_anomaly():
     data = request.json
@@ -263,54 +551,222 @@ def check_anomaly():
     if not user_id:
         return jsonify({"status": "error", "message": "No session ID found."}), 400
 
-    if not (data and "lat" in data and "lng" in data):
+    try:
+        location = check_coordinate(data["lat"], data["lng"])
+    except (ValueError, KeyError, TypeError):
         return jsonify({"status": "error", "message": "Invalid location data"}), 400
 
-    location = (data["lat"], data["lng"])
-    user_anomaly_detector = anomaly_detectors.get(user_id)
-    all_zones = database.get_all_zones() + external_danger_zones
+    # These are simulated points, not the tourist's tracked position, so their GPS velocity does not apply.
+    anomalies = evaluate_fix(user_id, location, use_velocity=False)
+    if anomalies:
+        return jsonify({"status": "anomaly", "anomalies": anomalies})
     
-    anomalies = []
-
-    is_approaching, approaching_zone = anomaly_detection.check_approaching_danger_zone(location, all_zones)
-    if is_approaching:
-        anomalies.append({"type": "approaching_danger_zone", "zone": approaching_zone})
-        database.log_anomaly(user_id, "approaching_danger_zone", {"location": location, "zone": approaching_zone})
+    return jsonify({"status": "ok"})
 
-    is_in_danger, zone = anomaly_detection.check_danger_zone_entry(location, all_zones)
-    if is_in_danger:
-        anomalies.append({"type": "danger_zone_entry", "zone": zone})
-        database.log_anomaly(user_id, "danger_zone_entry", {"location": location, "zone": zone})
+@app.route("/api/track", methods=["POST"])
+def track():
+    """
+    Stores a fix and runs the geofence and path-deviation checks on it in
+    one request, replacing a /api/check_anomaly + /api/tourist_location pair.
+    """
+    user_id = session.get('_id')
+    if not user_id:
+        return jsonify({"status": "error", "message": "No session ID found."}), 400
 
-    if user_anomaly_detector and user_anomaly_detector.predict(location):
-        anomalies.append({"type": "path_deviation"})
-        database.log_anomaly(user_id, "path_deviation", {"location": location})
+    try:
+        lat, lng, timestamp = parse_fix(request.json)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid location data"}), 400
 
+    # Storing the fix is what resets inactivity; report the gap it closed. The monitor is
+    # updated synchronously on every fix, unlike the mirror, which lags the write-behind queue.
+    previous_seen = inactivity_monitor.last_seen(user_id)
+    if previous_seen is None and not inactivity_monitor.owns(user_id):
+        previous = database.get_latest_tourist_location(user_id)
+        previous_seen = epoch_seconds(previous.get("timestamp")) if previous else None
+    if not location_queue.submit(user_id, lat, lng, timestamp):
+        response = jsonify({"status": "error", "message": "Server busy, retry shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    record_activity(user_id, timestamp)
+
+    idle_minutes = None
+    current_seen = epoch_seconds(timestamp)
+    if previous_seen is not None and current_seen is not None:
+        idle_minutes = max(0.0, (current_seen - previous_seen) / 60)
+
+    # The kinematics update comes first so the zone check sees the new velocity.
+    movement = check_movement(user_id, [(lat, lng, timestamp)])
+    database.log_anomalies([(user_id, anomaly["type"], anomaly["details"]) for anomaly in movement])
+    anomalies = evaluate_fix(user_id, (lat, lng), timestamp=timestamp)
+    anomalies += [{"type": anomaly["type"], "details": anomaly["details"]} for anomaly in movement]
+    response = {"stored": True, "inactivity": {"reset": True, "idle_minutes": idle_minutes},
+                "risk": risk_raster.risk_at(lat, lng)}
     if anomalies:
-        return jsonify({"status": "anomaly", "anomalies": anomalies})
-    
-    return jsonify({"status": "ok"})
+        response.update({"status": "anomaly", "anomalies": anomalies})
+    else:
+        response["status"] = "ok"
+    return jsonify(response)
+
+def predict_entries(user_id, location):
+    """
+    Zones the tourist will reach within the tracker's keep horizon at their
+    current velocity, or None when they have no recent velocity. location
+    must be their newest fix, already fed to the kinematics monitor.
+    """
+    velocity = kinematics_monitor.velocity(user_id, now=time.time())
+    if velocity is None:
+        return None
+    return anomaly_detection.predict_zone_entries(location, velocity, zone_snapshot.get_index(),
+                                                  geofence_states.keep_horizon_seconds)
+
+def evaluate_fix(user_id, location, use_velocity=True, timestamp=None):
+    """
+    Runs the geofence and path-deviation checks for one fix (taken at
+    timestamp, if known) against the zone snapshot and the user's detector,
+    logging the zone and route transitions it finds.
+    With use_velocity, location is the tourist's newest tracked fix and
+    approaching zones are predicted from their velocity; otherwise (e.g.
+    simulated points) the plain distance rule applies.
+    """
+    user_anomaly_detector = current_detector(user_id)
+    all_zones = zone_snapshot.get_index()
+
+    anomalies = []
+    records = []
+
+    inside, approaching = anomaly_detection.classify_location(location, all_zones, geofence_states.search_distance_km)
+    hits = inside + approaching
+    etas = None
+    entries = predict_entries(user_id, location) if use_velocity else None
+    if entries is not None:
+        # Moving: warn about the zones the tourist will reach within the horizon, wherever they are.
+        etas = {entry["zone"].get("id"): entry["eta_seconds"] for entry in entries}
+        hits += [entry for entry in entries if entry["distance_km"] > entry["zone"]["radius"] / 1000 +
+                 geofence_states.search_distance_km]
+        for entry in entries:
+            if entry["eta_seconds"] <= ENTRY_HORIZON_SECONDS:
+                anomalies.append({"type": "approaching_danger_zone", "zone": entry["zone"],
+                                  "distance_km": entry["distance_km"], "eta_seconds": entry["eta_seconds"]})
+    else:
+        for hit in approaching:
+            if hit["distance_km"] - hit["zone"]["radius"] / 1000 <= APPROACHING_DISTANCE_KM:
+                anomalies.append({"type": "approaching_danger_zone", "zone": hit["zone"], "distance_km": hit["distance_km"]})
+
+    for hit in inside:
+        anomalies.append({"type": "danger_zone_entry", "zone": hit["zone"], "distance_km": hit["distance_km"]})
+
+    # The client is told about every zone on every fix, but alerts are only
+    # written when the tourist's state for a zone changes.
+    transitions = geofence_states.update(user_id, [(hit["zone"], hit["distance_km"]) for hit in hits], etas=etas)
+    for transition in transitions:
+        details = {"location": location, "zone": transition["zone"]}
+        if etas and transition["zone"].get("id") in etas:
+            details["eta_seconds"] = etas[transition["zone"].get("id")]
+        records.append((user_id, transition["type"], details))
+
+    if user_anomaly_detector and user_anomaly_detector.is_trained:
+        deviated = bool(user_anomaly_detector.predict(location))
+        if deviated:
+            anomalies.append({"type": "path_deviation"})
+        if deviation_sweep.record(user_id, timestamp, deviated):
+            records.append((user_id, "path_deviation", {"location": location}))
+
+    database.log_anomalies(records)
+    return anomalies
+
+def parse_timestamp(timestamp_val):
+    """Parses an ISO-8601 string (as sent by the browser) into a datetime, or None."""
+    if isinstance(timestamp_val, str):
+        try:
+            return datetime.fromisoformat(timestamp_val.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return timestamp_val if isinstance(timestamp_val, datetime) else None
 
 # ------------------ External & Anomaly Detection (UNCHANGED) ------------------
+def refresh_zone_snapshot():
+    """Safety net for missed listener events: re-reads the zones and applies any difference."""
+    with app.app_context():
+        zone_snapshot.refresh()
+
 def fetch_external_danger_zones():
+    """Applies whatever changed in the GDACS feed since the last poll; an unchanged feed costs nothing."""
     with app.app_context():
-        global external_danger_zones
-        live_data = external_data.fetch_live_incident_data()
-        if live_data:
-            external_danger_zones = live_data
+        diff = gdacs_feed.poll()
+        if diff is None:
+            return
+        zone_snapshot.replace_group('external', list(gdacs_feed.zones.values()))
+        added = disaster_zones.add_events([disaster_event(zone) for zone in diff["added"]])
+        print(f"GDACS feed: {len(diff['added'])} new, {len(diff['changed'])} changed, "
+              f"{len(diff['removed'])} removed alerts; {added} new disaster events.")
+
+# The historical archive uses naive Indian local times.
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def disaster_event(zone):
+    """Turns a live alert zone into a disaster event record for the prediction model."""
+    published = parse_timestamp(zone.get("published")) or datetime.now(timezone.utc)
+    if published.tzinfo is not None:
+        published = published.astimezone(IST)
+    return {
+        "id": zone["id"],
+        "place": {"lat": zone["lat"], "lng": zone["lng"]},
+        "date": published.strftime("%Y-%m-%d"),
+        "time": published.strftime("%H:%M:%S"),
+        "description": zone.get("description") or "",
+        "type": "natural_disaster",
+    }
+
+def record_activity(user_id, *timestamp_vals):
+    """Pushes back a tourist's inactivity deadline after storing their fixes."""
+    seen = [t for t in map(epoch_seconds, timestamp_vals) if t is not None]
+    if seen:
+        inactivity_monitor.touch(user_id, max(seen), now=time.time())
+
+def check_movement(user_id, fixes):
+    """
+    Feeds newly stored (lat, lng, timestamp) fixes to the kinematics monitor.
+    Returns {"type", "index", "timestamp", "details"} for whatever they raised.
+    """
+    anomalies = []
+    for index, (lat, lng, timestamp_val) in enumerate(fixes):
+        for anomaly in kinematics_monitor.update(user_id, lat, lng, epoch_seconds(timestamp_val)):
+            anomalies.append(dict(anomaly, index=index, timestamp=timestamp_val))
+    return anomalies
 
 def check_for_anomalies():
+    """Alerts once for every tourist whose inactivity deadline passed since the last tick."""
+    with app.app_context():
+        expired = inactivity_monitor.expire()
+        if not expired:
+            return
+        # Fixes stored by other worker processes only show up in tourist_latest.
+        latest = database.fetch_latest_tourist_locations([item["user_id"] for item in expired])
+        records = []
+        for item in expired:
+            user_id = item["user_id"]
+            if inactivity_monitor.touch(user_id, epoch_seconds((latest.get(user_id) or {}).get("timestamp"))):
+                continue
+            records.append((user_id, "inactivity", {"duration_minutes": item["idle_seconds"] / 60}))
+            print(f"ALERT: User {user_id} has been inactive for {item['idle_seconds'] / 60:.1f} minutes.")
+        database.log_anomalies(records)
+
+def sweep_path_deviation():
+    """Scores every active tourist's latest fix against their planned route in one batch."""
     with app.app_context():
-        latest_locations = database.get_latest_tourist_locations()
-        for loc in latest_locations:
-            user_id = loc.get("user_id")
-            timestamp_val = loc.get('timestamp')
-            timestamp = datetime.fromisoformat(timestamp_val.replace('Z', '+00:00')) if isinstance(timestamp_val, str) else timestamp_val
-            
-            is_inactive, inactive_time = anomaly_detection.check_inactivity(timestamp)
-            if is_inactive:
-                database.log_anomaly(user_id, "inactivity", {"duration_minutes": inactive_time.total_seconds() / 60})
-                print(f"ALERT: User {user_id} has been inactive for {inactive_time}.")
+        alerts = deviation_sweep.run(database.get_latest_tourist_locations(), epoch_seconds)
+        database.log_anomalies([
+            (alert["user_id"], "path_deviation",
+             {"location": alert["location"], "distance_m": alert["distance_m"], "source": "sweep"})
+            for alert in alerts])
+        for alert in alerts:
+            print(f"ALERT: User {alert['user_id']} has left their planned route.")
+
+def sync_inactivity_monitor():
+    """Picks up tourists first seen by other worker processes."""
+    with app.app_context():
+        inactivity_monitor.load(database.get_latest_tourist_locations(), epoch_seconds)
 
 # ------------------ Disaster Prediction API (UNCHANGED) ------------------
 @app.route("/api/disaster_zones")
@@ -318,21 +774,96 @@ def get_disaster_zones():
     if "admin" not in session:
         return jsonify({"status": "error", "message": "Unauthorized"}), 401
 
-    if not disaster_model.is_trained:
-        disaster_model.load_historical_data()
-        disaster_model.train()
+    etag, _, body = disaster_zones.get()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        # Until the first refresh finishes this is an empty list.
+        response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+def rebuild_risk_raster():
+    """Re-rasterizes disaster risk when the events have changed, and daily so the decay stays current."""
+    events = disaster_zones.events()
+    if events is None:
+        return
+    # Keyed on the events themselves: zone re-projections and restarts leave them unchanged.
+    meta = risk_raster.meta
+    source = event_fingerprint(*events)
+    if meta and meta["source"] == source and time.time() - meta["built_at"] < RISK_RASTER_MAX_AGE_SECONDS:
+        return
+    risk_raster.build(*events, source=source)
+
+@app.route("/api/risk", methods=["GET", "POST"])
+def get_risk():
+    """
+    Disaster risk scores (0-1, null outside India) from the risk raster:
+    '?lat=..&lng=..' for one point, or a POST of {"points": [{lat, lng}, ...]}
+    for many, e.g. along a planned route.
+    """
+    if "admin" not in session and not session.get('_id'):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    if not risk_raster.ready:
+        return jsonify({"status": "error", "message": "Risk raster not built yet"}), 503
+    try:
+        if request.method == "POST":
+            points = (request.json or {})["points"]
+            lats = [float(p["lat"]) for p in points]
+            lngs = [float(p["lng"]) for p in points]
+        else:
+            lats, lngs = [float(request.args["lat"])], [float(request.args["lng"])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Invalid points"}), 400
+    scores = [None if np.isnan(s) else s for s in risk_raster.risk_many(lats, lngs).tolist()]
+    if request.method == "POST":
+        return jsonify({"version": risk_raster.token, "risk": scores})
+    return jsonify({"version": risk_raster.token, "risk": scores[0]})
 
-    return jsonify(disaster_model.get_disaster_zones())
+@app.route("/api/risk/tiles/<int:z>/<int:x>/<int:y>.png")
+def get_risk_tile(z, x, y):
+    """Heat tile of disaster risk for the admin map, tagged with the raster version."""
+    if "admin" not in session:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"status": "error", "message": "Tile out of range"}), 400
+    etag = risk_raster.token
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        body = risk_raster.tile_png(z, x, y)
+        if body is None:
+            return jsonify({"status": "error", "message": "Risk raster not built yet"}), 503
+        response = app.response_class(body, mimetype="image/png")
+    response.set_etag(etag)
+    return response
 
 # ------------------ Scheduler & Server Start (UNCHANGED) ------------------
 scheduler = APScheduler()
 scheduler.init_app(app)
 scheduler.add_job(id='FetchExternalData', func=fetch_external_danger_zones, trigger='interval', minutes=1)
 scheduler.add_job(id='CheckAnomalies', func=check_for_anomalies, trigger='interval', minutes=1)
+scheduler.add_job(id='RefreshZoneSnapshot', func=refresh_zone_snapshot, trigger='interval', minutes=15)
+scheduler.add_job(id='SweepPathDeviation', func=sweep_path_deviation, trigger='interval', minutes=1)
+scheduler.add_job(id='SyncLatestLocations', func=database.sync_latest_locations, trigger='interval',
+                  seconds=database.LATEST_SYNC_SECONDS)
+scheduler.add_job(id='SyncInactivityMonitor', func=sync_inactivity_monitor, trigger='interval', minutes=10)
+scheduler.add_job(id='RefreshDisasterZones', func=disaster_zones.refresh, trigger='interval', hours=1)
+scheduler.add_job(id='RebuildRiskRaster', func=rebuild_risk_raster, trigger='interval', minutes=5)
+scheduler.add_job(id='PruneDetectors', func=detector_registry.prune, trigger='interval', minutes=10)
 
 if __name__ == '__main__':
     database.initialize_database()
+    database.start_zone_listener()
+    database.sync_latest_locations()
+    recent_alerts = database.get_recent_anomalies(hours=12)
+    geofence_states.rebuild(recent_alerts)
+    # Inactivity episodes last until the user is forgotten, so their alerts are read over that whole window.
+    inactivity_alerts = database.get_recent_anomalies(hours=inactivity_monitor.forget_seconds / 3600)
+    inactivity_monitor.load(database.get_latest_tourist_locations(), epoch_seconds, inactivity_alerts)
     load_contract() # Load the contract when the app starts
+    disaster_zones.start()
+    risk_raster.load()
     scheduler.start()
     port = int(os.environ.get('PORT', 8081))
     app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
@@ -0,0 +1,270 @@
+import json
+import math
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from anomaly_detection import METERS_PER_DEGREE
+from spatial_index import tile_bounds
+
+INDIA_BBOX = (6.5, 68.0, 35.5, 97.5)  # south, west, north, east
+SECONDS_PER_DAY = 86400
+TILE_SIZE = 256
+
+def encode_png(rgba):
+    """Encodes an (h, w, 4) uint8 array as a PNG, with no imaging library."""
+    height, width = rgba.shape[:2]
+    # Every scanline starts with filter type 0 (none).
+    raw = np.concatenate([np.zeros((height, 1), np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+def event_fingerprint(lat, lng, epoch):
+    """
+    Identifies a set of event columns by content, the same in every process,
+    for telling whether a raster was built from them.
+    """
+    crc = 0
+    for column, dtype in ((lat, np.float64), (lng, np.float64), (epoch, np.int64)):
+        crc = zlib.crc32(np.ascontiguousarray(column, dtype).tobytes(), crc)
+    return f"{len(epoch)}-{crc:08x}"
+
+def _blur(grid, sigma_rows, sigma_cols):
+    """Separable Gaussian blur, shift-and-add over the kernel taps."""
+    for axis, sigma in ((0, sigma_rows), (1, sigma_cols)):
+        reach = int(math.ceil(3 * sigma))
+        if reach < 1:
+            continue
+        taps = np.exp(-0.5 * (np.arange(-reach, reach + 1) / sigma) ** 2)
+        taps /= taps.sum()
+        padded = np.pad(grid, [(reach, reach) if a == axis else (0, 0) for a in (0, 1)])
+        size = grid.shape[axis]
+        grid = sum(weight * padded.take(np.arange(offset, offset + size), axis=axis)
+                   for offset, weight in enumerate(taps))
+    return grid
+
+class RiskRaster:
+    """
+    Disaster risk on a fixed lat/lng grid over India, for point lookups and
+    map tiles without touching the prediction model.
+
+    build() bins past events into cells of cell_deg degrees, each weighted
+    by 0.5 ** (age / half_life_days), spreads them with a Gaussian of
+    radius_km, and scales the result to 0-255 so the grid is one byte per
+    cell. The grid is written atomically to a .npy file (with a JSON
+    sidecar) and served memory-mapped, so a restarted process can answer
+    straight away and several workers share the same pages. A lookup is an
+    index computation; tiles are rendered from a max-pooled pyramid at the
+    level matching the zoom and cached per build.
+    """
+
+    def __init__(self, path=os.path.join('instance', 'risk_raster.npy'), bbox=INDIA_BBOX, cell_deg=0.05,
+                 half_life_days=730, radius_km=20.0, tile_cache_size=1024):
+        self.path = path
+        self.bbox = bbox
+        self.cell_deg = cell_deg
+        self.half_life_days = half_life_days
+        self.radius_km = radius_km
+        self.tile_cache_size = tile_cache_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self._state = None  # (meta, pyramid levels), swapped whole
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"builds": 0, "last_build_ms": 0.0, "lookups": 0, "tiles_rendered": 0, "tile_hits": 0}
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    @property
+    def meta(self):
+        state = self._state
+        return dict(state[0]) if state else None
+
+    @property
+    def token(self):
+        return f"{self.epoch}-{self.version}"
+
+    def shape(self):
+        south, west, north, east = self.bbox
+        return int(math.ceil((north - south) / self.cell_deg)), int(math.ceil((east - west) / self.cell_deg))
+
+    # --- Building ---
+    def build(self, lat, lng, epoch, now=None, source=None):
+        """
+        Rasterizes events given as lat, lng and epoch-second columns (naive
+        local times, as in the disaster model) and swaps the new grid in.
+        source is stored in the metadata to tell what the grid was built from.
+        """
+        start = time.perf_counter()
+        now = np.datetime64(datetime.now() if now is None else now, 's').astype(np.int64)
+        south, west, north, east = self.bbox
+        rows, cols = self.shape()
+        lat, lng, epoch = np.asarray(lat, np.float64), np.asarray(lng, np.float64), np.asarray(epoch, np.int64)
+        row = np.floor((lat - south) / self.cell_deg).astype(np.int64)
+        col = np.floor((lng - west) / self.cell_deg).astype(np.int64)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        age_days = np.maximum(now - epoch[inside], 0) / SECONDS_PER_DAY
+        weights = 0.5 ** (age_days / self.half_life_days)
+        density = np.bincount(row[inside] * cols + col[inside], weights, rows * cols).reshape(rows, cols)
+
+        # East-west cells shrink with latitude; the middle of the box is close enough for a blur.
+        cell_km = self.cell_deg * METERS_PER_DEGREE / 1000
+        sigma = self.radius_km / cell_km
+        density = _blur(density, sigma, sigma * math.cos(math.radians((south + north) / 2)))
+        peak = float(density.max())
+        grid = np.zeros((rows, cols), np.uint8) if peak <= 0 else \
+            np.round(density / peak * 255).astype(np.uint8)
+
+        meta = {"bbox": list(self.bbox), "cell_deg": self.cell_deg, "shape": [rows, cols],
+                "half_life_days": self.half_life_days, "radius_km": self.radius_km, "events": int(inside.sum()),
+                "peak_density": peak, "built_at": time.time(), "source": source}
+        self._write(grid, meta)
+        self._open()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["last_build_ms"] = elapsed_ms
+        return grid
+
+    def _write(self, grid, meta):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Readers keep their mapping of the old file; the new one replaces it in a single rename.
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, grid)
+        with open(f"{temp_path}.json", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{temp_path}.json", self._meta_path())
+        os.replace(temp_path, self.path)
+
+    def _meta_path(self):
+        return os.path.splitext(self.path)[0] + '.json'
+
+    def load(self):
+        """Maps a grid built earlier, e.g. at startup. Returns False if there is none to use."""
+        try:
+            self._open()
+            return True
+        except (OSError, ValueError) as e:
+            print(f"No disaster risk raster loaded: {e}")
+            return False
+
+    def _open(self):
+        with open(self._meta_path(), 'r') as f:
+            meta = json.load(f)
+        grid = np.load(self.path, mmap_mode='r')
+        if list(grid.shape) != meta["shape"] or meta["bbox"] != list(self.bbox) or meta["cell_deg"] != self.cell_deg:
+            raise ValueError("raster does not match the configured grid")
+        levels = [grid]
+        while min(levels[-1].shape) > 1:
+            # Each level takes the highest risk of the 2x2 cells below it, so hotspots survive zooming out.
+            level = levels[-1]
+            padded = np.pad(level, ((0, level.shape[0] % 2), (0, level.shape[1] % 2)))
+            levels.append(padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).max(axis=(1, 3)))
+        with self._lock:
+            self._state = (meta, levels)
+            self._tiles.clear()
+            self.version += 1
+
+    # --- Lookups ---
+    def risk_many(self, lat, lng):
+        """Risk scores (0-1) for arrays of points; NaN outside the grid or before the first build."""
+        state = self._state
+        lat, lng = np.asarray(lat, np.float64), np.asarray(lng, np.float64)
+        if state is None:
+            return np.full(lat.shape, np.nan)
+        grid = state[1][0]
+        south, west, _, _ = self.bbox
+        row = np.floor((lat - south) / self.cell_deg).astype(np.int64)
+        col = np.floor((lng - west) / self.cell_deg).astype(np.int64)
+        inside = (row >= 0) & (row < grid.shape[0]) & (col >= 0) & (col < grid.shape[1])
+        scores = np.full(lat.shape, np.nan)
+        scores[inside] = grid[row[inside], col[inside]] / 255.0
+        with self._lock:
+            self._stats["lookups"] += int(lat.size)
+        return scores
+
+    def risk_at(self, lat, lng):
+        """Risk score (0-1) at a point, or None outside the grid or before the first build."""
+        state = self._state
+        if state is None:
+            return None
+        grid = state[1][0]
+        row = math.floor((lat - self.bbox[0]) / self.cell_deg)
+        col = math.floor((lng - self.bbox[1]) / self.cell_deg)
+        if not (0 <= row < grid.shape[0] and 0 <= col < grid.shape[1]):
+            return None
+        self._stats["lookups"] += 1  # unlocked; a lost increment only skews the metric
+        return int(grid[row, col]) / 255.0
+
+    # --- Tiles ---
+    def tile_png(self, z, x, y):
+        """Renders (or reuses) the heat tile for an XYZ Web Mercator tile; None before the first build."""
+        with self._lock:
+            state = self._state
+            key = (self.version, z, x, y)
+            body = self._tiles.get(key)
+            if body is not None:
+                self._tiles.move_to_end(key)
+                self._stats["tile_hits"] += 1
+                return body
+        if state is None:
+            return None
+        body = encode_png(self._render(state[1], z, x, y))
+        with self._lock:
+            self._tiles[key] = body
+            if len(self._tiles) > self.tile_cache_size:
+                self._tiles.popitem(last=False)
+            self._stats["tiles_rendered"] += 1
+        return body
+
+    def _render(self, levels, z, x, y):
+        tile_south, tile_west, tile_north, tile_east = tile_bounds(z, x, y)
+        pixel_deg = (tile_east - tile_west) / TILE_SIZE
+        # The coarsest level whose cells are still no bigger than a pixel.
+        level = min(max(int(math.floor(math.log2(pixel_deg / self.cell_deg))), 0), len(levels) - 1)
+        grid, cell_deg = levels[level], self.cell_deg * 2 ** level
+
+        # Pixel centres: longitude is linear across a tile, latitude follows the Mercator projection.
+        n = 2 ** z
+        pixel = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+        lng = tile_west + pixel * (tile_east - tile_west)
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixel) / n))))
+        south, west, _, _ = self.bbox
+        row = np.floor((lat - south) / cell_deg).astype(np.int64)
+        col = np.floor((lng - west) / cell_deg).astype(np.int64)
+        row_ok = (row >= 0) & (row < grid.shape[0])
+        col_ok = (col >= 0) & (col < grid.shape[1])
+        values = np.zeros((TILE_SIZE, TILE_SIZE), np.uint8)
+        if row_ok.any() and col_ok.any():
+            values[np.ix_(row_ok, col_ok)] = np.asarray(grid[np.ix_(row[row_ok], col[col_ok])])
+
+        # Yellow through red, more opaque with risk; zero risk is transparent.
+        rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), np.uint8)
+        rgba[..., 0] = 255
+        rgba[..., 1] = 255 - values
+        rgba[..., 3] = np.where(values > 0, 60 + values.astype(np.uint16) * 160 // 255, 0)
+        return rgba
+
+    def metrics(self):
+        with self._lock:
+            state = self._state
+            stats = dict(self._stats, version=self.version, cached_tiles=len(self._tiles))
+        if state:
+            meta, levels = state
+            stats.update({"built_at": meta["built_at"], "events": meta["events"], "source": meta["source"],
+                          "grid_bytes": int(levels[0].nbytes), "pyramid_levels": len(levels)})
+        return stats
@@ -0,0 +1,193 @@
+import math
+
+KM_PER_DEGREE_LAT = 111.32
+
+def _km_to_degrees(km, lat):
+    """Converts a distance in km to (lat, lng) degree spans at the given latitude."""
+    dlat = km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+    dlng = km / (KM_PER_DEGREE_LAT * cos_lat)
+    return dlat, dlng
+
+def tile_bounds(z, x, y):
+    """Returns (south, west, north, east) of a Web Mercator XYZ tile."""
+    n = 2 ** z
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    return lat_of(y + 1), x / n * 360.0 - 180.0, lat_of(y), (x + 1) / n * 360.0 - 180.0
+
+MAX_MERCATOR_LAT = 85.05112878
+
+def tile_of(lat, lng, z):
+    """Returns the (x, y) of the Web Mercator XYZ tile containing a point, clamped to the map."""
+    n = 2 ** z
+    lat = math.radians(min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT))
+    x = int((min(max(lng, -180.0), 180.0) + 180.0) / 360.0 * n)
+    y = int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def circle_intersects_bbox(zone, south, west, north, east):
+    """Exact-enough test of whether a zone circle overlaps a bounding box."""
+    lat, lng = float(zone['lat']), float(zone['lng'])
+    nearest_lat = min(max(lat, south), north)
+    nearest_lng = min(max(lng, west), east)
+    dlat_km = (lat - nearest_lat) * KM_PER_DEGREE_LAT
+    dlng_km = (lng - nearest_lng) * KM_PER_DEGREE_LAT * math.cos(math.radians(nearest_lat))
+    return math.hypot(dlat_km, dlng_km) * 1000 <= float(zone.get('radius') or 0)
+
+def cluster_zones(zones, cell_size_deg):
+    """
+    Collapses zones into one marker per grid cell for low zoom levels.
+    Each cluster carries its centroid, member count and a radius that covers its members.
+    """
+    cells = {}
+    for zone in zones:
+        key = (math.floor(zone['lat'] / cell_size_deg), math.floor(zone['lng'] / cell_size_deg))
+        cells.setdefault(key, []).append(zone)
+
+    clusters = []
+    for (row, col), members in cells.items():
+        if len(members) == 1:
+            clusters.append(members[0])
+            continue
+        lat = sum(z['lat'] for z in members) / len(members)
+        lng = sum(z['lng'] for z in members) / len(members)
+        cos_lat = math.cos(math.radians(lat))
+        radius = max(
+            math.hypot((z['lat'] - lat) * KM_PER_DEGREE_LAT, (z['lng'] - lng) * KM_PER_DEGREE_LAT * cos_lat) * 1000
+            + float(z.get('radius') or 0)
+            for z in members)
+        clusters.append({
+            "id": f"cluster_{row}_{col}",
+            "lat": lat,
+            "lng": lng,
+            "radius": radius,
+            "count": len(members),
+            "type": "cluster",
+            "description": f"{len(members)} danger zones",
+        })
+    return clusters
+
+class ZoneIndex:
+    """
+    Grid-bucket spatial index over circular danger zones.
+
+    Each zone is registered in every grid cell that its circle's bounding box
+    touches, so a lookup only has to visit the handful of cells around a point
+    instead of scanning every zone. Zones are keyed by their 'id' and can be
+    added, updated or removed one at a time.
+    """
+
+    def __init__(self, cell_size_deg=0.1):
+        self.cell_size_deg = cell_size_deg
+        self._cells = {}   # (row, col) -> {zone_id: zone}
+        self._zones = {}   # zone_id -> (zone, [cells])
+
+    def __len__(self):
+        return len(self._zones)
+
+    def __iter__(self):
+        return (entry[0] for entry in self._zones.values())
+
+    def __contains__(self, zone_id):
+        return zone_id in self._zones
+
+    def get(self, zone_id):
+        """Returns the zone with the given id, or None."""
+        entry = self._zones.get(zone_id)
+        return entry[0] if entry else None
+
+    @staticmethod
+    def zone_key(zone):
+        """Returns the identifier used to track a zone inside the index."""
+        zone_id = zone.get('id')
+        return zone_id if zone_id is not None else id(zone)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size_deg), math.floor(lng / self.cell_size_deg))
+
+    def _cells_for_bbox(self, south, west, north, east):
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+        return [(r, c) for r in range(row_min, row_max + 1) for c in range(col_min, col_max + 1)]
+
+    def _cells_around(self, lat, lng, radius_km):
+        dlat, dlng = _km_to_degrees(radius_km, lat)
+        return self._cells_for_bbox(lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+    def add(self, zone):
+        """Adds a zone, replacing any existing zone with the same id."""
+        zone_id = self.zone_key(zone)
+        if zone_id in self._zones:
+            self.remove(zone_id)
+        try:
+            lat, lng = float(zone['lat']), float(zone['lng'])
+            radius_km = float(zone.get('radius') or 0) / 1000
+        except (KeyError, TypeError, ValueError):
+            return False
+        cells = self._cells_around(lat, lng, radius_km)
+        for cell in cells:
+            self._cells.setdefault(cell, {})[zone_id] = zone
+        self._zones[zone_id] = (zone, cells)
+        return True
+
+    def remove(self, zone_id):
+        """Removes a zone by id. Returns True if it was present."""
+        entry = self._zones.pop(zone_id, None)
+        if entry is None:
+            return False
+        for cell in entry[1]:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(zone_id, None)
+                if not bucket:
+                    del self._cells[cell]
+        return True
+
+    def update(self, zone):
+        """Re-indexes a zone whose position or radius may have changed."""
+        return self.add(zone)
+
+    def rebuild(self, zones):
+        """Discards the current contents and indexes the given zones."""
+        self._cells = {}
+        self._zones = {}
+        for zone in zones:
+            self.add(zone)
+
+    def candidates(self, lat, lng, search_km=0.0):
+        """
+        Returns zones whose circle may lie within search_km of the point.
+        The result is a superset of the true matches; callers still check distance.
+        """
+        if search_km <= 0:
+            bucket = self._cells.get(self._cell(lat, lng))
+            return list(bucket.values()) if bucket else []
+        found = {}
+        for cell in self._cells_around(lat, lng, search_km):
+            bucket = self._cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return list(found.values())
+
+    def query_bbox(self, south, west, north, east, exact=False):
+        """
+        Returns zones whose circle may intersect the given bounding box.
+        With exact=True, candidates that only share a grid cell are dropped.
+        """
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+        found = {}
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+            # Large boxes: walking the occupied cells is cheaper than the box.
+            for (row, col), bucket in self._cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    found.update(bucket)
+        else:
+            for cell in self._cells_for_bbox(south, west, north, east):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    found.update(bucket)
+        if exact:
+            return [z for z in found.values() if circle_intersects_bbox(z, south, west, north, east)]
+        return list(found.values())
@@ -0,0 +1,157 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+import anomaly_detection
+from spatial_index import ZoneIndex, cluster_zones, tile_bounds
+
+def _zones(count, seed=1):
+    rng = random.Random(seed)
+    return [{"id": f"z{i}", "lat": rng.uniform(12.0, 13.0), "lng": rng.uniform(77.0, 78.0),
+             "radius": rng.uniform(100, 3000)} for i in range(count)]
+
+def test_zone_index_matches_linear_scan():
+    """The spatial index should find the same zones as a full scan."""
+    zones = _zones(300)
+    index = ZoneIndex()
+    index.rebuild(zones)
+    rng = random.Random(2)
+    for _ in range(200):
+        location = (rng.uniform(12.0, 13.0), rng.uniform(77.0, 78.0))
+        assert anomaly_detection.check_danger_zone_entry(location, index)[0] == \
+            anomaly_detection.check_danger_zone_entry(location, zones)[0]
+        assert anomaly_detection.check_approaching_danger_zone(location, index)[0] == \
+            anomaly_detection.check_approaching_danger_zone(location, zones)[0]
+
+def test_zone_index_incremental_updates():
+    """Zones can be added, moved and removed without a rebuild."""
+    index = ZoneIndex()
+    zone = {"id": "a", "lat": 12.5, "lng": 77.5, "radius": 500}
+    index.add(zone)
+    assert anomaly_detection.check_danger_zone_entry((12.5, 77.5), index)[0]
+
+    index.update({"id": "a", "lat": 20.0, "lng": 80.0, "radius": 500})
+    assert not anomaly_detection.check_danger_zone_entry((12.5, 77.5), index)[0]
+    assert anomaly_detection.check_danger_zone_entry((20.0, 80.0), index)[0]
+
+    assert index.remove("a")
+    assert len(index) == 0
+    assert not anomaly_detection.check_danger_zone_entry((20.0, 80.0), index)[0]
+
+def test_batch_check_matches_scalar_checks():
+    """The vectorized batch API should agree with the per-tourist functions."""
+    zones = _zones(200)
+    zone_lats, zone_lngs, zone_radii = anomaly_detection.zone_arrays(zones)
+    rng = np.random.default_rng(3)
+    lats, lngs = rng.uniform(12.0, 13.0, 500), rng.uniform(77.0, 78.0, 500)
+    result = anomaly_detection.batch_check_danger_zones(lats, lngs, zone_lats, zone_lngs, zone_radii)
+    for i in range(len(lats)):
+        location = (lats[i], lngs[i])
+        assert result['inside'][i] == anomaly_detection.check_danger_zone_entry(location, zones)[0]
+        assert result['approaching'][i] == anomaly_detection.check_approaching_danger_zone(location, zones)[0]
+        nearest = min(anomaly_detection.haversine(lats[i], lngs[i], z['lat'], z['lng']) - z['radius'] / 1000
+                      for z in zones)
+        assert abs(result['nearest_km'][i] - nearest) < 1e-6
+
+def test_classify_location_returns_overlapping_zones_sorted():
+    """Overlapping zones should all be reported, nearest first."""
+    zones = [
+        {"id": "big", "lat": 12.50, "lng": 77.50, "radius": 5000},
+        {"id": "small", "lat": 12.501, "lng": 77.50, "radius": 1000},
+        {"id": "near", "lat": 12.518, "lng": 77.50, "radius": 1000},
+        {"id": "far", "lat": 13.00, "lng": 77.50, "radius": 1000},
+    ]
+    inside, approaching = anomaly_detection.classify_location((12.501, 77.50), zones)
+    assert [hit["zone"]["id"] for hit in inside] == ["small", "big"]
+    assert [hit["zone"]["id"] for hit in approaching] == ["near"]
+    assert anomaly_detection.check_danger_zone_entry((12.501, 77.50), zones)[1]["id"] == "small"
+
+def test_zone_index_viewport_queries():
+    """Bounding-box and tile queries return only zones overlapping the viewport."""
+    zones = _zones(300)
+    index = ZoneIndex()
+    index.rebuild(zones)
+    south, west, north, east = 12.4, 77.4, 12.6, 77.6
+    expected = {z["id"] for z in zones
+                if anomaly_detection.haversine(min(max(z["lat"], south), north), min(max(z["lng"], west), east),
+                                               z["lat"], z["lng"]) * 1000 <= z["radius"]}
+    found = {z["id"] for z in index.query_bbox(south, west, north, east, exact=True)}
+    assert found == expected
+
+    south, west, north, east = tile_bounds(0, 0, 0)
+    assert (round(west), round(east)) == (-180, 180) and north > 85 and south < -85
+
+    clusters = cluster_zones(zones, 1.0)
+    assert sum(c.get("count", 1) for c in clusters) == len(zones)
+
+def test_corridor_detector_flags_points_off_the_route():
+    """Points within the buffer of the planned route are normal, others are deviations."""
+    route = [(12.5 + i * 0.0005, 77.5 + i * 0.0003) for i in range(200)]
+    detector = anomaly_detection.AnomalyDetector(buffer_m=100)
+    detector.train(route)
+    assert detector.is_trained
+
+    on_route = (12.55, 77.53)
+    near_route = (12.5503, 77.5300)
+    far_away = (12.55, 77.60)
+    beyond_end = (12.61, 77.57)
+    assert not detector.predict(on_route)
+    assert not detector.predict(near_route)
+    assert detector.predict(far_away)
+    assert detector.predict(beyond_end)
+    assert list(detector.predict_many([on_route, near_route, far_away, beyond_end])) == [False, False, True, True]
+
+    untrained = anomaly_detection.AnomalyDetector()
+    untrained.train(route[:1])
+    assert not untrained.is_trained and not untrained.predict(far_away)
+
+def test_corridor_index_grows_with_route_length_not_leg_area():
+    """A long sparse route trains quickly into a small index; absurd routes are refused."""
+    detector = anomaly_detection.AnomalyDetector(buffer_m=100)
+    start = time.perf_counter()
+    detector.train([(26.0, 78.0), (29.0, 81.0)])  # one ~450 km diagonal leg
+    assert time.perf_counter() - start < 0.5
+    assert detector.memory_bytes() < 2 * 2 ** 20 and len(detector._cell_segments) < 50000
+    assert not detector.predict((27.5, 79.5)) and detector.predict((27.5, 79.6))
+    assert detector.distance((27.5, 79.5)) < 100
+
+    with pytest.raises(ValueError):
+        anomaly_detection.AnomalyDetector(max_segments=1000).train([(26.0, 78.0), (29.0, 81.0)])
+
+def test_batch_path_distances_match_each_detector():
+    """Scoring many tourists against their own routes at once matches per-detector distances."""
+    rng = np.random.default_rng(4)
+    detectors, locations = [], []
+    for i in range(30):
+        t = np.linspace(0, 1, 100)
+        route = np.column_stack([12.0 + i * 0.05 + 0.02 * t, 77.0 + 0.03 * t])
+        detector = anomaly_detection.AnomalyDetector()
+        detector.train(route)
+        detectors.append(detector)
+        locations.append(tuple(route[50] + rng.normal(0, 0.001, 2)))
+    detectors.append(None)
+    locations.append((12.0, 77.0))
+
+    distances = anomaly_detection.batch_path_distances(detectors, locations)
+    expected = [detector.distance(location) for detector, location in zip(detectors[:-1], locations)]
+    np.testing.assert_allclose(distances[:-1], expected)
+    assert np.isfinite(distances).sum() > 10 and np.isinf(distances[-1])
+
+def test_predict_zone_entries_uses_heading():
+    """Only zones ahead of the tourist and reachable within the horizon are predicted."""
+    zones = [
+        {"id": "ahead", "lat": 12.52, "lng": 77.50, "radius": 500},
+        {"id": "behind", "lat": 12.49, "lng": 77.50, "radius": 500},
+        {"id": "far_ahead", "lat": 12.80, "lng": 77.50, "radius": 500},
+    ]
+    index = ZoneIndex()
+    index.rebuild(zones)
+    north_10ms = (0.0, 10.0)
+    entries = anomaly_detection.predict_zone_entries((12.50, 77.50), north_10ms, index, horizon_seconds=600)
+    assert [entry["zone"]["id"] for entry in entries] == ["ahead"]
+    # 0.02 deg north is ~2226 m to the centre, 1726 m to the boundary.
+    assert abs(entries[0]["eta_seconds"] - 172.6) < 1.0
+    assert anomaly_detection.time_to_boundary((12.52, 77.50), north_10ms, zones[0]) == 0.0
+    assert anomaly_detection.time_to_boundary((12.50, 77.50), (10.0, 0.0), zones[0]) is None
@@ -0,0 +1,70 @@
+import time
+
+from anomaly_detection import AnomalyDetector
+from detector_registry import DetectorRegistry
+
+ROUTE = [(12.0 + i * 0.001, 77.0) for i in range(50)]
+
+def _trained():
+    detector = AnomalyDetector()
+    detector.train(ROUTE)
+    return detector
+
+def test_registry_evicts_and_reloads_from_disk(tmp_path):
+    """Evicted models come back from the disk cache, then from the loader."""
+    loads = []
+    def loader(user_id):
+        loads.append(user_id)
+        return ROUTE if user_id != "nobody" else None
+
+    registry = DetectorRegistry(loader=loader, cache_dir=str(tmp_path), max_models=2)
+    for user_id in ("a", "b", "c"):
+        registry.put(user_id, _trained())
+    assert len(registry) == 2 and "a" not in registry
+
+    detector = registry.get("a")
+    assert detector is not None and detector.predict((12.5, 77.5))
+    assert loads == [] and registry.metrics()["disk_loads"] == 1
+
+    # A second worker sharing the cache directory sees the same models.
+    other = DetectorRegistry(loader=loader, cache_dir=str(tmp_path))
+    assert other.get("b") is not None and loads == []
+
+    registry.discard("c")
+    assert registry.get("c") is not None and loads == ["c"]
+    assert registry.get("nobody") is None and registry.get("nobody") is None
+    assert loads == ["c", "nobody"]
+
+def test_registry_respects_memory_budget():
+    """The total size of cached models stays under max_bytes."""
+    size = _trained().memory_bytes()
+    registry = DetectorRegistry(max_bytes=size * 3)
+    for i in range(10):
+        registry.put(f"user{i}", _trained())
+    assert len(registry) == 3
+    assert registry.metrics()["bytes"] <= size * 3
+
+def test_untrained_plan_replaces_the_cached_route(tmp_path):
+    """A new plan too short to train on stops deviations against the old one, here and on other workers."""
+    registry = DetectorRegistry(cache_dir=str(tmp_path))
+    registry.put("a", _trained())
+    short = AnomalyDetector()
+    short.train(ROUTE[:1])
+    assert not short.is_trained
+    registry.put("a", short)
+
+    detector = registry.get("a", rebuild=False)
+    assert detector is not None and not detector.predict((12.5, 77.5))
+    assert DetectorRegistry(cache_dir=str(tmp_path)).get("a", rebuild=False) is None
+
+def test_prune_removes_old_files_not_in_memory(tmp_path):
+    """Cached files nobody rewrote within the TTL are deleted, except for models still held here."""
+    registry = DetectorRegistry(cache_dir=str(tmp_path), max_models=1, ttl_seconds=3600)
+    registry.put("a", _trained())
+    registry.put("b", _trained())  # evicts "a" from memory; its file stays
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+    assert registry.prune() == 0
+    assert registry.prune(now=time.time() + 7200) == 1
+    assert registry.get("a", rebuild=False) is None and registry.get("b", rebuild=False) is not None
+    assert registry.metrics()["files_pruned"] == 1
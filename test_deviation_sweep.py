@@ -0,0 +1,77 @@
+import time
+
+from anomaly_detection import AnomalyDetector
+from deviation_sweep import DeviationSweep
+
+ROUTE = [(12.0 + i * 0.001, 77.0) for i in range(50)]
+
+def _detector():
+    detector = AnomalyDetector()
+    detector.train(ROUTE)
+    return detector
+
+def test_sweep_alerts_on_leaving_the_corridor_only():
+    """Tourists are alerted once when they leave their route, and unchanged fixes are not rescored."""
+    detectors = {"a": _detector(), "b": _detector()}
+    sweep = DeviationSweep(detectors.get)
+    locations = [
+        {"user_id": "a", "lat": 12.02, "lng": 77.0, "timestamp": 100},
+        {"user_id": "b", "lat": 12.02, "lng": 77.05, "timestamp": 100},
+        {"user_id": "c", "lat": 12.02, "lng": 77.05, "timestamp": 100},
+        {"user_id": "d", "lat": 12.02, "lng": 77.05, "timestamp": -5000},
+    ]
+    alerts = sweep.run(locations, float, now=200)
+    assert [alert["user_id"] for alert in alerts] == ["b"]
+    assert alerts[0]["distance_m"] is None
+    assert sweep.metrics()["scored"] == 3
+
+    assert sweep.run(locations, float, now=200) == []
+    assert sweep.metrics()["scored"] == 3
+
+    locations[1] = {"user_id": "b", "lat": 12.02, "lng": 77.06, "timestamp": 150}
+    assert sweep.run(locations, float, now=200) == []
+    locations[1] = {"user_id": "b", "lat": 12.02, "lng": 77.0, "timestamp": 160}
+    locations[0] = {"user_id": "a", "lat": 12.03, "lng": 77.0015, "timestamp": 160}
+    alerts = sweep.run(locations, float, now=200)
+    assert [alert["user_id"] for alert in alerts] == ["a"] and 100 < alerts[0]["distance_m"] < 200
+    assert sweep.metrics()["deviated"] == 1  # "a" only; "b" is back on the route
+
+def test_sweep_defers_work_beyond_its_budget():
+    """With no time budget left nothing is scored, and the fixes stay due for the next run."""
+    sweep = DeviationSweep(lambda user_id: _detector(), budget_seconds=0)
+    locations = [{"user_id": "a", "lat": 12.02, "lng": 77.05, "timestamp": 100}]
+    assert sweep.run(locations, float, now=100) == []
+    assert sweep.metrics()["deferred"] == 1
+    sweep.budget_seconds = 10
+    assert len(sweep.run(locations, float, now=100)) == 1
+
+def test_sweep_checks_its_budget_between_detector_lookups():
+    """A slow lookup ends the run inside a chunk instead of after the whole chunk."""
+    lookups = []
+    def slow_lookup(user_id):
+        lookups.append(user_id)
+        time.sleep(0.05)
+        return _detector()
+    sweep = DeviationSweep(slow_lookup, budget_seconds=0.12, chunk_size=100)
+    locations = [{"user_id": f"u{i}", "lat": 12.02, "lng": 77.0, "timestamp": 100} for i in range(20)]
+    sweep.run(locations, float, now=100)
+    assert 1 <= len(lookups) <= 4
+    assert sweep.metrics()["scored"] == len(lookups) and sweep.metrics()["deferred"] == 20 - len(lookups)
+
+def test_recorded_fixes_share_the_sweeps_alert_state():
+    """Fixes scored by the endpoints alert once per episode and are not alerted again by the sweep."""
+    sweep = DeviationSweep({"a": _detector()}.get)
+    assert sweep.record("a", 100, True)
+    assert not sweep.record("a", 110, True)
+    assert sweep.run([{"user_id": "a", "lat": 12.02, "lng": 77.05, "timestamp": 110}], float, now=120) == []
+    assert sweep.run([{"user_id": "a", "lat": 12.02, "lng": 77.06, "timestamp": 115}], float, now=120) == []
+    assert not sweep.record("a", 130, False)
+    assert sweep.record("a", 140, True)
+
+    # A fix recorded while the sweep is looking up detectors wins over the sweep's older snapshot.
+    def lookup(user_id):
+        sweep.record(user_id, 160, True)
+        return _detector()
+    sweep = DeviationSweep(lookup)
+    assert sweep.run([{"user_id": "a", "lat": 12.02, "lng": 77.0, "timestamp": 150}], float, now=150) == []
+    assert sweep.metrics()["deviated"] == 1 and not sweep.record("a", 170, True)
@@ -0,0 +1,171 @@
+import time
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from disaster_prediction import DisasterEventStore, DisasterPredictionModel, DisasterZoneCache
+
+def test_disaster_zone_cache_refreshes_in_the_background():
+    """Zones are computed once, versioned, served from memory, and refreshes never overlap."""
+    cache = DisasterZoneCache()
+    assert not cache.ready and cache.get()[2] == "[]"
+    assert cache.refresh()
+    token, zones, body = cache.get()
+    assert cache.ready and token.endswith("-1") and body.startswith("[")
+    assert len(cache._model) > 0
+
+    trained_model = cache._model
+    assert cache.refresh() and cache._model is trained_model  # file unchanged: no retraining
+    assert cache.get()[0].endswith("-2")
+
+    started, gate = threading.Event(), threading.Event()
+    class SlowModel(DisasterPredictionModel):
+        def train(self):
+            started.set()
+            gate.wait(5)
+            super().train()
+    slow = DisasterZoneCache(model_factory=SlowModel)
+    thread = slow.start()
+    assert started.wait(5)
+    assert slow.refresh() is False
+    gate.set()
+    thread.join(5)
+    assert slow.ready
+
+def test_cluster_statistics_are_vectorized_group_bys():
+    """Per-cluster centroids, gaps and times of day match a per-event computation."""
+    records = [
+        {"place": {"lat": 10.0, "lng": 76.0}, "date": "2020-01-01", "time": "8:00:00", "description": "A", "type": "x"},
+        {"place": {"lat": 10.2, "lng": 76.2}, "date": "2021-01-01", "time": "10:00:00", "description": "B", "type": "x"},
+        {"place": {"lat": 10.1, "lng": 76.1}, "date": "2020-07-01", "time": "12:00:00", "description": "A", "type": "y"},
+        {"place": {"lat": 30.0, "lng": 90.0}, "date": "2019-05-05", "time": "23:59:59", "description": "C", "type": "y"},
+    ]
+    model = DisasterPredictionModel()
+    model.load_records(records)
+    model.model.labels_ = np.array([0, 0, 0, -1])
+    model.is_trained = True
+
+    stats = model.cluster_statistics()
+    assert stats["count"].tolist() == [3]
+    assert np.allclose([stats["lat"][0], stats["lng"][0]], [10.1, 76.1])
+    span = (datetime(2021, 1, 1, 10) - datetime(2020, 1, 1, 8)).total_seconds()
+    assert stats["mean_interval"][0] == span / 2
+    assert stats["mean_time_of_day"][0] == 10 * 3600
+    assert model.types == ["x", "y"] and model.memory_bytes() < 200
+
+    zones = model.get_disaster_zones(now=datetime(2020, 1, 1))
+    assert len(zones) == 1 and "'A'" in zones[0]["description"]
+    assert (zones[0]["date"], zones[0]["time"]) == ("2021-07-03", "10:00:00")
+    assert model.get_disaster_zones(now=datetime(2030, 1, 1)) == []
+
+def test_clustering_uses_a_kilometre_radius():
+    """eps_km is a great-circle distance, duplicates are weighted, and types can be split."""
+    def event(lat, lng, kind):
+        return {"place": {"lat": lat, "lng": lng}, "date": "2020-01-01", "time": "00:00:00",
+                "description": kind, "type": kind}
+    # Two flood sites ~5.5 km apart, one repeated landslide site, one lone event far away.
+    records = [event(20.0, 80.0, "flood"), event(20.05, 80.0, "flood"),
+               event(25.0, 85.0, "landslide"), event(25.0, 85.0, "landslide"),
+               event(20.02, 80.0, "landslide"), event(30.0, 70.0, "flood")]
+    model = DisasterPredictionModel(eps_km=10)
+    model.load_records(records)
+    model.train()
+    labels = model.model.labels_
+    assert labels[0] == labels[1] == labels[4] and labels[2] == labels[3] and labels[0] != labels[2]
+    assert labels[5] == -1
+    assert model.fit_stats["points"] == 5 and model.fit_stats["clusters"] == 2
+
+    model.eps_km = 3
+    model.model.eps = 3 / 6371
+    model.train()
+    assert model.model.labels_[1] == -1 and model.fit_stats["clusters"] == 2
+
+    model = DisasterPredictionModel(eps_km=10, by_type=True)
+    model.load_records(records)
+    model.train()
+    labels = model.model.labels_
+    assert labels[0] == labels[1] and labels[4] == -1 and labels[2] == labels[3] != labels[0]
+    assert model.fit_stats["fit_seconds"] >= 0
+
+def _same_partition(a, b):
+    """True when two label arrays group the events identically (noise as noise)."""
+    a, b = np.asarray(a), np.asarray(b)
+    if not np.array_equal(a < 0, b < 0):
+        return False
+    pairs = set(zip(a[a >= 0].tolist(), b[b >= 0].tolist()))
+    return len(pairs) == len({x for x, _ in pairs}) == len({y for _, y in pairs})
+
+def test_added_events_only_recluster_their_neighbourhood():
+    """Appending events gives the same clusters as a full retrain, touching only nearby events."""
+    rng = np.random.default_rng(5)
+    def events(count):
+        centres = np.array([[12.0, 77.0], [19.0, 73.0], [26.0, 80.0], [22.0, 88.0]])
+        picks = rng.integers(0, len(centres), count)
+        points = centres[picks] + rng.normal(0, 0.3, (count, 2))
+        return [{"id": f"e{rng.integers(1e9)}", "place": {"lat": lat, "lng": lng}, "date": "2021-03-04",
+                 "time": "6:30:00", "description": f"d{pick % 3}", "type": ["flood", "crowd"][pick % 2]}
+                for (lat, lng), pick in zip(points.tolist(), rng.integers(0, 4, count).tolist())]
+    base, extra = events(400), events(15)
+    for by_type in (False, True):
+        incremental = DisasterPredictionModel(eps_km=8, by_type=by_type)
+        incremental.load_records(base)
+        incremental.train()
+        for start in range(0, len(extra), 5):
+            incremental.add_records(extra[start:start + 5])
+        full = DisasterPredictionModel(eps_km=8, by_type=by_type)
+        full.load_records(base + extra)
+        full.train()
+        assert _same_partition(incremental.model.labels_, full.model.labels_)
+        assert incremental.fit_stats["clusters"] == full.fit_stats["clusters"]
+        assert incremental.fit_stats["last_update"]["reclustered"] < len(base)
+        assert incremental.descriptions == ["d0", "d1", "d2"]
+
+    # A bridging event merges two clusters into one.
+    model = DisasterPredictionModel(eps_km=10)
+    model.load_records([{"place": {"lat": 20.0, "lng": 80.0 + 0.08 * i}, "date": "2020-01-01",
+                         "time": "00:00:00", "description": "x", "type": "x"} for i in (0, 1, 3, 4)])
+    model.train()
+    assert model.fit_stats["clusters"] == 2
+    model.add_records([{"place": {"lat": 20.0, "lng": 80.16}, "date": "2020-02-01", "time": "00:00:00"}])
+    assert len(set(model.model.labels_.tolist())) == 1 and model.fit_stats["clusters"] == 1
+    assert model.types == ["x", ""]
+
+def test_disaster_zone_cache_adds_events_without_retraining(tmp_path):
+    """New events are stored once, folded into the live model and published as a new version."""
+    store = DisasterEventStore(str(tmp_path / "live" / "events.jsonl"))
+    cache = DisasterZoneCache(event_store=store)
+    event = {"id": "ext_1", "place": {"lat": 28.6, "lng": 77.2}, "date": "2024-01-01", "time": "9:00:00",
+             "description": "Flood", "type": "natural_disaster"}
+    assert cache.add_events([event]) == 1  # no model yet: only stored
+    assert cache.refresh()
+    trained_model = cache._model
+    assert trained_model.fit_stats["events"] == len(trained_model) and trained_model.descriptions.count("Flood")
+
+    token = cache.get()[0]
+    second = dict(event, id="ext_2", date="2024-06-01")
+    assert cache.add_events([event, second]) == 1
+    assert cache._model is trained_model and cache.get()[0] != token
+    assert trained_model.fit_stats["last_update"]["events"] == 1
+    assert cache.add_events([second]) == 0
+    assert [r["id"] for r in DisasterEventStore(store.path).load()] == ["ext_1", "ext_2"]
+
+def test_failed_event_update_is_not_hidden(tmp_path):
+    """Malformed events are never stored; a failed model update triggers a retrain that includes the events."""
+    store = DisasterEventStore(str(tmp_path / "events.jsonl"))
+    cache = DisasterZoneCache(event_store=store)
+    assert cache.refresh()
+    event = {"id": "ext_1", "place": {"lat": 28.6, "lng": 77.2}, "date": "2024-01-01", "time": "9:00:00",
+             "description": "Cloudburst ext_1", "type": "natural_disaster"}
+    assert cache.add_events([dict(event, id="bad", date="soon")]) == 0
+    assert store.load() == [] and cache.last_error
+
+    broken = cache._model
+    broken._update_clusters = lambda added: 1 / 0
+    assert cache.add_events([event]) == 1
+    assert [r["id"] for r in store.load()] == ["ext_1"]
+    deadline = time.time() + 60
+    while cache._model is broken and time.time() < deadline:
+        time.sleep(0.05)
+    assert cache._model is not broken and cache._model.descriptions.count("Cloudburst ext_1")
+    assert cache.last_error is None
@@ -0,0 +1,139 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from external_data import GdacsFeed, PoliceLocationCache, fetch_police_locations_from_api
+
+def _item(event_id, country, title, point="26.5 85.0"):
+    return f"""<item><title>{title}</title>
+<link>https://www.gdacs.org/report.aspx?eventtype=FL&amp;eventid={event_id}&amp;episodeid=1</link>
+<pubDate>Tue, 15 Oct 2024 06:00:00 GMT</pubDate>
+<gdacs:country>{country}</gdacs:country><georss:point>{point}</georss:point></item>"""
+
+def _feed(*items):
+    return ('<?xml version="1.0"?><rss xmlns:gdacs="http://www.gdacs.org" xmlns:georss="http://www.georss.org/georss">'
+            f'<channel><title>GDACS</title>{"".join(items)}</channel></rss>').encode()
+
+class FixtureServer:
+    """Serves one RSS body over HTTP on localhost, honouring If-None-Match like GDACS does."""
+
+    def __init__(self):
+        self.body, self.etag, self.status, self.requests = b"", '"v0"', 200, []
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture.requests.append(dict(self.headers))
+                if fixture.status != 200:
+                    self.send_response(fixture.status)
+                    self.end_headers()
+                elif self.headers.get("If-None-Match") == fixture.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.send_header("ETag", fixture.etag)
+                    self.send_header("Last-Modified", "Tue, 15 Oct 2024 06:00:00 GMT")
+                    self.send_header("Content-Length", str(len(fixture.body)))
+                    self.end_headers()
+                    self.wfile.write(fixture.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/rss.xml"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, body, etag):
+        self.body, self.etag = body, etag
+
+def test_gdacs_feed_conditional_streaming_diff():
+    """Only India items are kept, unchanged feeds cost a 304, and polls report what changed."""
+    fixture = FixtureServer()
+    try:
+        feed = GdacsFeed(url=fixture.url, timeout=5)
+        fixture.publish(_feed(_item(1, "India", "Flood in Bihar"), _item(2, "Nepal", "Flood in Nepal"),
+                              _item(3, "India, Bangladesh", "Cyclone"), _item(4, "India", "No point", point="")), '"v1"')
+        diff = feed.poll()
+        assert sorted(zone["id"] for zone in diff["added"]) == ["ext_gdacs_1", "ext_gdacs_3"]
+        assert diff["changed"] == diff["removed"] == []
+        zone = feed.zones["ext_gdacs_1"]
+        assert (zone["lat"], zone["lng"], zone["radius"], zone["type"]) == (26.5, 85.0, 50000, "external")
+        assert zone["published"] == "2024-10-15T06:00:00+00:00"
+
+        assert feed.poll() is None
+        assert fixture.requests[-1]["If-None-Match"] == '"v1"'
+        assert fixture.requests[-1]["If-Modified-Since"] == "Tue, 15 Oct 2024 06:00:00 GMT"
+
+        fixture.publish(_feed(_item(1, "India", "Flood in Bihar, upgraded"), _item(5, "India", "Earthquake")), '"v2"')
+        diff = feed.poll()
+        assert [zone["id"] for zone in diff["added"]] == ["ext_gdacs_5"]
+        assert [zone["description"] for zone in diff["changed"]] == ["Flood in Bihar, upgraded"]
+        assert diff["removed"] == ["ext_gdacs_3"]
+
+        fixture.publish(fixture.body, '"v3"')  # new validator, same content
+        assert feed.poll() is None
+
+        fixture.status = 500
+        assert feed.poll() is None and len(feed.zones) == 2
+        fixture.status = 200
+        fixture.publish(b"<rss><channel><item>", '"v4"')
+        assert feed.poll() is None and len(feed.zones) == 2
+
+        stats = feed.metrics()
+        assert (stats["fetches"], stats["not_modified"], stats["unchanged"], stats["changed"], stats["errors"]) == \
+            (6, 1, 1, 2, 2)
+        assert stats["items_seen"] == 8 and stats["zones"] == 2
+        assert stats["max_fetch_ms"] >= stats["avg_fetch_ms"] > 0
+    finally:
+        fixture.server.shutdown()
+
+def test_police_lookups_are_served_from_cached_tiles():
+    """Pans reuse cached tiles, concurrent misses share a fetch, and results are trimmed to the viewport."""
+    calls, gate = [], threading.Event()
+    stations = [{"id": f"p{i}", "unit_name": "PS", "officer_name": "PS", "latitude": 12.9 + i * 0.01,
+                 "longitude": 77.55 + i * 0.01, "notes": ""} for i in range(10)]
+
+    def fetch(south, west, north, east):
+        calls.append((south, west, north, east))
+        gate.wait(5)
+        return [s for s in stations if south <= s["latitude"] < north and west <= s["longitude"] < east]
+
+    cache = PoliceLocationCache(fetch=fetch, tile_zoom=12, max_tiles_per_request=4)
+    gate.set()
+    view = (12.9, 77.55, 12.955, 77.605)
+    first = cache.get(*view)
+    assert sorted(s["id"] for s in first) == ["p0", "p1", "p2", "p3", "p4", "p5"]
+    fetched = len(calls)
+    assert 1 <= fetched <= 4
+    panned = cache.get(12.905, 77.555, 12.945, 77.595)  # a small pan inside the same tiles
+    assert len(calls) == fetched and sorted(s["id"] for s in panned) == ["p1", "p2", "p3", "p4"]
+
+    # A whole-country view drops to a coarser zoom instead of fanning out.
+    assert all(z < 12 for z, _, _ in cache.tiles_for(6.5, 68.0, 35.5, 97.5))
+    assert len(cache.tiles_for(6.5, 68.0, 35.5, 97.5)) <= 4
+
+    gate.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(20.0, 80.0, 20.01, 80.01))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    stats = cache.metrics()
+    assert len(calls) == fetched + 1 and len(results) == 5
+    assert stats["coalesced"] == 4 and stats["hits"] >= 1 and stats["fetch_errors"] == 0
+
+def test_police_lookups_serve_stale_tiles_when_a_refetch_fails():
+    responses = [[{"id": "p0", "unit_name": "PS", "officer_name": "PS", "latitude": 20.001, "longitude": 80.001,
+                   "notes": ""}], None]
+    cache = PoliceLocationCache(fetch=lambda *bounds: responses.pop(0), ttl_seconds=0)
+    assert [s["id"] for s in cache.get(20.0, 80.0, 20.01, 80.01)] == ["p0"]
+    assert [s["id"] for s in cache.get(20.0, 80.0, 20.01, 80.01)] == ["p0"]
+    assert cache.metrics()["stale_served"] == 1 and cache.metrics()["fetch_errors"] == 1
+    try:
+        fetch_police_locations_from_api("80,20,79,21")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
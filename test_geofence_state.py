@@ -0,0 +1,54 @@
+from geofence_state import GeofenceStateTracker, INSIDE, EXITED, OUTSIDE
+
+ZONE = {"id": "z1", "lat": 12.5, "lng": 77.5, "radius": 1000}
+
+def _types(transitions):
+    return [t["type"] for t in transitions]
+
+def test_alerts_only_on_transitions_with_hysteresis():
+    """Repeated fixes inside a zone, or jitter on its edge, do not re-alert."""
+    tracker = GeofenceStateTracker(approaching_distance_km=1.0, hysteresis_km=0.05)
+    assert _types(tracker.update("u1", [(ZONE, 1.5)])) == ["approaching_danger_zone"]
+    assert _types(tracker.update("u1", [(ZONE, 1.2)])) == []
+    assert _types(tracker.update("u1", [(ZONE, 0.5)])) == ["danger_zone_entry"]
+    assert _types(tracker.update("u1", [(ZONE, 0.4)])) == []
+    assert _types(tracker.update("u1", [(ZONE, 1.03)])) == []
+    assert tracker.state_of("u1", "z1") == INSIDE
+    assert _types(tracker.update("u1", [(ZONE, 1.2)])) == ["danger_zone_exit"]
+    assert _types(tracker.update("u1", [(ZONE, 1.5)])) == []
+    assert tracker.state_of("u1", "z1") == EXITED
+    assert _types(tracker.update("u1", [])) == []
+    assert tracker.state_of("u1", "z1") == OUTSIDE
+
+def test_dwell_threshold_and_rebuild():
+    """Entry needs the dwell time, and states can be restored from alerts."""
+    tracker = GeofenceStateTracker(min_inside_fixes=2, dwell_seconds=30, max_users=1)
+    assert _types(tracker.update("u1", [(ZONE, 0.1)], now=0)) == []
+    assert _types(tracker.update("u1", [(ZONE, 0.1)], now=10)) == []
+    assert _types(tracker.update("u1", [(ZONE, 0.1)], now=40)) == ["danger_zone_entry"]
+
+    tracker.update("u2", [(ZONE, 0.1)], now=50)
+    assert len(tracker) == 1
+
+    tracker.rebuild([
+        {"user_id": "u3", "type": "approaching_danger_zone", "timestamp": 1, "details": {"zone": ZONE}},
+        {"user_id": "u3", "type": "danger_zone_entry", "timestamp": 2, "details": {"zone": ZONE}},
+    ])
+    assert tracker.state_of("u3", "z1") == INSIDE
+    assert _types(tracker.update("u3", [(ZONE, 0.2)])) == []
+
+def test_projected_entry_drives_approaching_alerts():
+    """With projected entry times, only tourists heading into a zone are warned, however far out."""
+    zone = {"id": "z", "lat": 12.5, "lng": 77.5, "radius": 500}
+    tracker = GeofenceStateTracker(entry_horizon_seconds=300)
+
+    # Walking past 300 m from the edge, never entering: no alert.
+    assert tracker.update("a", [(zone, 0.8)], etas={}) == []
+    # A vehicle 4 km out, two minutes from the boundary: alerted once.
+    assert [t["type"] for t in tracker.update("b", [(zone, 4.5)], etas={"z": 120})] == ["approaching_danger_zone"]
+    assert tracker.update("b", [(zone, 3.5)], etas={"z": 400}) == []
+    assert tracker.state_of("b", "z") == "approaching"
+    # Turned away: the state is dropped quietly, and a new approach alerts again.
+    assert tracker.update("b", [(zone, 3.6)], etas={}) == []
+    assert tracker.state_of("b", "z") == "outside"
+    assert len(tracker.update("b", [(zone, 3.0)], etas={"z": 90})) == 1
@@ -0,0 +1,52 @@
+from inactivity_monitor import InactivityMonitor, shard_of
+
+def test_inactivity_alerts_once_per_episode():
+    """Only expired deadlines are reported, once each, until the user is seen again."""
+    monitor = InactivityMonitor(threshold_seconds=300, forget_seconds=3600)
+    monitor.touch("a", 1000)
+    monitor.touch("b", 1000)
+    monitor.touch("a", 1200)
+    monitor.touch("a", 1100)  # older fixes do not move the deadline back
+    assert monitor.last_seen("a") == 1200 and monitor.last_seen("c") is None
+
+    assert monitor.expire(now=1299) == []
+    assert [item["user_id"] for item in monitor.expire(now=1300)] == ["b"]
+    assert monitor.expire(now=1400) == []
+    assert [item["user_id"] for item in monitor.expire(now=1500)] == ["a"]
+    assert monitor.expire(now=1600) == []
+
+    assert monitor.touch("b", 1700) is True
+    assert [item["user_id"] for item in monitor.expire(now=2000)] == ["b"]
+    monitor.expire(now=1200 + 3600)
+    assert "a" not in monitor._users and len(monitor) == 1
+
+def test_inactivity_shards_partition_users():
+    """Every user belongs to exactly one shard, and loaded alerts are not repeated."""
+    monitors = [InactivityMonitor(shard_index=i, shard_count=3) for i in range(3)]
+    users = [f"user{i}" for i in range(30)]
+    for monitor in monitors:
+        monitor.load([{"user_id": u, "timestamp": 0} for u in users], float,
+                     alerts=[{"user_id": "user0", "type": "inactivity", "timestamp": 10}], now=0)
+    assert sum(len(m) for m in monitors) == len(users)
+    assert all(monitors[shard_of(u, 3)].owns(u) for u in users)
+    reported = [item["user_id"] for m in monitors for item in m.expire(now=1000)]
+    assert sorted(reported) == sorted(u for u in users if u != "user0")
+
+def test_forgotten_users_are_not_reseeded_by_later_syncs():
+    """After the forget deadline a sync from latest locations neither re-adds nor re-alerts the user."""
+    monitor = InactivityMonitor(threshold_seconds=300, forget_seconds=3600)
+    locations = [{"user_id": "a", "timestamp": 1000}]
+    monitor.load(locations, float, now=1000)
+    assert [item["user_id"] for item in monitor.expire(now=1300)] == ["a"]
+    monitor.expire(now=1000 + 3600)
+    assert len(monitor) == 0
+
+    for tick in range(1, 6):
+        now = 1000 + 3600 + tick * 600
+        monitor.load(locations, float, now=now)
+        assert len(monitor) == 0 and monitor.expire(now=now) == []
+
+    # At startup, tourists already idle past the forget window are not alerted at all.
+    restarted = InactivityMonitor(threshold_seconds=300, forget_seconds=3600)
+    restarted.load(locations + [{"user_id": "b", "timestamp": 5000}], float, now=5200)
+    assert len(restarted) == 1 and [item["user_id"] for item in restarted.expire(now=5300)] == ["b"]
@@ -0,0 +1,41 @@
+import threading
+
+from ingest_queue import LocationIngestQueue
+
+def test_queue_batches_and_flushes_on_stop():
+    """Fixes are written in batches and nothing is lost on shutdown."""
+    batches = []
+    ingest = LocationIngestQueue(batches.append, max_size=100, batch_size=10, flush_interval=60)
+    for i in range(25):
+        assert ingest.submit("u1", 12.0, 77.0, i)
+    ingest.stop()
+    assert sum(len(batch) for batch in batches) == 25
+    assert all(len(batch) <= 10 for batch in batches)
+    assert ingest.metrics()["written"] == 25
+    assert ingest.metrics()["depth"] == 0
+
+def test_queue_applies_backpressure_when_full():
+    """A full queue rejects new fixes instead of growing without bound."""
+    release = threading.Event()
+    ingest = LocationIngestQueue(lambda batch: release.wait(5), max_size=5, batch_size=1, flush_interval=0)
+    accepted = [ingest.submit("u1", 12.0, 77.0, i) for i in range(20)]
+    assert not all(accepted)
+    assert ingest.submit_many([("u1", 12.0, 77.0, 0)] * 10) == 0
+    assert ingest.metrics()["rejected"] >= 10
+    release.set()
+    ingest.stop()
+
+def test_queue_drops_only_the_fixes_the_writer_rejects():
+    """A fix that cannot be serialized is isolated and dropped; the rest of the batch is still written."""
+    written = []
+    def writer(batch):
+        if any(point[1] != point[1] for point in batch):  # NaN
+            raise ValueError("Out of range float values are not JSON compliant")
+        written.extend(batch)
+
+    ingest = LocationIngestQueue(writer, max_size=100, batch_size=50, flush_interval=60)
+    for i in range(20):
+        assert ingest.submit(f"u{i}", float("nan") if i == 7 else 12.0, 77.0, i)
+    ingest.stop()
+    assert sorted(point[3] for point in written) == [i for i in range(20) if i != 7]
+    assert ingest.metrics()["invalid"] == 1 and ingest.metrics()["dropped"] == 1
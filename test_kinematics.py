@@ -0,0 +1,72 @@
+from kinematics import KinematicsMonitor
+
+DEG_PER_M = 1 / 111195.0
+
+def _types(anomalies):
+    return [anomaly["type"] for anomaly in anomalies]
+
+def test_kinematics_flags_jumps_and_stops():
+    """A teleport is flagged on the spot; a remote stop after driving is flagged once."""
+    monitor = KinematicsMonitor()
+    assert monitor.update("a", 12.0, 77.0, 0) == []
+    assert _types(monitor.update("a", 13.0, 77.0, 60)) == ["impossible_jump"]
+
+    t, lat = 60, 13.0
+    for _ in range(5):  # driving north at ~36 km/h
+        t, lat = t + 10, lat + 100 * DEG_PER_M
+        assert monitor.update("a", lat, 77.0, t) == []
+    raised = []
+    for _ in range(12):  # parked for two minutes, then more
+        t += 20
+        raised += monitor.update("a", lat, 77.0, t)
+    assert _types(raised) == ["sudden_stop"]
+
+    # With another tourist standing nearby the stop is not remote.
+    monitor = KinematicsMonitor()
+    monitor.update("b", 12.0, 77.0, 0)
+    t, lat = 0, 12.0
+    for _ in range(5):
+        t, lat = t + 10, lat + 100 * DEG_PER_M
+        monitor.update("a", lat, 77.0, t)
+    raised = []
+    for _ in range(12):
+        t += 20
+        raised += monitor.update("a", lat, 77.0, t)
+    assert raised == []
+
+def test_kinematics_flags_loops_and_erratic_speed():
+    """Circling back to the start and alternating sprints and strolls are reported once each."""
+    monitor = KinematicsMonitor()
+    square = [(0, 0), (100, 0), (100, 100), (0, 100), (0, 0), (5, 0)]
+    raised = []
+    for i, (x, y) in enumerate(square):
+        raised += monitor.update("a", 12.0 + y * DEG_PER_M, 77.0 + x * DEG_PER_M, i * 60)
+    assert _types(raised) == ["loop"]
+
+    monitor = KinematicsMonitor()
+    raised, x = [], 0.0
+    for i in range(20):
+        x += 600 if i % 2 else 30
+        raised += monitor.update("b", 12.0, 77.0 + x * DEG_PER_M, i * 30)
+    assert "erratic_speed" in _types(raised) and _types(raised).count("erratic_speed") == 1
+    assert monitor.update("b", 12.0, 77.0, 5) == []  # out-of-order fixes are ignored
+
+def test_kinematics_velocity_estimate():
+    """Velocity comes from a fit over recent fixes and is dropped once they are stale."""
+    monitor = KinematicsMonitor()
+    for i in range(6):
+        monitor.update("a", 12.0 + i * 100 * DEG_PER_M, 77.0, i * 10)
+    vx, vy = monitor.velocity("a", now=55)
+    assert abs(vx) < 0.1 and abs(vy - 10.0) < 0.1
+    assert monitor.velocity("a", now=500) is None
+    assert monitor.velocity("nobody") is None
+
+def test_kinematics_ignores_fixes_without_a_timestamp():
+    """An unparseable time (None) is dropped, so later valid fixes are still processed normally."""
+    monitor = KinematicsMonitor()
+    assert monitor.update("a", 12.0, 77.0, None) == []
+    assert monitor.update("a", 12.0, 77.0, 100) == []
+    assert monitor.update("a", 12.0 + 50 * DEG_PER_M, 77.0, 110) == []
+    assert monitor.update("a", 12.0, 77.0, None) == []
+    assert monitor.metrics()["ignored"] == 2 and monitor.metrics()["fixes"] == 2
+    assert len(monitor._tracks["a"].fixes) == 2
@@ -0,0 +1,60 @@
+import pytest
+
+from location_batch import decode_polyline, epoch_seconds, parse_fix, parse_location_batch
+
+def test_decode_polyline():
+    """Decodes the reference example from the encoded polyline spec."""
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+def test_parse_location_batch_formats():
+    """All upload formats decode to the same ordered (lat, lng, timestamp) fixes."""
+    fixes = parse_location_batch({"fixes": [{"lat": 12.5, "lng": 77.5, "timestamp": "a"},
+                                            {"lat": 12.6, "lng": 77.6, "timestamp": "b"}]})
+    assert fixes == [(12.5, 77.5, "a"), (12.6, 77.6, "b")]
+
+    fixes = parse_location_batch({"origin": {"lat": 12.5, "lng": 77.5, "timestamp": 1700000000000},
+                                  "deltas": [[100, -50, 1500]]})
+    assert fixes == [(12.5, 77.5, "2023-11-14T22:13:20.000Z"), (12.501, 77.4995, "2023-11-14T22:13:21.500Z")]
+
+    fixes = parse_location_batch({"polyline": "_p~iF~ps|U_ulLnnqC", "timestamps": [1, 2]})
+    assert fixes == [(38.5, -120.2, 1), (40.7, -120.95, 2)]
+
+    with pytest.raises(ValueError):
+        parse_location_batch({"fixes": [{"lat": 91, "lng": 0, "timestamp": 1}]})
+    with pytest.raises(ValueError):
+        parse_location_batch({"polyline": "_p~iF~ps|U", "timestamps": []})
+
+def test_parse_fix_rejects_bad_coordinates_and_timestamps():
+    """Single fixes are checked before they are queued: numbers on the map and a plain timestamp."""
+    assert parse_fix({"lat": "12.5", "lng": 77, "timestamp": "2024-01-01T00:00:00Z"}) == \
+        (12.5, 77.0, "2024-01-01T00:00:00Z")
+    for fix in ({"lat": "abc", "lng": 77.5, "timestamp": "t"},
+                {"lat": float("nan"), "lng": 77.5, "timestamp": "t"},
+                {"lat": 12.5, "lng": float("inf"), "timestamp": "t"},
+                {"lat": 95.0, "lng": 77.5, "timestamp": "t"},
+                {"lat": 12.5, "lng": -181, "timestamp": "t"},
+                {"lat": None, "lng": 77.5, "timestamp": "t"},
+                {"lat": 12.5, "lng": 77.5, "timestamp": {"at": 1}},
+                {"lat": 12.5, "lng": 77.5},
+                None):
+        with pytest.raises(ValueError):
+            parse_fix(fix)
+
+def test_parse_location_batch_rejects_overflowing_and_odd_values():
+    """Infinite or huge numbers and non-scalar timestamps are ValueErrors, never OverflowErrors."""
+    origin = {"lat": 12.5, "lng": 77.5, "timestamp": 1700000000000}
+    for data in ({"origin": dict(origin, lat=float("inf")), "deltas": []},
+                 {"origin": dict(origin, timestamp=1e300), "deltas": []},
+                 {"origin": origin, "deltas": [[float("inf"), 0, 0]]},
+                 {"origin": origin, "deltas": [[10 ** 400, 0, 0]]},
+                 {"origin": origin, "deltas": [[0, 0, 10 ** 20]]},
+                 {"fixes": [{"lat": 12.5, "lng": 77.5, "timestamp": {"at": 1}}]},
+                 {"polyline": "_p~iF~ps|U", "timestamps": [[1]]}):
+        with pytest.raises(ValueError):
+            parse_location_batch(data)
+
+def test_epoch_seconds_reads_iso_strings_and_epoch_numbers():
+    """ISO strings, epoch seconds and epoch milliseconds agree; anything else is None."""
+    assert epoch_seconds("2023-11-14T22:13:20Z") == epoch_seconds(1700000000) == epoch_seconds(1700000000000) == 1700000000
+    for timestamp in ("yesterday", None, True, {"at": 1}, float("inf")):
+        assert epoch_seconds(timestamp) is None
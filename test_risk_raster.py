@@ -0,0 +1,70 @@
+import struct
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from risk_raster import RiskRaster, event_fingerprint
+
+NOW = datetime(2024, 1, 1)
+
+def _epoch(year):
+    return int(np.datetime64(datetime(year, 1, 1), 's').astype(np.int64))
+
+def _decode_png(body):
+    assert body[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, offset = {}, 8
+    while offset < len(body):
+        length, kind = struct.unpack(">I4s", body[offset:offset + 8])
+        data = body[offset + 8:offset + 8 + length]
+        assert struct.unpack(">I", body[offset + 8 + length:offset + 12 + length])[0] == zlib.crc32(kind + data)
+        chunks[kind] = chunks.get(kind, b"") + data
+        offset += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), np.uint8).reshape(height, width * 4 + 1)
+    return raw[:, 1:].reshape(height, width, 4)
+
+def test_risk_raster_lookups_and_memory_mapped_reload(tmp_path):
+    """Recent, repeated events score highest; the grid is one byte per cell and reloads memory-mapped."""
+    path = str(tmp_path / "risk.npy")
+    raster = RiskRaster(path)
+    assert raster.risk_at(20.0, 80.0) is None and raster.tile_png(5, 23, 14) is None
+    lat = [20.0] * 5 + [25.0] * 5 + [30.0]
+    lng = [80.0] * 5 + [85.0] * 5 + [75.0]
+    epoch = [_epoch(2023)] * 5 + [_epoch(2013)] * 5 + [_epoch(2023)]
+    grid = raster.build(lat, lng, epoch, now=NOW, source="test")
+    assert grid.dtype == np.uint8 and grid.max() == 255
+
+    recent, old, single = raster.risk_at(20.02, 80.02), raster.risk_at(25.02, 85.02), raster.risk_at(30.02, 75.02)
+    assert recent == 1.0 and recent > single > old > 0
+    assert raster.risk_at(12.0, 90.0) == 0.0 and raster.risk_at(40.0, 80.0) is None
+    assert raster.risk_many([20.02, 50.0], [80.02, 80.0]).tolist()[1] != raster.risk_many([20.02], [80.02])[0]
+
+    reloaded = RiskRaster(path)
+    assert reloaded.load() and reloaded.meta["source"] == "test"
+    assert isinstance(reloaded._state[1][0], np.memmap)
+    assert reloaded.risk_at(25.02, 85.02) == old
+    assert not RiskRaster(str(tmp_path / "missing.npy")).load()
+
+def test_risk_tiles_are_png_heatmaps_cached_per_build(tmp_path):
+    """Tiles decode as RGBA PNGs, are transparent away from events, and are re-rendered after a build."""
+    raster = RiskRaster(str(tmp_path / "risk.npy"))
+    raster.build([20.0] * 3, [80.0] * 3, [_epoch(2023)] * 3, now=NOW)
+    # z=5 tile 23/14 covers about 78.75-90 E, 11.2-21.9 N.
+    pixels = _decode_png(raster.tile_png(5, 23, 14))
+    assert pixels.shape == (256, 256, 4) and pixels[..., 3].max() > 0 and pixels[0, 255, 3] == 0
+    assert raster.tile_png(5, 23, 14) is raster.tile_png(5, 23, 14)
+    assert _decode_png(raster.tile_png(0, 0, 0))[..., 3].max() > 0  # coarse pyramid level keeps the hotspot
+    assert _decode_png(raster.tile_png(5, 0, 0))[..., 3].max() == 0
+
+    version = raster.version
+    raster.build([30.0], [75.0], [_epoch(2023)], now=NOW)
+    assert raster.version == version + 1 and raster.metrics()["cached_tiles"] == 0
+
+def test_event_fingerprint_follows_the_events_only():
+    """Equal event columns give the same fingerprint whatever their container; any change gives a new one."""
+    lat, lng, epoch = [20.0, 25.0], [80.0, 85.0], [_epoch(2023), _epoch(2013)]
+    fingerprint = event_fingerprint(np.array(lat), np.array(lng), np.array(epoch))
+    assert event_fingerprint(lat, lng, epoch) == fingerprint
+    assert event_fingerprint(lat, lng, [_epoch(2023), _epoch(2014)]) != fingerprint
+    assert event_fingerprint(lat + [30.0], lng + [75.0], epoch + [_epoch(2023)]) != fingerprint
@@ -0,0 +1,52 @@
+import threading
+
+from detector_registry import DetectorRegistry
+from training_pool import DetectorTrainingPool
+
+ROUTE = [(12.0 + i * 0.001, 77.0) for i in range(50)]
+OTHER_ROUTE = [(13.0 + i * 0.001, 78.0) for i in range(50)]
+
+def test_training_pool_trains_in_background():
+    """Jobs return at once; the newest path wins and metrics track the work."""
+    registry = DetectorRegistry()
+    pool = DetectorTrainingPool(registry, max_workers=1, max_pending=4)
+    gate = threading.Event()
+    original_put = registry.put
+    registry.put = lambda *args: gate.wait(5) and original_put(*args)
+
+    # The only worker stays busy with this job until the gate opens, so the
+    # first u1 job cannot finish before the second one supersedes it.
+    assert pool.submit("u0", ROUTE)
+    first = pool.submit("u1", ROUTE)
+    second = pool.submit("u1", OTHER_ROUTE)
+    third = pool.submit("u2", ROUTE)
+    assert first and second and third
+    assert pool.submit("u3", ROUTE) is None
+    assert pool.is_pending("u1") and registry.get("u1", rebuild=False) is None
+
+    gate.set()
+    assert pool.wait(5)
+    assert not pool.is_pending("u1")
+    assert pool.job(second)["status"] == "done"
+    assert pool.job(first)["status"] == "superseded"
+    assert not registry.get("u1").predict(OTHER_ROUTE[10])
+    assert registry.get("u1").predict(ROUTE[10])
+
+    metrics = pool.metrics()
+    assert metrics["completed"] == 3 and metrics["rejected"] == 1 and metrics["queue_length"] == 0
+    assert metrics["avg_train_ms"] > 0
+    pool.shutdown()
+
+def test_failed_training_discards_the_previous_route(tmp_path):
+    """A plan that cannot be trained removes the old route's model from memory and disk."""
+    registry = DetectorRegistry(cache_dir=str(tmp_path))
+    pool = DetectorTrainingPool(registry, max_workers=1)
+    pool.submit("u1", ROUTE)
+    assert pool.wait(5) and registry.get("u1", rebuild=False) is not None
+
+    job_id = pool.submit("u1", [("a", "b"), ("c", "d")])
+    assert pool.wait(5)
+    assert pool.job(job_id)["status"] == "failed" and pool.metrics()["failed"] == 1
+    assert "u1" not in registry and registry.get("u1", rebuild=False) is None
+    assert DetectorRegistry(cache_dir=str(tmp_path)).get("u1", rebuild=False) is None
+    pool.shutdown()
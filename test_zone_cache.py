@@ -0,0 +1,79 @@
+from zone_cache import ZoneSnapshot
+
+def _loader(zones):
+    calls = []
+    def load():
+        calls.append(1)
+        return [dict(zone) for zone in zones]
+    return load, calls
+
+def test_snapshot_loads_once_and_tracks_writes():
+    """The snapshot reads the database once, then follows local writes."""
+    load, calls = _loader([{"id": "a", "lat": 12.5, "lng": 77.5, "radius": 500}])
+    snapshot = ZoneSnapshot(loader=load)
+    assert [z["id"] for z in snapshot.zones()] == ["a"]
+    assert [z["id"] for z in snapshot.zones()] == ["a"]
+    assert len(calls) == 1
+
+    version = snapshot.version
+    snapshot.upsert({"id": "b", "lat": 20.0, "lng": 80.0, "radius": 500})
+    snapshot.replace_group("external", [{"id": "ext_1", "lat": 25.0, "lng": 85.0, "radius": 50000}])
+    assert snapshot.remove("a")
+    assert [z["id"] for z in snapshot.zones()] == ["b", "ext_1"]
+    assert snapshot.version == version + 3
+    assert snapshot.get_index().candidates(25.0, 85.0)[0]["id"] == "ext_1"
+
+    # Replacing a group with identical content is not a change.
+    snapshot.replace_group("external", [{"id": "ext_1", "lat": 25.0, "lng": 85.0, "radius": 50000}])
+    assert snapshot.version == version + 3
+
+def test_snapshot_applies_listener_events():
+    """Realtime Database put/patch events keep the snapshot current."""
+    snapshot = ZoneSnapshot()
+    snapshot.replace_group("external", [{"id": "ext_1", "lat": 25.0, "lng": 85.0, "radius": 50000}])
+    snapshot.apply_event("put", "/", {"a": {"lat": 12.5, "lng": 77.5, "radius": 500},
+                                      "b": {"lat": 13.0, "lng": 77.0, "radius": 500}})
+    assert {z["id"] for z in snapshot.zones()} == {"a", "b", "ext_1"}
+
+    snapshot.apply_event("put", "/a", None)
+    snapshot.apply_event("put", "/b/radius", 900)
+    snapshot.apply_event("patch", "/", {"c": {"lat": 14.0, "lng": 78.0, "radius": 100}})
+    snapshot.apply_event("patch", "/c", {"lat": 14.5})
+    assert snapshot.get("a") is None
+    assert snapshot.get("b")["radius"] == 900
+    assert snapshot.get("c")["lat"] == 14.5
+    assert snapshot.get_index().candidates(14.5, 78.0)[0]["id"] == "c"
+
+def test_snapshot_changes_since_version():
+    """Deltas list added, changed and deleted zones after a version token."""
+    snapshot = ZoneSnapshot(max_tombstones=2)
+    snapshot.upsert({"id": "a", "lat": 12.5, "lng": 77.5, "radius": 500})
+    snapshot.upsert({"id": "b", "lat": 13.0, "lng": 77.0, "radius": 500})
+    token = snapshot.version_token()
+    assert snapshot.changes_since(token) == {"added": [], "changed": [], "deleted": []}
+
+    snapshot.upsert({"id": "b", "lat": 13.0, "lng": 77.0, "radius": 800})
+    snapshot.upsert({"id": "c", "lat": 14.0, "lng": 78.0, "radius": 100})
+    snapshot.remove("a")
+    delta = snapshot.changes_since(token)
+    assert [z["id"] for z in delta["added"]] == ["c"]
+    assert [z["id"] for z in delta["changed"]] == ["b"]
+    assert delta["deleted"] == ["a"]
+
+    # Unknown epochs and versions older than the retained tombstones need a full reload.
+    assert snapshot.changes_since("other-1") is None
+    snapshot.remove("b")
+    snapshot.remove("c")
+    assert snapshot.changes_since(token) is None
+
+def test_snapshot_reuses_zone_tree_until_zones_change():
+    """The batch geofencing KD-tree is built once per version."""
+    load, _ = _loader([{"id": "a", "lat": 12.5, "lng": 77.5, "radius": 500}])
+    snapshot = ZoneSnapshot(loader=load)
+    usable, _, _, _, tree = snapshot.zone_tree()
+    assert [z["id"] for z in usable] == ["a"] and snapshot.zone_tree()[4] is tree
+
+    snapshot.upsert({"id": "b", "lat": 20.0, "lng": 80.0, "radius": 500})
+    usable, _, _, _, rebuilt = snapshot.zone_tree()
+    assert rebuilt is not tree and len(usable) == 2 and rebuilt.data.shape[0] == 2
+    assert ZoneSnapshot(loader=lambda: []).zone_tree()[4] is None
@@ -0,0 +1,175 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from anomaly_detection import AnomalyDetector
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+class DetectorTrainingPool:
+    """
+    Trains path-deviation detectors on background worker threads.
+
+    submit() returns a job id straight away; the trained model is handed to
+    the registry when it is ready, so until then lookups keep getting the
+    previous model (or none). If training fails, the previous model is
+    discarded, since it belongs to a path the user has replaced. A newer
+    path for the same user supersedes any job of theirs that has not
+    finished, and a superseded model is never stored over a newer one. At
+    most max_pending jobs wait at once.
+    """
+
+    def __init__(self, registry, max_workers=2, max_pending=1000, max_jobs=10000):
+        self.registry = registry
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self._executor = None
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()  # keeps the staleness check and the store together
+        self._jobs = OrderedDict()  # job_id -> job dict, oldest first
+        self._latest = {}           # user_id -> id of their newest unfinished job
+        self._pending = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "superseded": 0,
+            "trained": 0,
+            "last_train_ms": 0.0,
+            "max_train_ms": 0.0,
+            "total_train_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="detector-train")
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, user_id, path):
+        """
+        Queues training on a planned path ((lat, lng) pairs).
+        Returns the job id, or None if too many jobs are already waiting.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                return None
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"id": job_id, "user_id": user_id, "status": QUEUED,
+                                  "submitted_at": time.time(), "train_ms": None, "error": None}
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self._latest[user_id] = job_id
+            self._pending += 1
+            self._stats["submitted"] += 1
+            executor = self._get_executor()
+        executor.submit(self._run, job_id, user_id, path)
+        return job_id
+
+    def _run(self, job_id, user_id, path):
+        with self._lock:
+            job = self._jobs.get(job_id, {})
+            if self._latest.get(user_id) != job_id:
+                self._finish(job, job_id, user_id, SUPERSEDED)
+                return
+            job["status"] = RUNNING
+            self._running += 1
+            wait_ms = (time.time() - job.get("submitted_at", time.time())) * 1000
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+        start = time.perf_counter()
+        try:
+            detector = AnomalyDetector()
+            detector.train(path)
+        except Exception as e:
+            print(f"Detector training failed for {user_id}: {e}")
+            # The new plan is already saved, so the previous route's model must not outlive it.
+            with self._store_lock:
+                with self._lock:
+                    stale = self._latest.get(user_id) != job_id
+                if not stale:
+                    self.registry.discard(user_id)
+            with self._lock:
+                job["error"] = str(e)
+                self._running -= 1
+                self._finish(job, job_id, user_id, FAILED)
+            return
+        train_ms = (time.perf_counter() - start) * 1000
+
+        # Only the newest job may store its model; a stale one would undo a newer path.
+        with self._store_lock:
+            with self._lock:
+                stale = self._latest.get(user_id) != job_id
+            if not stale:
+                self.registry.put(user_id, detector)
+        with self._lock:
+            job["train_ms"] = train_ms
+            self._running -= 1
+            self._stats["trained"] += 1
+            self._stats["last_train_ms"] = train_ms
+            self._stats["max_train_ms"] = max(self._stats["max_train_ms"], train_ms)
+            self._stats["total_train_ms"] += train_ms
+            self._finish(job, job_id, user_id, SUPERSEDED if stale else DONE)
+
+    def _finish(self, job, job_id, user_id, status):
+        job["status"] = status
+        self._pending -= 1
+        self._stats["completed" if status == DONE else status] += 1
+        if self._latest.get(user_id) == job_id:
+            del self._latest[user_id]
+
+    def is_pending(self, user_id):
+        """True while a model for the user is queued or training."""
+        with self._lock:
+            return user_id in self._latest
+
+    def job(self, job_id):
+        """Returns a copy of a job's state, or None if it is unknown or long forgotten."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, timeout=None):
+        """Blocks until no jobs are pending; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    # --- Metrics ---
+    def metrics(self):
+        """Queue length, job counters and training time."""
+        with self._lock:
+            stats = dict(self._stats)
+            pending, running = self._pending, self._running
+        total_ms = stats.pop("total_train_ms")
+        trained = stats["trained"]
+        stats.update({
+            "queue_length": pending - running,
+            "running": running,
+            "max_pending": self.max_pending,
+            "workers": self.max_workers,
+            "avg_train_ms": total_ms / trained if trained else 0.0,
+        })
+        return stats
@@ -0,0 +1,241 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+import anomaly_detection
+from spatial_index import ZoneIndex
+
+def zones_from_node(zones_data):
+    """Turns the raw 'zones' node ({id: zone}) into a list of zones with their ids."""
+    zones = []
+    if zones_data and isinstance(zones_data, dict):
+        for zone_id, zone in zones_data.items():
+            if isinstance(zone, dict):
+                zone = dict(zone)
+                zone["id"] = zone_id
+                zones.append(zone)
+    return zones
+
+class ZoneSnapshot:
+    """
+    In-memory copy of every danger zone, kept in step with the database.
+
+    Zones belong to a group ('db' for the Realtime Database, 'external' for
+    live feeds) so one source can be replaced without touching the others.
+    Every change bumps the snapshot version and patches the spatial index,
+    so readers never have to go back to the network.
+
+    Versions are only meaningful within one process, so version tokens handed
+    to clients carry a per-process epoch; a token from another epoch simply
+    gets the full zone list again.
+    """
+
+    def __init__(self, loader=None, max_tombstones=10000):
+        self.loader = loader
+        self.index = ZoneIndex()
+        self.version = 0
+        self.loaded = False
+        self.epoch = uuid.uuid4().hex[:8]
+        self.max_tombstones = max_tombstones
+        self._lock = threading.RLock()
+        self._groups = {}     # group -> {zone_id: zone}
+        self._group_of = {}   # zone_id -> group
+        self._zones_cache = None
+        self._arrays_cache = None
+        self._created = {}                # zone_id -> version it was added in
+        self._changelog = OrderedDict()   # live zone_id -> version of last change, oldest first
+        self._tombstones = OrderedDict()  # deleted zone_id -> version it was deleted in
+        self._delta_floor = 0             # deltas from before this version are incomplete
+
+    # --- Reading ---
+    def ensure_loaded(self):
+        """Loads the database zones through the loader the first time it is needed."""
+        if not self.loaded and self.loader is not None:
+            self.refresh()
+        return self
+
+    def refresh(self):
+        """Re-reads the database zones and applies whatever changed."""
+        zones = self.loader()
+        with self._lock:
+            self.replace_group('db', zones)
+            self.loaded = True
+
+    def zones(self):
+        """Returns every zone, database zones first. The list is shared; do not mutate it."""
+        self.ensure_loaded()
+        with self._lock:
+            if self._zones_cache is None:
+                zones = list(self._groups.get('db', {}).values())
+                for group, members in self._groups.items():
+                    if group != 'db':
+                        zones.extend(members.values())
+                self._zones_cache = zones
+            return self._zones_cache
+
+    def zone_arrays(self):
+        """
+        Returns (zones, lats, lngs, radii_m) for vectorized geofencing, built
+        once per version. Zones without usable coordinates are left out.
+        """
+        zones = self.zones()
+        with self._lock:
+            if self._arrays_cache is None or self._arrays_cache[0] is not zones:
+                usable = [z for z in zones if z.get('id') in self.index]
+                self._arrays_cache = (zones, usable) + anomaly_detection.zone_arrays(usable)
+            return self._arrays_cache[1:5]
+
+    def zone_tree(self):
+        """
+        Returns (zones, lats, lngs, radii_m, tree): the zone_arrays() plus a
+        KD-tree over the zone centres, built once per version on first use.
+        """
+        arrays = self.zone_arrays()
+        with self._lock:
+            cache = self._arrays_cache
+            if cache[1] is not arrays[0]:
+                cache = None  # the zones changed since zone_arrays(); build for the arrays we have
+            elif len(cache) == 5:
+                cache = self._arrays_cache = cache + (anomaly_detection.zone_tree(arrays[1], arrays[2]),)
+        tree = cache[5] if cache else anomaly_detection.zone_tree(arrays[1], arrays[2])
+        return arrays + (tree,)
+
+    def get(self, zone_id):
+        self.ensure_loaded()
+        return self.index.get(zone_id)
+
+    def get_index(self):
+        self.ensure_loaded()
+        return self.index
+
+    # --- Versioning ---
+    def version_token(self):
+        """Opaque token naming the current zone-set version, also used as the ETag."""
+        self.ensure_loaded()
+        return f"{self.epoch}-{self.version}"
+
+    def changes_since(self, token):
+        """
+        Returns {"added", "changed", "deleted"} relative to an earlier version
+        token, or None if the caller has to fetch the full list instead.
+        """
+        self.ensure_loaded()
+        epoch, _, version = (token or '').partition('-')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        since = int(version)
+        with self._lock:
+            if since > self.version or since < self._delta_floor:
+                return None
+            added, changed, deleted = [], [], []
+            for zone_id in reversed(self._changelog):
+                if self._changelog[zone_id] <= since:
+                    break
+                zone = self._groups[self._group_of[zone_id]][zone_id]
+                (added if self._created[zone_id] > since else changed).append(zone)
+            for zone_id in reversed(self._tombstones):
+                if self._tombstones[zone_id] <= since:
+                    break
+                deleted.append(zone_id)
+            return {"added": added, "changed": changed, "deleted": deleted}
+
+    # --- Writing ---
+    def _changed(self, zone_id, deleted=False):
+        self.version += 1
+        self._zones_cache = None
+        if deleted:
+            self._changelog.pop(zone_id, None)
+            self._created.pop(zone_id, None)
+            self._tombstones[zone_id] = self.version
+            if len(self._tombstones) > self.max_tombstones:
+                _, dropped_version = self._tombstones.popitem(last=False)
+                self._delta_floor = dropped_version
+        else:
+            self._tombstones.pop(zone_id, None)
+            self._created.setdefault(zone_id, self.version)
+            self._changelog[zone_id] = self.version
+            self._changelog.move_to_end(zone_id)
+
+    def upsert(self, zone, group='db'):
+        """Adds or replaces a single zone."""
+        zone_id = ZoneIndex.zone_key(zone)
+        with self._lock:
+            old_group = self._group_of.get(zone_id)
+            if old_group is not None and old_group != group:
+                self._groups[old_group].pop(zone_id, None)
+            if self._groups.get(group, {}).get(zone_id) == zone:
+                return False
+            self._groups.setdefault(group, {})[zone_id] = zone
+            self._group_of[zone_id] = group
+            self.index.add(zone)
+            self._changed(zone_id)
+            return True
+
+    def remove(self, zone_id):
+        """Removes a zone. Returns True if it was present."""
+        with self._lock:
+            group = self._group_of.pop(zone_id, None)
+            if group is None:
+                return False
+            self._groups[group].pop(zone_id, None)
+            self.index.remove(zone_id)
+            self._changed(zone_id, deleted=True)
+            return True
+
+    def replace_group(self, group, zones):
+        """
+        Makes a group contain exactly the given zones. Only zones that were
+        added, changed or dropped touch the index.
+        """
+        with self._lock:
+            incoming = {ZoneIndex.zone_key(zone): zone for zone in zones}
+            current = self._groups.get(group, {})
+            changed = 0
+            for zone_id in [zid for zid in current if zid not in incoming]:
+                changed += self.remove(zone_id)
+            for zone in incoming.values():
+                changed += self.upsert(zone, group)
+            return changed
+
+    # --- Realtime Database listener ---
+    def apply_event(self, event_type, path, data):
+        """
+        Applies a Realtime Database listener event on the 'zones' node.
+        'put' replaces the data at path, 'patch' merges child keys into it.
+        """
+        parts = [p for p in (path or '/').split('/') if p]
+        with self._lock:
+            if not parts:
+                if event_type == 'put':
+                    self.replace_group('db', zones_from_node(data))
+                    self.loaded = True
+                elif isinstance(data, dict):
+                    for zone_id, zone in data.items():
+                        self._apply_zone(zone_id, zone)
+                return
+
+            zone_id = parts[0]
+            if len(parts) == 1 and event_type == 'put':
+                self._apply_zone(zone_id, data)
+                return
+
+            # A change below a single zone: rebuild that zone from a copy.
+            zone = dict(self._groups.get('db', {}).get(zone_id) or {})
+            if len(parts) == 1:
+                updates = data if isinstance(data, dict) else {}
+            else:
+                updates = {parts[1]: data}
+            for key, value in updates.items():
+                if value is None:
+                    zone.pop(key, None)
+                else:
+                    zone[key] = value
+            self._apply_zone(zone_id, zone)
+
+    def _apply_zone(self, zone_id, zone):
+        if isinstance(zone, dict) and zone:
+            zone = dict(zone)
+            zone["id"] = zone_id
+            self.upsert(zone, 'db')
+        else:
+            self.remove(zone_id)